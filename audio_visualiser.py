@@ -0,0 +1,267 @@
+"""Audio level meter and spectrum visualiser for the ST7735 screen
+
+Takes audio periods (for example from wm8960_capture.Capture), measures RMS
+and peak levels or a Hann-windowed FFT spectrum with NumPy, and draws VU bars
+or spectrum columns. Each frame repaints only the part of each bar whose height
+changed: a growing bar gets a strip of bar colour on top, and a falling bar gets
+a strip of background.
+
+Demo without the sound card:
+    python3 audio_visualiser.py test.wav --mode spectrum --emulator
+"""
+import argparse
+import logging
+import sys
+import time
+
+import numpy as np
+
+from st7735_driver import MAX_DAMAGE_RECTS
+
+logger = logging.getLogger(__name__)
+
+FFT_SIZE = 512
+MAX_BATCH = 8         # Most FFT windows analysed per frame when rendering falls behind
+MIN_FREQ = 60.0       # Lowest spectrum band edge in Hz
+DB_FLOOR_VU = -60.0
+DB_FLOOR_SPECTRUM = -80.0
+
+
+def _to_float(samples):
+    """(frames, channels) integer or float samples as float32 in [-1, 1)"""
+    if samples.dtype.kind == 'f':
+        return samples.astype(np.float32, copy=False)
+    return samples * np.float32(1.0 / 2**(8 * samples.dtype.itemsize - 1))
+
+
+def _band_edges(bands, fft_size, rate, min_freq=MIN_FREQ):
+    """Log-spaced FFT bin edges for bands, each band at least one bin wide"""
+    nbins = fft_size // 2 + 1
+    freqs = np.geomspace(min_freq, rate / 2, bands + 1)
+    edges = np.round(freqs * fft_size / rate).astype(int)
+    edges[0] = max(1, edges[0])
+    for i in range(1, len(edges)):
+        edges[i] = max(edges[i], edges[i - 1] + 1)
+    return np.minimum(edges, nbins)
+
+
+class Visualiser:
+    """VU meter ('vu') or spectrum analyser ('spectrum') drawn into a rectangle of a Screen
+
+    feed() takes audio and render() draws a frame; run() does both from a
+    Capture at a fixed frame rate. Bars fall by at most fall_px pixels per
+    frame, and a peak marker holds above each bar. In VU mode the marker
+    also jumps to the sample peak, so it reads above the RMS bar.
+    """
+    def __init__(self, screen, rate, mode='spectrum', bars=16, x=0, y=0, width=None, height=None,
+                 color='lime', peak_color='red', background='black', gap=1, fall_px=4,
+                 fft_size=FFT_SIZE):
+        if mode not in ('vu', 'spectrum'):
+            raise ValueError(f"Unknown visualiser mode: {mode}")
+        self.screen = screen
+        self.rate = rate
+        self.mode = mode
+        self.x = x
+        self.y = y
+        self.width = width or screen.buffer.width - x
+        self.height = height or screen.buffer.height - y
+        self.color = color
+        self.peak_color = peak_color
+        self.background = background
+        self.fall_px = fall_px
+        self.fft_size = fft_size
+        self.bars = 2 if mode == 'vu' else bars  # VU mode shows one bar per channel
+        self.bar_width = max(1, (self.width - gap * (self.bars - 1)) // self.bars)
+        self._step = self.bar_width + gap
+
+        self._window = np.hanning(fft_size).astype(np.float32)
+        # Scale so a full-scale sine reads 0 dBFS in its bin
+        self._norm = 2.0 / self._window.sum()
+        self._edges = _band_edges(self.bars, fft_size, rate)
+        self._history = np.zeros(fft_size, dtype=np.float32)     # Latest fft_size mono samples
+        self._pending = np.zeros(fft_size * MAX_BATCH, dtype=np.float32)  # Samples since last render
+        self._pending_len = 0
+        self._vu_sum = np.zeros(2)
+        self._vu_peak = np.zeros(2)
+        self._vu_count = 0
+        self._signal_peaks = np.zeros(self.bars, dtype=int)  # Sample peak in pixels from levels() (VU)
+
+        self._shown = np.zeros(self.bars, dtype=int)   # Bar heights on screen
+        self._peaks = np.zeros(self.bars, dtype=int)   # Peak marker heights on screen (0 = none)
+        self.frames_rendered = 0
+        self.rects_drawn = 0
+
+    def clear(self):
+        """Paint the visualiser area with the background and forget what was shown"""
+        self.screen.drawRect(self.x, self.y, self.width - 1, self.height - 1, self.background)
+        self._shown[:] = 0
+        self._peaks[:] = 0
+
+    def feed(self, samples):
+        """Add a (frames, channels) block of audio"""
+        data = _to_float(samples)
+        if self.mode == 'vu':
+            channels = min(2, data.shape[1])
+            self._vu_sum[:channels] += np.einsum('ij,ij->j', data[:, :channels], data[:, :channels])
+            np.maximum(self._vu_peak[:channels], np.abs(data[:, :channels]).max(axis=0),
+                       out=self._vu_peak[:channels])
+            if channels == 1:
+                self._vu_sum[1], self._vu_peak[1] = self._vu_sum[0], self._vu_peak[0]
+            self._vu_count += len(data)
+            return
+        mono = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+        n = len(mono)
+        keep = min(n, self.fft_size)
+        self._history[:-keep] = self._history[keep:]
+        self._history[-keep:] = mono[-keep:]
+        room = len(self._pending) - self._pending_len
+        if n > room:
+            # Rendering is far behind; keep the newest audio
+            drop = min(self._pending_len, n - room)
+            self._pending[:self._pending_len - drop] = self._pending[drop:self._pending_len]
+            self._pending_len -= drop
+            mono = mono[-len(self._pending):]
+            n = len(mono)
+        self._pending[self._pending_len:self._pending_len + n] = mono
+        self._pending_len += n
+
+    def levels(self):
+        """Target bar heights in pixels from the audio fed since the last call"""
+        if self.mode == 'vu':
+            if self._vu_count == 0:
+                self._signal_peaks[:] = 0
+                return np.zeros(self.bars, dtype=int)
+            rms = np.sqrt(self._vu_sum / self._vu_count)
+            self._signal_peaks = self._db_to_px(20 * np.log10(np.maximum(self._vu_peak, 1e-9)), DB_FLOOR_VU)
+            self._vu_sum[:] = 0
+            self._vu_peak[:] = 0
+            self._vu_count = 0
+            db = 20 * np.log10(np.maximum(rms, 1e-9)) + 3.01  # +3 dB: a full-scale sine reads 0 dBFS
+            return self._db_to_px(db, DB_FLOOR_VU)
+
+        windows = self._pending_len // self.fft_size
+        if windows:
+            # Every complete window since the last frame, in one batched FFT
+            frames = self._pending[:windows * self.fft_size].reshape(windows, self.fft_size)
+            spectrum = np.abs(np.fft.rfft(frames * self._window, axis=1)) ** 2
+            power = spectrum.mean(axis=0)
+            rest = self._pending_len - windows * self.fft_size
+            self._pending[:rest] = self._pending[windows * self.fft_size:self._pending_len]
+            self._pending_len = rest
+        else:
+            power = np.abs(np.fft.rfft(self._history * self._window)) ** 2
+        band = np.maximum.reduceat(power[:self._edges[-1]], self._edges[:-1])
+        db = 10 * np.log10(np.maximum(band, 1e-20)) + 20 * np.log10(self._norm)
+        return self._db_to_px(db, DB_FLOOR_SPECTRUM)
+
+    def _db_to_px(self, db, floor):
+        return np.clip((db - floor) / -floor * self.height, 0, self.height).astype(int)
+
+    def render(self):
+        """Draw one frame, repainting only the parts of bars and peak markers that changed"""
+        screen = self.screen
+        target = np.maximum(self.levels(), self._shown - self.fall_px)
+        peaks = np.where(target >= self._peaks, target, np.maximum(self._peaks - 1, target))
+        np.maximum(peaks, self._signal_peaks, out=peaks)
+        bottom = self.y + self.height
+        pending = 0
+        try:
+            with screen.frame():
+                for i in np.flatnonzero((target != self._shown) | (peaks != self._peaks)):
+                    left = self.x + i * self._step
+                    right = left + self.bar_width
+                    old, new = int(self._shown[i]), int(target[i])
+                    old_peak, new_peak = int(self._peaks[i]), int(peaks[i])
+                    if old_peak != new_peak and old_peak > max(old, new):
+                        # Erase the old marker (the bar strip below covers it otherwise)
+                        self._fill(left, bottom - old_peak, right, bottom - old_peak + 1, self.background)
+                        pending += 1
+                    if new > old:
+                        self._fill(left, bottom - new, right, bottom - old, self.color)
+                        pending += 1
+                    elif new < old:
+                        self._fill(left, bottom - old, right, bottom - new, self.background)
+                        pending += 1
+                    if new_peak > new and (new_peak != old_peak or new < old):
+                        self._fill(left, bottom - new_peak, right, bottom - new_peak + 1, self.peak_color)
+                        pending += 1
+                    if pending >= MAX_DAMAGE_RECTS:
+                        # Send these windows now rather than let further ones merge into one large union
+                        screen.flush(wait=False)
+                        self.rects_drawn += pending
+                        pending = 0
+            self.rects_drawn += pending
+            self._shown = target
+            self._peaks = peaks
+            self.frames_rendered += 1
+        except Exception as e:
+            screen._error('Visualiser.render', f"Error drawing visualiser: {e}")
+
+    def _fill(self, x0, y0, x1, y1, color):
+        self.screen.draw.rectangle((x0, y0, x1 - 1, y1 - 1), fill=color)
+        self.screen._mark_dirty(x0, y0, x1, y1)
+
+    def run(self, capture, fps=30, max_seconds=None):
+        """Feed periods from a Capture and render at fps until it ends; returns timing stats"""
+        interval = 1.0 / fps
+        start = time.monotonic()
+        cpu_start = time.process_time()
+        next_frame = start
+        frames_before = self.frames_rendered
+        for chunk in capture.periods():
+            self.feed(chunk)
+            now = time.monotonic()
+            if max_seconds is not None and now - start >= max_seconds:
+                break
+            if now >= next_frame:
+                self.render()
+                # Don't try to catch up on missed frames; the next one reflects all the audio anyway
+                next_frame = max(next_frame + interval, now)
+        elapsed = time.monotonic() - start
+        frames = self.frames_rendered - frames_before
+        return {'frames': frames, 'fps': frames / elapsed if elapsed > 0 else 0.0,
+                'cpu_share': (time.process_time() - cpu_start) / elapsed if elapsed > 0 else 0.0,
+                'rects_per_frame': self.rects_drawn / self.frames_rendered if self.frames_rendered else 0.0,
+                'elapsed': elapsed}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Show audio levels or a spectrum on the ST7735 LCD')
+    parser.add_argument('wav', nargs='?', help='WAV file to play through the visualiser (default: capture from the card)')
+    parser.add_argument('--mode', default='spectrum', choices=('spectrum', 'vu'))
+    parser.add_argument('--bars', type=int, default=16, help='Spectrum columns')
+    parser.add_argument('--fps', type=float, default=30)
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+    parser.add_argument('--device', default='hw:0,0', help='Capture device when no WAV file is given')
+    parser.add_argument('--emulator', action='store_true', help='Draw on the emulated panel')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from st7735_driver import Screen
+    from wm8960_capture import ArecordSource, Capture, WavSource
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    source = WavSource(args.wav, realtime=True) if args.wav else ArecordSource(args.device)
+    screen = Screen(native_fb=True, backend='emulator' if args.emulator else None)
+    screen.initGPIO()
+    screen.openScreen()
+    vis = Visualiser(screen, source.rate, mode=args.mode, bars=args.bars)
+    vis.clear()
+    capture = Capture(source)
+    stats = None
+    try:
+        with capture:
+            stats = vis.run(capture, fps=args.fps, max_seconds=args.duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        screen.closeGPIO()
+    if stats:
+        print(f"{stats['frames']} frames at {stats['fps']:.1f} fps, "
+              f"{stats['cpu_share'] * 100:.1f}% of one core, {stats['rects_per_frame']:.1f} strips per frame")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""Edge-triggered button input for the expansion board key
+
+Edges come from GPIO interrupts rather than polling, so the input costs
+nothing while idle. The first edge of a press is reported immediately and
+the bounce that follows is filtered in software. Events are delivered to
+callbacks, a thread-safe queue, and an asyncio stream.
+"""
+from collections import namedtuple
+import asyncio
+import logging
+import queue
+import threading
+import time
+
+from st7735_pins import KEY_PIN
+
+logger = logging.getLogger(__name__)
+
+PRESS = 'press'
+RELEASE = 'release'
+CLICK = 'click'                # Short press and release
+DOUBLE_CLICK = 'double_click'  # Second click within double_click seconds of the first
+LONG_PRESS = 'long_press'      # Held for long_press seconds (reported while still held)
+
+# duration is the hold time for release/click/long_press events and 0 for press
+ButtonEvent = namedtuple('ButtonEvent', ['type', 'pin', 'timestamp', 'duration'])
+
+
+class Button:
+    """Debounced push button on an input pin, reporting press/release/click/double-click/long-press
+
+    Callbacks run on the GPIO library's event thread, or a timer thread for
+    long presses, so they should return quickly.
+    """
+    def __init__(self, pin=KEY_PIN, gpio=None, active_low=True, debounce=0.02,
+                 long_press=0.8, double_click=0.3, queue_size=64):
+        if gpio is None:
+            import RPi.GPIO as gpio
+        self.gpio = gpio
+        self.pin = pin
+        self.debounce = debounce
+        self.long_press = long_press
+        self.double_click = double_click
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.events_dropped = 0
+        self._active_level = gpio.LOW if active_low else gpio.HIGH
+        self._callbacks = []
+        self._lock = threading.Lock()
+        self._pressed = False
+        self._pressed_at = 0.0
+        self._last_change = float('-inf')
+        self._last_click = float('-inf')
+        self._long_fired = False
+        self._long_timer = None
+        self._recheck_timer = None
+
+        gpio.setmode(gpio.BCM)
+        gpio.setup(pin, gpio.IN, pull_up_down=gpio.PUD_UP if active_low else gpio.PUD_DOWN)
+        self._pressed = gpio.input(pin) == self._active_level
+        # No bouncetime: the library's filter would also swallow a quick release edge
+        gpio.add_event_detect(pin, gpio.BOTH, callback=self._on_edge)
+        logger.info(f"Button on GPIO{pin} ready")
+
+    def addCallback(self, callback, event_type=None):
+        """Call callback(event) for every event, or only for events of event_type"""
+        self._callbacks.append((callback, event_type))
+
+    def removeCallback(self, callback):
+        self._callbacks = [(cb, t) for cb, t in self._callbacks if cb is not callback]
+
+    def get(self, timeout=None):
+        """Next event from the queue, or None if the timeout expires"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    async def events(self):
+        """Async iterator over events: `async for event in button.events(): ...`"""
+        loop = asyncio.get_running_loop()
+        stream = asyncio.Queue()
+
+        def forward(event):
+            loop.call_soon_threadsafe(stream.put_nowait, event)
+
+        self.addCallback(forward)
+        try:
+            while True:
+                yield await stream.get()
+        finally:
+            self.removeCallback(forward)
+
+    @property
+    def pressed(self):
+        return self._pressed
+
+    def close(self):
+        """Stop edge detection and release the pin"""
+        with self._lock:
+            for timer in (self._long_timer, self._recheck_timer):
+                if timer is not None:
+                    timer.cancel()
+            self._long_timer = self._recheck_timer = None
+        try:
+            self.gpio.remove_event_detect(self.pin)
+            self.gpio.cleanup(self.pin)
+        except Exception as e:
+            logger.error(f"Error releasing button GPIO{self.pin}: {e}")
+
+    def _on_edge(self, channel):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_change < self.debounce:
+                # Contact bounce; look again once it has settled in case the level really changed
+                self._schedule_recheck(self._last_change + self.debounce - now)
+                return
+            events = self._sample(now)
+        self._emit(events)
+
+    def _recheck(self):
+        with self._lock:
+            self._recheck_timer = None
+            events = self._sample(time.monotonic())
+        self._emit(events)
+
+    def _schedule_recheck(self, delay):
+        if self._recheck_timer is None:
+            self._recheck_timer = threading.Timer(delay, self._recheck)
+            self._recheck_timer.daemon = True
+            self._recheck_timer.start()
+
+    def _sample(self, now):
+        """Read the pin and turn a level change into events (called with the lock held)"""
+        pressed = self.gpio.input(self.pin) == self._active_level
+        if pressed == self._pressed:
+            return []
+        self._pressed = pressed
+        self._last_change = now
+        self._schedule_recheck(self.debounce)
+        if pressed:
+            self._pressed_at = now
+            self._long_fired = False
+            self._long_timer = threading.Timer(self.long_press, self._on_long_press, args=(now,))
+            self._long_timer.daemon = True
+            self._long_timer.start()
+            return [ButtonEvent(PRESS, self.pin, now, 0.0)]
+
+        if self._long_timer is not None:
+            self._long_timer.cancel()
+            self._long_timer = None
+        held = now - self._pressed_at
+        events = [ButtonEvent(RELEASE, self.pin, now, held)]
+        if not self._long_fired:
+            events.append(ButtonEvent(CLICK, self.pin, now, held))
+            if now - self._last_click <= self.double_click:
+                events.append(ButtonEvent(DOUBLE_CLICK, self.pin, now, held))
+                self._last_click = float('-inf')  # A third click starts a new pair
+            else:
+                self._last_click = now
+        return events
+
+    def _on_long_press(self, pressed_at):
+        with self._lock:
+            if not self._pressed or self._pressed_at != pressed_at:
+                return
+            self._long_fired = True
+            self._long_timer = None
+            now = time.monotonic()
+            event = ButtonEvent(LONG_PRESS, self.pin, now, now - pressed_at)
+        self._emit([event])
+
+    def _emit(self, events):
+        for event in events:
+            try:
+                self.queue.put_nowait(event)
+            except queue.Full:
+                # Keep the newest events; an unread backlog is stale input
+                self.events_dropped += 1
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(event)
+                except (queue.Empty, queue.Full):
+                    pass
+            for callback, event_type in list(self._callbacks):
+                if event_type is None or event_type == event.type:
+                    try:
+                        callback(event)
+                    except Exception as e:
+                        logger.error(f"Button callback error: {e}")
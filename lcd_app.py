@@ -1,13 +1,12 @@
 import os
 import sys
 import time
-import RPi.GPIO as GPIO
-from luma.core.interface.serial import spi
-from luma.lcd.device import st7735
-from luma.core.render import canvas
+import argparse
+import logging
 
 # Import our driver module
-from st7735_driver import Screen, BL_PIN, DC_PIN, RST_PIN, SPI_PORT, SPI_DEVICE, KEY_PIN
+from button_input import Button, PRESS, LONG_PRESS, DOUBLE_CLICK
+from st7735_driver import Screen, Counter, KEY_PIN
 
 # Test different display configurations
 def test_screen_configurations():
@@ -73,29 +72,20 @@ def test_spi_devices():
     for device in [0, 1]:  # Try device=0 (CE0) and device=1 (CE1)
         print(f"\nTesting SPI device={device} (corresponding to {'CE0' if device==0 else 'CE1'})...")
         
+        screen = None
         try:
-            # Initialize SPI with different device parameter
+            # Each Screen opens its own chip select; the reset line is pulsed by the driver
             print("Initializing SPI interface...")
-            GPIO.setmode(GPIO.BCM)
-            # Hardware reset
-            GPIO.setup(RST_PIN, GPIO.OUT)
-            GPIO.output(RST_PIN, GPIO.HIGH)
-            time.sleep(0.1)
-            GPIO.output(RST_PIN, GPIO.LOW)
-            time.sleep(0.1)
-            GPIO.output(RST_PIN, GPIO.HIGH)
-            time.sleep(0.1)
-            
-            serial = spi(port=SPI_PORT, device=device, gpio_DC=DC_PIN, gpio_RST=RST_PIN)
-            device_obj = st7735(serial, width=160, height=128, rotate=1, h_offset=0, v_offset=0, bgr=True)
-            device_obj.contrast(0x70)
+            screen = Screen(device=device)
+            screen.initGPIO()
+            screen.openScreen()
             
             # Create a simple image for testing
-            with canvas(device_obj) as draw:
-                draw.rectangle((0, 0, 160, 40), fill="red")
-                draw.rectangle((0, 40, 160, 80), fill="green")
-                draw.rectangle((0, 80, 160, 128), fill="blue")
-                draw.text((10, 10), f"CE{device}", fill="white")
+            with screen.frame():
+                screen.drawRect(0, 0, 160, 40, 'red')
+                screen.drawRect(0, 40, 160, 40, 'green')
+                screen.drawRect(0, 80, 160, 48, 'blue')
+                screen.drawText(10, 10, f"CE{device}", color='white')
             
             print(f"SPI device={device} test image drawn")
             time.sleep(3)
@@ -106,7 +96,9 @@ def test_spi_devices():
             print(f"Error testing SPI device={device}: {e}")
         
         finally:
-            GPIO.cleanup()
+            # Releases only this screen's pins
+            if screen:
+                screen.closeGPIO()
 
 # Test button and color switching
 def test_key_color_change():
@@ -119,46 +111,46 @@ def test_key_color_change():
     color_index = 0
     
     screen = None
+    button = None
     try:
         # Initialize screen
         screen = Screen()
         screen.initGPIO()
         screen.openScreen()
         
-        # Initialize button
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setup(KEY_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)  # Set as pull-up input
+        # Edge-triggered button; events arrive on a queue, so the loop sleeps until one does
+        button = Button(KEY_PIN, gpio=screen.gpio)
         
         # Display the first color
         screen.clearScreen(color=colors[color_index])
         print(f"Current color: {colors[color_index]}")
-        
-        last_button_state = GPIO.input(KEY_PIN)
+        print("Hold the button to go back to the first color")
         
         # Main loop
         while True:
-            # Read button state
-            button_state = GPIO.input(KEY_PIN)
-            
-            # Detect button press (level change from high to low)
-            if button_state == 0 and last_button_state == 1:
-                # Button pressed, change color
+            event = button.get(timeout=1.0)
+            if event is None:
+                continue
+            if event.type == PRESS:
                 color_index = (color_index + 1) % len(colors)
                 screen.clearScreen(color=colors[color_index])
                 print(f"Button pressed, switching color to: {colors[color_index]}")
-                time.sleep(0.2)  # Simple debounce
-            
-            last_button_state = button_state
-            time.sleep(0.05)  # Short delay to reduce CPU usage
+            elif event.type == LONG_PRESS:
+                color_index = 0
+                screen.clearScreen(color=colors[color_index])
+                print(f"Long press, back to: {colors[color_index]}")
+            elif event.type == DOUBLE_CLICK:
+                print("Double click")
             
     except KeyboardInterrupt:
         print("\nButton test interrupted by user")
     except Exception as e:
         print(f"Button test error: {e}")
     finally:
+        if button:
+            button.close()
         if screen:
             screen.closeGPIO()
-        GPIO.cleanup()  # Ensure GPIO is cleaned up
         print("Button test complete")
 
 # Test drawing functions
@@ -169,7 +161,7 @@ def test_drawing_functions():
     screen = None
     try:
         # Initialize screen
-        screen = Screen()
+        screen = Screen(font_sizes=(16,))
         screen.initGPIO()
         screen.openScreen()
         
@@ -211,12 +203,13 @@ def test_drawing_functions():
         
         # Draw text
         print("Drawing text...")
-        screen.clearScreen()
-        screen.drawText(10, 10, "Hello, World!", color="white", fontSize=16)
-        screen.drawText(10, 30, "LCD Display", color="yellow", fontSize=16)
-        screen.drawText(10, 50, "Test Pattern", color="cyan", fontSize=16)
-        screen.drawText(10, 70, "Raspberry Pi", color="green", fontSize=16)
-        screen.drawText(10, 90, "ST7735 LCD", color="red", fontSize=16)
+        with screen.frame():  # Build the whole text screen, then send it once
+            screen.clearScreen()
+            screen.drawText(10, 10, "Hello, World!", color="white", fontSize=16)
+            screen.drawText(10, 30, "LCD Display", color="yellow", fontSize=16)
+            screen.drawText(10, 50, "Test Pattern", color="cyan", fontSize=16)
+            screen.drawText(10, 70, "Raspberry Pi", color="green", fontSize=16)
+            screen.drawText(10, 90, "ST7735 LCD", color="red", fontSize=16)
         time.sleep(4)
         
         print("Drawing functions test complete")
@@ -230,7 +223,53 @@ def test_drawing_functions():
             screen.closeGPIO()
         print("Drawing test complete")
 
+# Non-interactive benchmark of every drawing primitive, reported as JSON
+def run_benchmark(args):
+    from st7735_bench import runBenchmarks, writeReport
+
+    screen = None
+    try:
+        screen = Screen(backend='emulator' if args.emulator else None, native_fb=args.native_fb,
+                        async_mode=args.async_mode, bus_speed_hz=int(args.bus_speed * 1000000))
+        screen.initGPIO()
+        screen.openScreen()
+        if args.calibrate:
+            # Benchmark at the fastest clock that still verifies
+            report = screen.calibrateBus()
+            print(f"SPI bus: {report['speed_hz'] / 1e6:g} MHz, {report['mb_per_s']:.2f} MB/s "
+                  f"({report['method'] or 'unverified'})", file=sys.stderr)
+        report = runBenchmarks(screen, iterations=args.iterations, operations=args.ops)
+        text = writeReport(report, args.output)
+        if args.output:
+            print(f"Benchmark results written to {args.output}")
+        else:
+            print(text)
+    finally:
+        if screen:
+            screen.closeGPIO()
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="ST7735 LCD test program")
+    parser.add_argument('--bench', action='store_true', help="run the display benchmark instead of the interactive tests")
+    parser.add_argument('--iterations', type=int, default=100, help="iterations per benchmarked operation")
+    parser.add_argument('--ops', nargs='+', help="only benchmark these operations, e.g. drawText fullFrame")
+    parser.add_argument('--output', help="write the JSON report to this file instead of stdout")
+    parser.add_argument('--emulator', action='store_true', help="use the emulated panel instead of the hardware")
+    parser.add_argument('--native-fb', action='store_true', help="use the NumPy RGB565 framebuffer")
+    parser.add_argument('--async', dest='async_mode', action='store_true', help="present frames from a background thread")
+    parser.add_argument('--bus-speed', type=float, default=8, help="SPI clock in MHz, e.g. 16 or 32")
+    parser.add_argument('--calibrate', action='store_true', help="find the fastest verified SPI clock before benchmarking")
+    parser.add_argument('--log-level', default='INFO', help="driver log level: DEBUG, INFO, WARNING or ERROR")
+    return parser.parse_args()
+
 if __name__ == '__main__':
+    args = parse_args()
+    # Driver messages go through logging (stderr), so --bench output on stdout stays pure JSON
+    logging.basicConfig(level=args.log_level.upper(), format='%(message)s')
+    if args.bench:
+        run_benchmark(args)
+        sys.exit(0)
+
     print("="*50)
     print("ST7735 LCD Screen Test Program")
     print("="*50)
@@ -303,7 +342,7 @@ if __name__ == '__main__':
             screen = None  # Initialize screen variable to ensure it can be used in finally block
             try:
                 print("Initializing screen...")
-                screen = Screen()  # Using default parameters, now defaulting to BGR=True
+                screen = Screen(font_sizes=(12, 18))  # Using default parameters, now defaulting to BGR=True
                 print("Initializing GPIO...")
                 screen.initGPIO()
                 print("Opening screen...")
@@ -322,10 +361,13 @@ if __name__ == '__main__':
                 print(f"Screen size: {screen.width}x{screen.height}")
                 print("Displaying info...")
                 screen.showInfo()
-                screen.drawText(5, 125, 'Total Captures=', color='green', fontSize=18)
-                screen.drawText(85, 125, str(1), color='red', fontSize=18)
+                # The counter only repaints digits that change between updates
+                captures = Counter(screen, 85, 125, digits=4, color='red', fontSize=18)
+                with screen.frame():
+                    screen.drawText(5, 125, 'Total Captures=', color='green', fontSize=18)
+                    captures.set(1)
                 time.sleep(2)
-                screen.drawText(85, 125, str(2), color='red', fontSize=18)
+                captures.set(2)
                 print("Program execution complete")
             except Exception as e:
                 print(f"Error: {e}")
@@ -334,5 +376,5 @@ if __name__ == '__main__':
                 if screen:  # Check if screen has been initialized
                     screen.closeGPIO()
     except KeyboardInterrupt:
-        print("\nProgram interrupted by user")
-        GPIO.cleanup()  # Ensure GPIO is cleaned up
\ No newline at end of file
+        # The finally above has already released the pins through screen.closeGPIO()
+        print("\nProgram interrupted by user")
\ No newline at end of file
@@ -0,0 +1,233 @@
+"""Precompiled RGB565 asset packs for the ST7735 screen
+
+A pack holds images and pre-rendered text already converted to the panel's
+16-bit big-endian RGB565, stored in panel orientation for one rotation, so
+Screen.blitAsset can hand the bytes straight from the memory-mapped file to
+spidev with no decoding.
+
+Layout (little-endian header, pixel data big-endian as the panel expects):
+    magic    8s   b'ST7735AP'
+    version  H
+    rotation B    rotation the pixel data was laid out for
+    reserved B
+    index    I    length of the JSON index that follows
+    JSON index: {name: {"offset", "width", "height", "kind"}}, width/height in
+    screen (buffer) orientation; each entry is height*width*2 bytes at offset,
+    4-byte aligned, rows in panel order.
+
+Build a pack with:
+    python3 st7735_assets.py build splash.pack --rotation 1 splash.png icons/ \\
+        --text title="Audio HAT" --font-size 18
+"""
+from collections import namedtuple
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b'ST7735AP'
+VERSION = 1
+HEADER = struct.Struct('<8sHBBI')
+ALIGN = 4
+
+# width/height are in screen orientation; offset/nbytes locate the panel-order RGB565 data
+Asset = namedtuple('Asset', ['name', 'width', 'height', 'kind', 'offset', 'nbytes'])
+
+
+class AssetPack:
+    """Read-only view of a pack file; asset data are memoryviews into the mmap, never copies"""
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.rotation, _, index_len = HEADER.unpack_from(self._map, 0)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not an ST7735 asset pack")
+            if version != VERSION:
+                raise ValueError(f"{path}: unsupported asset pack version {version}")
+            index = json.loads(self._map[HEADER.size:HEADER.size + index_len].decode('utf-8'))
+            self.assets = {}
+            for name, e in index.items():
+                nbytes = e['width'] * e['height'] * 2
+                if e['offset'] + nbytes > len(self._map):
+                    raise ValueError(f"{path}: asset {name} runs past the end of the file")
+                self.assets[name] = Asset(name, e['width'], e['height'], e.get('kind', 'image'), e['offset'], nbytes)
+        except Exception:
+            self.close()
+            raise
+        self._view = memoryview(self._map)
+
+    def __contains__(self, name):
+        return name in self.assets
+
+    def __getitem__(self, name):
+        return self.assets[name]
+
+    def names(self):
+        return list(self.assets)
+
+    def data(self, name):
+        """Panel-order RGB565 bytes of an asset, as a memoryview into the mapped file"""
+        asset = self.assets[name]
+        return self._view[asset.offset:asset.offset + asset.nbytes]
+
+    def close(self):
+        view = getattr(self, '_view', None)
+        if view is not None:
+            view.release()
+            self._view = None
+        if getattr(self, '_map', None) is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _screen_size(rotation):
+    # Buffer size of a 160x128 panel as luma presents it for each rotation
+    return (160, 128) if rotation in (0, 2) else (128, 160)
+
+
+def _encode(image, rotation):
+    """Panel-order RGB565 bytes for an RGB image drawn in screen orientation"""
+    import numpy as np
+    from st7735_driver import ROTATE_TRANSPOSE, rgb888_to_rgb565
+    transpose = ROTATE_TRANSPOSE.get(rotation)
+    if transpose is not None:
+        image = image.transpose(transpose)
+    return rgb888_to_rgb565(np.asarray(image.convert('RGB'))).tobytes()
+
+
+def _load_image(path, fit, background):
+    from PIL import Image
+    from st7735_driver import _RESAMPLING, _fit_size
+    with Image.open(path) as src:
+        src.load()
+        img = src.convert('RGBA')
+    size = _fit_size(img.size, fit)
+    if size != img.size:
+        img = img.resize(size, _RESAMPLING.LANCZOS)
+    # The panel has no alpha; flatten onto the background colour at build time
+    flat = Image.new('RGB', img.size, background)
+    flat.paste(img, (0, 0), img)
+    return flat
+
+
+def _render_text(text, font_path, font_size, color, background):
+    from PIL import Image, ImageDraw, ImageFont
+    try:
+        font = ImageFont.truetype(font_path, font_size)
+    except OSError:
+        font = ImageFont.load_default()
+    left, top, right, bottom = font.getbbox(text)
+    img = Image.new('RGB', (max(1, right - left), max(1, bottom - top)), background)
+    ImageDraw.Draw(img).text((-left, -top), text, font=font, fill=color)
+    return img
+
+
+def buildPack(path, images, rotation=1):
+    """Write a pack of (name, PIL image, kind) entries drawn in screen orientation; returns the index"""
+    entries = []
+    for name, image, kind in images:
+        entries.append((name, image.width, image.height, kind, _encode(image, rotation)))
+
+    # Offsets depend on the index length, which depends on the offsets; iterate until stable
+    index_len = 0
+    while True:
+        offset = HEADER.size + index_len
+        index = {}
+        for name, width, height, kind, data in entries:
+            offset = (offset + ALIGN - 1) // ALIGN * ALIGN
+            index[name] = {'offset': offset, 'width': width, 'height': height, 'kind': kind}
+            offset += len(data)
+        blob = json.dumps(index, sort_keys=True).encode('utf-8')
+        if len(blob) == index_len:
+            break
+        index_len = len(blob)
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, rotation, 0, len(blob)))
+        f.write(blob)
+        for name, _, _, _, data in entries:
+            f.seek(index[name]['offset'])
+            f.write(data)
+    os.replace(tmp, path)
+    return index
+
+
+def _collect_images(sources, fit, background):
+    from st7735_driver import IMAGE_EXTENSIONS
+    images = []
+    for source in sources:
+        if os.path.isdir(source):
+            paths = [os.path.join(source, n) for n in sorted(os.listdir(source))
+                     if n.lower().endswith(IMAGE_EXTENSIONS)]
+        else:
+            paths = [source]
+        for p in paths:
+            name = os.path.splitext(os.path.basename(p))[0]
+            images.append((name, _load_image(p, fit, background), 'image'))
+    return images
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Build or inspect ST7735 RGB565 asset packs')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    build = sub.add_parser('build', help='Compile images and text into a pack')
+    build.add_argument('output', help='Pack file to write')
+    build.add_argument('sources', nargs='*', help='Image files or directories of images')
+    build.add_argument('--rotation', type=int, default=1, choices=(0, 1, 2, 3),
+                       help='Screen rotation the pack is laid out for (default: 1)')
+    build.add_argument('--fit', default=None, help='Scale images down to fit WxH (default: the screen)')
+    build.add_argument('--background', default='black', help='Colour transparent pixels are flattened onto')
+    build.add_argument('--text', action='append', default=[], metavar='NAME=TEXT',
+                       help='Pre-render TEXT as asset NAME (repeatable)')
+    build.add_argument('--font', default='/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+    build.add_argument('--font-size', type=int, default=16)
+    build.add_argument('--color', default='white', help='Text colour')
+
+    info = sub.add_parser('info', help='List the entries of a pack')
+    info.add_argument('pack')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'info':
+        with AssetPack(args.pack) as pack:
+            print(f"{args.pack}: rotation {pack.rotation}, {len(pack.assets)} assets")
+            for asset in pack.assets.values():
+                print(f"  {asset.name:24} {asset.kind:5} {asset.width}x{asset.height} {asset.nbytes} bytes")
+        return 0
+
+    if args.fit:
+        fit = tuple(int(v) for v in args.fit.lower().split('x'))
+    else:
+        fit = _screen_size(args.rotation)
+    images = _collect_images(args.sources, fit, args.background)
+    for spec in args.text:
+        name, sep, text = spec.partition('=')
+        if not sep:
+            print(f"--text expects NAME=TEXT, got {spec!r}")
+            return 2
+        images.append((name, _render_text(text, args.font, args.font_size, args.color, args.background), 'text'))
+    if not images:
+        print("Nothing to pack")
+        return 2
+    index = buildPack(args.output, images, rotation=args.rotation)
+    print(f"Wrote {len(index)} assets to {args.output} ({os.path.getsize(args.output)} bytes)")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,375 @@
+"""asyncio facade for the ST7735 screen and the expansion board key
+
+Every Screen call runs on one dedicated worker thread, so rendering, SPI
+transfers and the reset delays of start-up never block the event loop. Draw
+methods queue the call at once and return an awaitable; await it to know the
+panel has the result, or let it run in the background.
+
+    async with await AsyncScreen.create(rotation=1) as ascreen:
+        await ascreen.clearScreen()
+        await ascreen.drawText(4, 4, 'Ready', timeout=0.5)
+        async for event in ascreen.events():
+            ...
+
+While the worker is busy, a draw that paints opaquely over everything a
+still-queued draw would touch (a new value in the same text field, a filled
+rectangle over an older one, ...) takes that draw's place in the queue
+instead of adding a second transfer, as long as nothing queued in between
+overlaps it. clearScreen() drops the draws queued before it. Both
+awaitables then complete when the merged call has run, and the panel ends up
+exactly as if every call had run in order.
+
+Loop latency demo:
+    python3 st7735_async.py --emulator --seconds 3
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import argparse
+import asyncio
+import logging
+import statistics
+import sys
+import threading
+import time
+
+from st7735_pins import KEY_PIN
+
+logger = logging.getLogger(__name__)
+
+# States of a queued call
+QUEUED = 'queued'
+RUNNING = 'running'
+SUPERSEDED = 'superseded'  # Dropped in favour of a later draw
+CANCELLED = 'cancelled'    # Every waiter gave up before it started
+
+_EVERYWHERE = (float('-inf'), float('-inf'), float('inf'), float('inf'))
+
+
+def _overlap(a, b):
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def _contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and outer[2] >= inner[2] and outer[3] >= inner[3]
+
+
+class _Call:
+    __slots__ = ('fn', 'args', 'kwargs', 'rect', 'future', 'state', 'waiters')
+
+    def __init__(self, fn, args, kwargs, rect):
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.rect = rect    # Screen area a draw may change, None for anything else
+        self.future = None
+        self.state = QUEUED
+        self.waiters = 1
+
+
+class AsyncScreen:
+    """Awaitable wrapper around a Screen; all Screen work happens on a single worker thread
+
+    timeout is the default per-call timeout in seconds (None waits forever);
+    every method also takes timeout=. A timeout only stops the wait: a call
+    that already started still completes, and one that has not started is
+    dropped once nobody is waiting for it.
+    """
+    def __init__(self, screen, executor=None, timeout=None):
+        self.screen = screen
+        self.timeout = timeout
+        self._own_executor = executor is None
+        self._executor = executor or ThreadPoolExecutor(max_workers=1, thread_name_prefix='st7735-async')
+        self._lock = threading.Lock()
+        self._queued = deque()  # Calls submitted but not started, oldest first
+        self._buttons = {}
+        self.calls = 0
+        self.calls_coalesced = 0
+        self.calls_superseded = 0
+        self.calls_cancelled = 0
+        self.timeouts = 0
+
+    @classmethod
+    async def create(cls, timeout=None, **screen_args):
+        """Build, initialise and switch on a Screen off the event loop, and wrap it"""
+        from st7735_driver import Screen
+
+        def open_screen():
+            screen = Screen(**screen_args)
+            screen.initGPIO()
+            screen.openScreen()
+            return screen
+
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='st7735-async')
+        try:
+            screen = await asyncio.get_running_loop().run_in_executor(executor, open_screen)
+        except BaseException:
+            executor.shutdown(wait=False)
+            raise
+        self = cls(screen, executor, timeout)
+        self._own_executor = True
+        return self
+
+    # Drawing: each gives the area it may change and the area it paints opaquely (or None)
+
+    def drawText(self, x, y, msg, color='white', fontSize=None, fontType=None, timeout=None):
+        font, size = self.screen._getFont(fontSize, fontType)
+        # The background drawText clears, and the glyphs, which may reach outside it
+        width = min(len(msg) * size / 2, self.screen.width - x)
+        left, top, right, bottom = font.getbbox(msg) if msg else (0, 0, 0, 0)
+        rect = (min(x, x + left - 1), min(y, y + top - 1),
+                max(x + width + 1, x + right + 1), max(y + size + 1, y + bottom + 1))
+        # drawRect fills both end rows and columns
+        return self._draw('drawText', rect, (x, y, x + int(width) + 1, y + size + 1),
+                          (x, y, msg, color, fontSize, fontType), timeout)
+
+    def drawRect(self, x, y, w, h, color='black', outline=None, timeout=None):
+        rect = (x, y, x + w + 1, y + h + 1)
+        return self._draw('drawRect', rect, rect if color is not None else None,
+                          (x, y, w, h, color, outline), timeout)
+
+    def drawCircle(self, x, y, radius, color='white', outline=None, timeout=None):
+        inner = int(radius * 0.7)  # Square inside the disc
+        return self._draw('drawCircle', (x - radius, y - radius, x + radius + 1, y + radius + 1),
+                          (x - inner, y - inner, x + inner, y + inner) if color is not None else None,
+                          (x, y, radius, color, outline), timeout)
+
+    def drawLine(self, x0, y0, x1, y1, color='white', width=1, timeout=None):
+        pad = width // 2 + 1
+        rect = (min(x0, x1) - pad, min(y0, y1) - pad, max(x0, x1) + pad + 1, max(y0, y1) + pad + 1)
+        return self._draw('drawLine', rect, None, (x0, y0, x1, y1, color, width), timeout)
+
+    def drawPoint(self, x, y, color='white', timeout=None):
+        rect = (x, y, x + 1, y + 1)
+        return self._draw('drawPoint', rect, rect if color is not None else None, (x, y, color), timeout)
+
+    def drawImage(self, image_path, x=0, y=0, width=None, height=None, timeout=None):
+        # The fitted size and transparency are only known once decoded, so an image never replaces a draw
+        rect = (x, y, x + (width or self.screen.buffer.width), y + (height or self.screen.buffer.height))
+        return self._draw('drawImage', rect, None, (image_path, x, y, width, height), timeout)
+
+    def clearScreen(self, color='black', timeout=None):
+        """Clear the screen, dropping the draws queued before it (nothing they drew would survive)"""
+        return self._submit(self.screen.clearScreen, (color,), {}, _EVERYWHERE, timeout, supersede=True)
+
+    # Everything else runs in order and is never merged
+
+    def call(self, fn, *args, timeout=None, **kwargs):
+        """Run fn(screen, *args, **kwargs) on the worker, e.g. a WidgetTree render or a Visualiser frame"""
+        return self._submit(fn, (self.screen,) + args, kwargs, None, timeout)
+
+    def flush(self, wait=True, timeout=None):
+        return self._method('flush', wait, timeout=timeout)
+
+    def setContrast(self, contrast, timeout=None):
+        return self._method('setContrast', contrast, timeout=timeout)
+
+    def blitAsset(self, pack, name, x=0, y=0, timeout=None):
+        return self._method('blitAsset', pack, name, x, y, timeout=timeout)
+
+    def scroll(self, lines, color='black', timeout=None):
+        return self._method('scroll', lines, color, timeout=timeout)
+
+    def showInfo(self, timeout=None):
+        return self._method('showInfo', timeout=timeout)
+
+    def openScreen(self, timeout=None):
+        return self._method('openScreen', timeout=timeout)
+
+    def closeScreen(self, timeout=None):
+        return self._method('closeScreen', timeout=timeout)
+
+    @asynccontextmanager
+    async def frame(self):
+        """Batch the draws awaited in an `async with` block into one flush"""
+        await self._method('begin')
+        try:
+            yield self
+        finally:
+            await self._method('commit')
+
+    async def events(self, pin=KEY_PIN, **button_args):
+        """Async iterator over ButtonEvents from the key on pin: `async for event in ascreen.events(): ...`"""
+        from button_input import Button
+        button = self._buttons.get(pin)
+        if button is None:
+            button = self._buttons[pin] = Button(pin, gpio=self.screen.gpio, **button_args)
+        async for event in button.events():
+            yield event
+
+    def stats(self):
+        with self._lock:
+            queued = sum(call.state == QUEUED for call in self._queued)
+        return {'calls': self.calls, 'coalesced': self.calls_coalesced, 'superseded': self.calls_superseded,
+                'cancelled': self.calls_cancelled, 'timeouts': self.timeouts, 'queued': queued}
+
+    async def close(self):
+        """Wait for queued calls, release the buttons and the screen's pins, and stop the worker"""
+        for button in self._buttons.values():
+            button.close()
+        self._buttons = {}
+        try:
+            await self._method('closeGPIO')
+        finally:
+            if self._own_executor:
+                self._executor.shutdown(wait=False)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def _method(self, name, *args, timeout=None):
+        return self._submit(getattr(self.screen, name), args, {}, None, timeout)
+
+    def _draw(self, name, rect, cover, args, timeout):
+        return self._submit(getattr(self.screen, name), args, {}, rect, timeout, cover=cover)
+
+    def _submit(self, fn, args, kwargs, rect, timeout, cover=None, supersede=False):
+        """Queue fn on the worker, or put it in place of a queued draw it paints over; returns an awaitable Task"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            self.calls += 1
+            call = self._find_covered(rect, cover) if cover is not None else None
+            if call is not None:
+                call.fn, call.args, call.kwargs, call.rect = fn, args, kwargs, rect
+                call.waiters += 1
+                self.calls_coalesced += 1
+            else:
+                if supersede:
+                    for queued in reversed(self._queued):
+                        if queued.state != QUEUED:
+                            continue
+                        if queued.rect is None:
+                            break  # Not a draw; what came before it stays
+                        queued.state = SUPERSEDED
+                        self.calls_superseded += 1
+                call = _Call(fn, args, kwargs, rect)
+                self._queued.append(call)
+                call.future = self._executor.submit(self._run, call)
+        return loop.create_task(self._wait(call, self.timeout if timeout is None else timeout))
+
+    def _find_covered(self, rect, cover):
+        """Newest queued draw lying entirely under cover, with nothing queued after it overlapping rect"""
+        for call in reversed(self._queued):
+            if call.state != QUEUED:
+                continue
+            if call.rect is None:
+                return None
+            if _contains(cover, call.rect):
+                return call
+            if _overlap(call.rect, rect):
+                return None
+        return None
+
+    def _run(self, call):
+        with self._lock:
+            self._queued.remove(call)
+            state, call.state = call.state, RUNNING
+        if state != QUEUED:
+            return None
+        return call.fn(*call.args, **call.kwargs)
+
+    async def _wait(self, call, timeout):
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(call.future)), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if isinstance(e, asyncio.TimeoutError):
+                    self.timeouts += 1
+                call.waiters -= 1
+                if call.waiters == 0 and call.state == QUEUED:
+                    call.state = CANCELLED
+                    self.calls_cancelled += 1
+            raise
+
+
+async def _probe_latency(stop, interval=0.001):
+    """How late each `asyncio.sleep(interval)` wakes up, in seconds, until stop is set"""
+    lags = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - t0 - interval)
+    return lags
+
+
+async def _draw_load(target, stop, awaited):
+    """Full-rate drawing: a large repaint per frame plus status bar updates sent while it is in flight"""
+    width, height = target.screen.buffer.size if awaited else target.buffer.size
+    colors = ('navy', 'darkgreen', 'maroon', 'purple')
+    frames = 0
+    while not stop.is_set():
+        color = colors[frames % len(colors)]
+        if awaited:
+            repaint = target.drawRect(0, 20, width - 1, height - 21, color)
+            for i in range(4):
+                target.drawRect(0, 0, width - 1, 18, colors[(frames + i) % len(colors)])
+                await asyncio.sleep(0.001)
+            await repaint
+        else:
+            # The blocking way: call the Screen straight from a coroutine
+            target.drawRect(0, 20, width - 1, height - 21, color)
+            for i in range(4):
+                target.drawRect(0, 0, width - 1, 18, colors[(frames + i) % len(colors)])
+                await asyncio.sleep(0.001)
+        frames += 1
+    return frames
+
+
+async def measure(screen_args, seconds=3.0):
+    """Event-loop lag while idle, while drawing through AsyncScreen, and while calling the Screen directly"""
+    results = {}
+    ascreen = await AsyncScreen.create(**screen_args)
+    if ascreen.screen.emulator is not None:
+        # Let the emulated bus take as long as the real one, or the blocking case looks free
+        ascreen.screen.spidev.realtime = True
+    try:
+        for mode in ('idle', 'async', 'blocking'):
+            stop = asyncio.Event()
+            probe = asyncio.create_task(_probe_latency(stop))
+            load = None
+            if mode != 'idle':
+                load = asyncio.create_task(_draw_load(ascreen if mode == 'async' else ascreen.screen,
+                                                      stop, mode == 'async'))
+            await asyncio.sleep(seconds)
+            stop.set()
+            lags = await probe
+            frames = await load if load is not None else 0
+            lags.sort()
+            results[mode] = {
+                'fps': frames / seconds,
+                'lag_p50_ms': statistics.median(lags) * 1000,
+                'lag_p99_ms': lags[int(len(lags) * 0.99)] * 1000,
+                'lag_max_ms': lags[-1] * 1000,
+            }
+        results['async']['stats'] = ascreen.stats()
+    finally:
+        await ascreen.close()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Measure event-loop latency while the ST7735 runs at full rate')
+    parser.add_argument('--seconds', type=float, default=3.0, help='Length of each measurement')
+    parser.add_argument('--emulator', action='store_true', help='Draw on the emulated panel')
+    parser.add_argument('--native-fb', action='store_true', help='Use the native framebuffer path')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    screen_args = {'native_fb': args.native_fb, 'backend': 'emulator' if args.emulator else None}
+    results = asyncio.run(measure(screen_args, args.seconds))
+    for mode, r in results.items():
+        print(f"{mode:9s} {r['fps']:6.1f} fps   loop lag p50 {r['lag_p50_ms']:6.2f} ms   "
+              f"p99 {r['lag_p99_ms']:6.2f} ms   max {r['lag_max_ms']:6.2f} ms")
+    stats = results['async']['stats']
+    print(f"async calls: {stats['calls']}, coalesced {stats['coalesced']}, superseded {stats['superseded']}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
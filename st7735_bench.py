@@ -0,0 +1,129 @@
+"""Display throughput benchmarks for the Screen driver
+
+Each operation is timed per call, with SPI traffic read from the bus counters,
+and the results are returned as a JSON-ready dict that can be compared between
+releases. Works against the real panel or the emulated backend; the emulated
+bus is made to take as long as the wire would, so fps and latency compare.
+"""
+import json
+import os
+import platform
+import tempfile
+import time
+
+from PIL import Image
+
+COLORS = ["red", "green", "blue", "yellow", "cyan", "magenta", "white"]
+
+
+def _percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100.0 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def _make_test_image(path, size):
+    img = Image.new('RGB', size)
+    w, h = size
+    for y in range(h):
+        for x in range(w):
+            img.putpixel((x, y), (x * 255 // w, y * 255 // h, 128))
+    img.save(path)
+
+
+def _operations(screen, image_path):
+    w, h = screen.buffer.size
+
+    def full_frame(i):
+        screen._mark_all_dirty()
+        screen.flush(wait=False)
+
+    return [
+        ('drawPoint', lambda i: screen.drawPoint((i * 7) % w, (i * 13) % h, COLORS[i % len(COLORS)])),
+        ('drawLine', lambda i: screen.drawLine(0, i % h, w - 1, h - 1 - i % h, COLORS[i % len(COLORS)])),
+        ('drawRect', lambda i: screen.drawRect(i % (w // 2), i % (h // 2), 20, 20, COLORS[i % len(COLORS)])),
+        ('drawCircle', lambda i: screen.drawCircle(w // 2, h // 2, 5 + i % 20, COLORS[i % len(COLORS)])),
+        ('drawText', lambda i: screen.drawText(5, 5, f"Count {i}", COLORS[i % len(COLORS)], fontSize=16)),
+        ('drawImage', lambda i: screen.drawImage(image_path, 0, 0)),
+        ('clearScreen', lambda i: screen.clearScreen(COLORS[i % len(COLORS)])),
+        ('drawChessboard', lambda i: screen.drawChessboard()),
+        ('fullFrame', full_frame),
+    ]
+
+
+def measure(screen, op, iterations):
+    """Time iterations of op(i), waiting for each frame to reach the panel"""
+    latencies = []
+    bus_before = screen.busStats()
+    cpu_start = time.process_time()
+    wall_start = time.perf_counter()
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        op(i)
+        screen.flush(wait=True)
+        latencies.append(time.perf_counter() - t0)
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+    bus_after = screen.busStats()
+
+    latencies.sort()
+    result = {
+        'iterations': iterations,
+        'fps': iterations / wall if wall > 0 else 0.0,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'cpu_ms_per_op': cpu / iterations * 1000,
+    }
+    for key in ('bytes', 'transactions', 'dc_writes'):
+        if key in bus_after:
+            result[f'spi_{key}_per_op'] = (bus_after[key] - bus_before.get(key, 0)) / iterations
+    return result
+
+
+def runBenchmarks(screen, iterations=100, operations=None):
+    """Run every primitive (or just the named ones) and return a JSON-ready report"""
+    tmpdir = tempfile.mkdtemp(prefix='st7735_bench_')
+    image_path = os.path.join(tmpdir, 'bench.png')
+    _make_test_image(image_path, screen.buffer.size)
+    results = {}
+    spidev = screen.spidev if screen.emulator is not None else None
+    if spidev is not None:
+        # The emulated bus is otherwise instant and the timings would be meaningless
+        realtime, spidev.realtime = spidev.realtime, True
+    try:
+        for name, op in _operations(screen, image_path):
+            if operations and name not in operations:
+                continue
+            op(0)  # Warm caches so the first iteration isn't an outlier
+            screen.flush(wait=True)
+            results[name] = measure(screen, op, iterations)
+    finally:
+        if spidev is not None:
+            spidev.realtime = realtime
+        os.remove(image_path)
+        os.rmdir(tmpdir)
+
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'backend': screen.backend,
+            'rotation': screen.rotation,
+            'native_fb': screen.native_fb,
+            'bus_speed_hz': screen.bus_speed_hz,
+            'async': screen._render_thread is not None,
+            'size': list(screen.buffer.size),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+
+def writeReport(report, path=None):
+    """Write the report as JSON to path, or return it as a string when no path is given"""
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text + '\n')
+    return text
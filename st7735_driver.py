@@ -1,25 +1,662 @@
-from luma.core.interface.serial import spi
-from luma.lcd.device import st7735
 from PIL import Image, ImageDraw, ImageFont
-from luma.core.render import canvas
-import RPi.GPIO as GPIO
 import time
 import os
 import sys
+import math
+import logging
+import functools
+from contextlib import contextmanager
+from collections import OrderedDict
+import threading
+import zlib
 
-# GPIO Pin definitions for easier modification
-BL_PIN = 4       # Backlight pin
-DC_PIN = 24      # Data/Command pin
-RST_PIN = 25     # Reset pin
+from st7735_pins import BL_PIN, DC_PIN, RST_PIN, SPI_PORT, SPI_DEVICE, KEY_PIN
 
-# SPI interface definition
-SPI_PORT = 0     # SPI port
-SPI_DEVICE = 0   # SPI device (CE0)
+# luma, RPi.GPIO and numpy are imported on first use, see _numpy() and _rpi_gpio()
+np = None
+
+logger = logging.getLogger(__name__)
+
+# Reset timing from the ST7735 datasheet: RESX low for at least 10 us, then up to
+# 120 ms before the controller accepts commands such as sleep-out
+RESET_PULSE = 10e-6
+RESET_RECOVERY = 0.120
+
+# Fonts tried in order for the screen font
+FONT_CANDIDATES = [
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',  # Common Raspberry Pi font
+    '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
+    '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
+    '/usr/share/fonts/truetype/ttf-dejavu/DejaVuSans.ttf',
+]
+
+# ST7735 commands used for windowed (partial) updates
+CMD_CASET = 0x2A   # Column address set
+CMD_RASET = 0x2B   # Row address set
+CMD_RAMWR = 0x2C   # Memory write
+CMD_COLMOD = 0x3A  # Interface pixel format
+CMD_MADCTL = 0x36  # Memory data access control
+CMD_DISPON = 0x29  # Display on
+CMD_NOP = 0x00     # No operation; data bytes that follow it are ignored
+CMD_NORON = 0x13   # Normal display mode, leaves vertical scrolling
+CMD_VSCRDEF = 0x33  # Vertical scroll area: top fixed, scroll and bottom fixed line counts
+CMD_VSCSAD = 0x37   # Frame memory line shown at the top of the scroll area
+COLMOD_18BIT = 0x06  # 3 bytes per pixel, matches PIL "RGB" byte order
+COLMOD_16BIT = 0x05  # 2 bytes per pixel, RGB565 big-endian (native framebuffer mode)
+
+# Gate lines in the ST7735 frame memory; hardware scrolling moves content along them.
+# luma's MADCTL (MV set) maps these to panel columns, i.e. buffer rows for rotation 1 and 3
+PANEL_LINES = 162
+
+# SPI clock rates luma's spi interface accepts; the ST7735 is specified up to about 15 MHz,
+# but many modules run reliably faster (see Screen.calibrateBus)
+BUS_SPEEDS = [int(mhz * 1000000) for mhz in (0.5, 1, 2, 4, 8, 16, 20, 24, 28, 32, 36, 40, 44, 48, 50, 52)]
+DEFAULT_BUS_SPEED_HZ = 8000000
+
+# Damage tracking: beyond this many separate windows, send their union instead
+MAX_DAMAGE_RECTS = 8
+
+# PIL transpose that matches luma's preprocess() rotation for each rotate value
+_TRANSPOSE = getattr(Image, 'Transpose', Image)
+ROTATE_TRANSPOSE = {
+    1: _TRANSPOSE.ROTATE_270,  # 90 degrees clockwise
+    2: _TRANSPOSE.ROTATE_180,
+    3: _TRANSPOSE.ROTATE_90,   # 270 degrees clockwise
+}
+
+def _merge_rect(rects, rect):
+    """Add rect to a damage list, absorbing every region that overlaps or touches it"""
+    merged = True
+    while merged:
+        merged = False
+        for other in rects:
+            if (other[0] <= rect[2] and rect[0] <= other[2] and
+                    other[1] <= rect[3] and rect[1] <= other[3]):
+                rect = [min(rect[0], other[0]), min(rect[1], other[1]),
+                        max(rect[2], other[2]), max(rect[3], other[3])]
+                rects.remove(other)
+                merged = True
+                break
+    rects.append(rect)
+
+    # Too many small windows cost more in commands than they save in pixels
+    if len(rects) > MAX_DAMAGE_RECTS:
+        rects[:] = [[min(r[0] for r in rects), min(r[1] for r in rects),
+                     max(r[2] for r in rects), max(r[3] for r in rects)]]
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy():
+    """Import numpy on first use; returns None when it is not installed"""
+    global np
+    try:
+        import numpy
+    except ImportError:  # Only needed for the native RGB565 framebuffer
+        return None
+    np = numpy
+    return np
+
+
+@functools.lru_cache(maxsize=None)
+def _rpi_gpio():
+    try:
+        import RPi.GPIO as GPIO
+    except (ImportError, RuntimeError):  # Not on a Raspberry Pi; only the emulated backend is usable
+        return None
+    return GPIO
+
+
+@functools.lru_cache(maxsize=None)
+def _find_font():
+    """First installed font from FONT_CANDIDATES, resolved once per process"""
+    for path in FONT_CANDIDATES:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _device_class():
+    """luma's st7735, imported on first use and extended for fast and warm starts"""
+    from luma.lcd.device import st7735
+
+    class FastST7735(st7735):
+        """st7735 that leaves the blank first frame to Screen and can skip its init sequence
+
+        luma clears the panel during __init__ by sending a full frame as a Python
+        list; Screen sends that frame through its own bulk path instead. With
+        warm=True nothing at all is sent during __init__, for a panel that is
+        already initialised and showing the previous process's content.
+        """
+        def __init__(self, *args, warm=False, **kwargs):
+            self._warm = warm
+            self._initialising = True
+            super().__init__(*args, **kwargs)
+            self._initialising = False
+
+        def command(self, cmd, *args):
+            if self._initialising and self._warm:
+                return
+            super().command(cmd, *args)
+
+        def clear(self):
+            if self._initialising:
+                return
+            super().clear()
+
+    return FastST7735
+
+
+def rgb888_to_rgb565(pixels, out=None):
+    """Pack an (h, w, 3) uint8 array into big-endian RGB565, the panel's 16-bit byte order"""
+    np = _numpy()
+    if out is None:
+        out = np.empty(pixels.shape[:2], dtype='>u2')
+    r = pixels[..., 0].astype(np.uint16)
+    g = pixels[..., 1].astype(np.uint16)
+    b = pixels[..., 2].astype(np.uint16)
+    np.bitwise_or((r & 0xF8) << 8, (g & 0xFC) << 3, out=out, casting='unsafe')
+    out |= b >> 3
+    return out
+
+
+def rgb565_to_rgb888(pixels):
+    """Expand an RGB565 array back to (h, w, 3) uint8, replicating high bits into the low ones"""
+    np = _numpy()
+    v = pixels.astype(np.uint16)
+    rgb = np.empty(v.shape + (3,), dtype=np.uint8)
+    r = (v >> 11) & 0x1F
+    g = (v >> 5) & 0x3F
+    b = v & 0x1F
+    rgb[..., 0] = (r << 3) | (r >> 2)
+    rgb[..., 1] = (g << 2) | (g >> 4)
+    rgb[..., 2] = (b << 3) | (b >> 2)
+    return rgb
+
+
+def rgb565_bytes_to_image(data, size):
+    """Decode big-endian RGB565 bytes into a PIL RGB image of the given (width, height)"""
+    # PIL's "BGR;16" unpacks the little-endian form, so swap each pixel's bytes first
+    swapped = bytearray(len(data))
+    swapped[0::2] = data[1::2]
+    swapped[1::2] = data[0::2]
+    return Image.frombytes('RGB', size, bytes(swapped), 'raw', 'BGR;16')
+
+
+# GPIO pins and bus locks shared by the Screen instances of this process
+_RESOURCE_LOCK = threading.Lock()
+_PIN_USERS = {}  # (gpio module, pin) -> number of Screens using the pin
+_BUS_LOCKS = {}  # (gpio module, 'spi', port) or (gpio module, 'dc', pin) -> RLock
+
+
+def _claim_pins(gpio, pins):
+    """Count a Screen as a user of pins; returns those no other Screen was already using"""
+    fresh = []
+    with _RESOURCE_LOCK:
+        for pin in pins:
+            key = (id(gpio), pin)
+            if not _PIN_USERS.get(key):
+                fresh.append(pin)
+            _PIN_USERS[key] = _PIN_USERS.get(key, 0) + 1
+    return fresh
+
+
+def _release_pins(gpio, pins):
+    """Drop a Screen's use of pins; returns those no Screen uses any more"""
+    free = []
+    with _RESOURCE_LOCK:
+        for pin in pins:
+            key = (id(gpio), pin)
+            count = _PIN_USERS.get(key, 0) - 1
+            if count <= 0:
+                _PIN_USERS.pop(key, None)
+                free.append(pin)
+            else:
+                _PIN_USERS[key] = count
+    return free
+
+
+def _bus_lock(gpio, port, dc_pin):
+    """Lock serialising panels that share an SPI bus or a DC line; panels sharing neither get separate locks"""
+    keys = [(id(gpio), 'spi', port), (id(gpio), 'dc', dc_pin)]
+    with _RESOURCE_LOCK:
+        found = [_BUS_LOCKS[k] for k in keys if k in _BUS_LOCKS]
+        if len(found) == 2 and found[0] is not found[1]:
+            # Open screens already hold both locks, so they cannot be merged any more
+            logger.warning(f"DC pin {dc_pin} is shared with a screen on another SPI bus; "
+                           f"open the screens sharing it on one bus")
+        lock = found[0] if found else threading.RLock()
+        for key in keys:
+            _BUS_LOCKS.setdefault(key, lock)
+    return lock
+
+
+def _spidev_bufsiz(default=4096):
+    """Largest single transfer the spidev kernel driver accepts"""
+    try:
+        with open('/sys/module/spidev/parameters/bufsiz') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return default
+
+
+class CountingSpiDev:
+    """Wraps spidev.SpiDev and counts bytes and transfers the way st7735_emulator.FakeSPI does"""
+    def __init__(self, dev, bufsiz=None):
+        self.__dict__['_dev'] = dev
+        self.__dict__['bufsiz'] = bufsiz or _spidev_bufsiz()
+        self.reset_stats()
+
+    def __getattr__(self, name):
+        return getattr(self._dev, name)
+
+    def __setattr__(self, name, value):
+        # Bus settings such as max_speed_hz and mode belong to the real device
+        if name in self.__dict__:
+            self.__dict__[name] = value
+        else:
+            setattr(self._dev, name, value)
+
+    def reset_stats(self):
+        self.__dict__.update(bytes_written=0, transactions=0, bus_time=0.0)
+
+    def stats(self):
+        return {'bytes': self.bytes_written, 'transactions': self.transactions, 'bus_time': self.bus_time}
+
+    def _count(self, n, transfers=1):
+        self.__dict__['bytes_written'] += n
+        self.__dict__['transactions'] += transfers
+        self.__dict__['bus_time'] += n * 8 / (self._dev.max_speed_hz or 1)
+
+    def writebytes(self, data):
+        self._dev.writebytes(data)
+        self._count(len(data))
+
+    def writebytes2(self, data):
+        n = memoryview(data).nbytes
+        self._dev.writebytes2(data)
+        self._count(n, -(-n // self.bufsiz))
+
+    def xfer(self, data, *args):
+        self._count(len(data))
+        return self._dev.xfer(data, *args)
+
+    def xfer2(self, data, *args):
+        self._count(len(data))
+        return self._dev.xfer2(data, *args)
+
+    def xfer3(self, data, *args):
+        self._count(len(data), -(-len(data) // self.bufsiz))
+        return self._dev.xfer3(data, *args)
+
+
+class SpiTransport:
+    """Command and pixel path to the panel, below luma: whole-buffer writes and a window cache
+
+    Pixel data goes to spidev.writebytes2 in one call, which splits it by the
+    kernel's bufsiz, so a frame costs as few ioctls and DC changes as the
+    driver allows. CASET/RASET are only sent when the window differs from the
+    last one, since RAMWR restarts at the window origin anyway.
+    """
+    def __init__(self, serial, bufsiz):
+        self.spidev = serial._spi
+        self.gpio = serial._gpio
+        self.dc = serial._DC
+        self.command_level = serial._cmd_mode
+        self.data_level = serial._data_mode
+        self.bufsiz = bufsiz
+        self._window = (None, None)
+        self.dc_writes = 0
+        self.windows_reused = 0
+
+    def invalidate(self):
+        """Forget the panel's window, e.g. after a reset or commands sent by other code"""
+        self._window = (None, None)
+
+    def command(self, cmd, *params):
+        self.gpio.output(self.dc, self.command_level)
+        self.spidev.writebytes([cmd])
+        self.dc_writes += 1
+        if params:
+            self.data(bytes(params))
+
+    def data(self, data):
+        self.gpio.output(self.dc, self.data_level)
+        self.dc_writes += 1
+        if hasattr(self.spidev, 'writebytes2'):
+            self.spidev.writebytes2(data)
+        else:
+            data = memoryview(data).cast('B')
+            for i in range(0, len(data), self.bufsiz):
+                self.spidev.writebytes(list(data[i:i + self.bufsiz]))
+
+    def window(self, left, top, right, bottom):
+        """Start a RAMWR into the inclusive frame memory window"""
+        columns, rows = (left, right), (top, bottom)
+        if columns != self._window[0]:
+            self.command(CMD_CASET, left >> 8, left & 0xFF, right >> 8, right & 0xFF)
+        if rows != self._window[1]:
+            self.command(CMD_RASET, top >> 8, top & 0xFF, bottom >> 8, bottom & 0xFF)
+        if (columns, rows) == self._window:
+            self.windows_reused += 1
+        self._window = (columns, rows)
+        self.command(CMD_RAMWR)
+
+    def stats(self):
+        return {'dc_writes': self.dc_writes, 'windows_reused': self.windows_reused}
+
+
+class ScreenMetrics:
+    """Flush counters and per-phase timings for a Screen, for exporters and monitoring hooks
+
+    Each flush is split into draw (time spent in drawing calls since the previous
+    flush), convert (cropping, rotating and packing pixels) and transfer (SPI writes).
+    Hooks are called with a dict describing every flush, on the thread that sent it.
+    """
+    def __init__(self):
+        self.flushes = 0
+        self.windows = 0
+        self.bytes_written = 0
+        self.draw_time = 0.0
+        self.convert_time = 0.0
+        self.transfer_time = 0.0
+        self.errors = {}
+        self.last_flush = None
+        self.pending_draw = 0.0  # Draw time not yet attributed to a flush
+        self._hooks = []
+        self._depth = 0    # Nesting of timed drawing calls; only the outermost is timed
+        self._mark = 0.0   # Start of the draw time not yet added to pending_draw
+        self._lock = threading.Lock()
+
+    def addHook(self, callback):
+        self._hooks.append(callback)
+
+    def removeHook(self, callback):
+        self._hooks.remove(callback)
+
+    def countError(self, method):
+        with self._lock:
+            self.errors[method] = self.errors.get(method, 0) + 1
+
+    def endDrawPhase(self):
+        """Close the draw phase of the call in progress, just before its frame is sent or queued"""
+        if self._depth:
+            now = time.perf_counter()
+            self.pending_draw += now - self._mark
+            self._mark = now
+
+    def recordFlush(self, convert, transfer, nbytes, windows):
+        with self._lock:
+            draw, self.pending_draw = self.pending_draw, 0.0
+            self.flushes += 1
+            self.windows += windows
+            self.bytes_written += nbytes
+            self.draw_time += draw
+            self.convert_time += convert
+            self.transfer_time += transfer
+            record = {'draw': draw, 'convert': convert, 'transfer': transfer,
+                      'bytes': nbytes, 'windows': windows, 'time': time.time()}
+            self.last_flush = record
+        for callback in list(self._hooks):
+            try:
+                callback(record)
+            except Exception as e:
+                logger.warning(f"Metrics hook failed: {e}")
+
+    def snapshot(self):
+        """Current counters as a plain dict, e.g. for a Prometheus or JSON exporter"""
+        with self._lock:
+            return {'flushes': self.flushes, 'windows': self.windows, 'bytes_written': self.bytes_written,
+                    'draw_time': self.draw_time, 'convert_time': self.convert_time,
+                    'transfer_time': self.transfer_time, 'errors': dict(self.errors),
+                    'last_flush': self.last_flush}
+
+
+def _timed(method):
+    """Attribute the time spent in a drawing call to the draw phase of the next flush"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        metrics = self.metrics
+        if metrics is None or metrics._depth:
+            return method(self, *args, **kwargs)
+        metrics._depth += 1
+        metrics._mark = time.perf_counter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            metrics._depth -= 1
+            metrics.pending_draw += time.perf_counter() - metrics._mark
+    return wrapper
+
+
+# Upper bound on loaded (path, size) fonts shared by all Screen instances
+FONT_CACHE_SIZE = 32
+
+
+class FontCache:
+    """LRU cache of TrueType fonts keyed by (path, size), so each TTF is parsed once per size"""
+    def __init__(self, maxsize=FONT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._fonts = OrderedDict()
+        self._missing = set()  # Paths that failed to load, so they are not retried on every call
+        self._lock = threading.Lock()
+
+    def get(self, path, size):
+        """Return the font for (path, size), loading it on a miss; raises OSError if it cannot be loaded"""
+        key = (path, size)
+        with self._lock:
+            font = self._fonts.get(key)
+            if font is not None:
+                self._fonts.move_to_end(key)
+                self.hits += 1
+                return font
+            self.misses += 1
+            if path in self._missing:
+                raise OSError(f"cannot open resource: {path}")
+        try:
+            font = ImageFont.truetype(path, size)
+        except OSError:
+            with self._lock:
+                self._missing.add(path)
+            raise
+        with self._lock:
+            self._fonts[key] = font
+            while len(self._fonts) > self.maxsize:
+                self._fonts.popitem(last=False)
+        return font
+
+    def preload(self, path, sizes):
+        for size in sizes:
+            self.get(path, size)
+
+    def clear(self):
+        with self._lock:
+            self._fonts.clear()
+            self._missing.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._fonts), 'maxsize': self.maxsize}
+
+
+FONT_CACHE = FontCache()
+
+# Byte budget for rendered text runs (8-bit coverage masks) shared by all Screen instances
+TEXT_CACHE_BUDGET = 256 * 1024
+
+
+def _font_key(font):
+    # TrueType fonts are identified by file and size; anything else (PIL's bitmap default) by identity
+    path = getattr(font, 'path', None)
+    if path is None:
+        return ('font', id(font))
+    return (path, font.size)
+
+
+class TextCache:
+    """LRU cache of rendered text runs, evicted by total mask size in bytes
+
+    Runs are stored as coverage masks keyed by (font, size, text); the colour is
+    applied when the mask is pasted, so one entry serves every colour.
+    """
+    def __init__(self, budget=TEXT_CACHE_BUDGET):
+        self.budget = budget
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, font, text):
+        """Return (mask, dx, dy): the run's mask and its offset from the draw origin"""
+        key = (_font_key(font), text)
+        with self._lock:
+            run = self._runs.get(key)
+            if run is not None:
+                self._runs.move_to_end(key)
+                self.hits += 1
+                return run
+            self.misses += 1
+        left, top, right, bottom = font.getbbox(text)
+        mask = Image.new('L', (max(1, right - left), max(1, bottom - top)))
+        ImageDraw.Draw(mask).text((-left, -top), text, font=font, fill=255)
+        run = (mask, left, top)
+        with self._lock:
+            if key not in self._runs:
+                self._runs[key] = run
+                self.bytes += mask.width * mask.height
+            while self.bytes > self.budget and len(self._runs) > 1:
+                _, (old, _, _) = self._runs.popitem(last=False)
+                self.bytes -= old.width * old.height
+        return run
+
+    def clear(self):
+        with self._lock:
+            self._runs.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'runs': len(self._runs),
+                'bytes': self.bytes, 'budget': self.budget}
+
+
+TEXT_CACHE = TextCache()
+
+
+# Byte budget for decoded, pre-scaled images shared by all Screen instances
+IMAGE_CACHE_BUDGET = 2 * 1024 * 1024
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.ppm', '.webp')
+_RESAMPLING = getattr(Image, 'Resampling', Image)
+
+
+def _fit_size(size, box, upscale=False):
+    """Largest size with the same aspect ratio as size that fits inside box"""
+    w, h = size
+    scale = min(box[0] / w, box[1] / h)
+    if scale >= 1 and not upscale:
+        return size
+    return (max(1, round(w * scale)), max(1, round(h * scale)))
+
+
+class ImageCache:
+    """LRU cache of decoded images, evicted by total size in bytes
+
+    Entries are keyed by (path, mtime, fit box) and hold the image already
+    converted to RGB and scaled to fit, plus an 'L' mask when the source has
+    transparency, so a cached draw is a single paste. Editing the file changes
+    its mtime, so the stale entry is simply never hit again and ages out.
+    """
+    def __init__(self, budget=IMAGE_CACHE_BUDGET):
+        self.budget = budget
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, box, upscale=False):
+        """Return (image, mask) for path fitted inside box; raises OSError if it cannot be read"""
+        key = (path, os.stat(path).st_mtime_ns, tuple(box), upscale)
+        with self._lock:
+            entry = self._images.get(key)
+            if entry is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+        entry = self._load(path, box, upscale)
+        with self._lock:
+            if key not in self._images:
+                self._images[key] = entry
+                self.bytes += self._entry_bytes(entry)
+            while self.bytes > self.budget and len(self._images) > 1:
+                _, old = self._images.popitem(last=False)
+                self.bytes -= self._entry_bytes(old)
+        return entry
+
+    def prewarm(self, directory, box, upscale=False, extensions=IMAGE_EXTENSIONS):
+        """Load every image file in directory; returns how many were cached"""
+        count = 0
+        for name in sorted(os.listdir(directory)):
+            if not name.lower().endswith(extensions):
+                continue
+            try:
+                self.get(os.path.join(directory, name), box, upscale)
+                count += 1
+            except OSError as e:
+                logger.warning(f"Skipping {name}: {e}")
+        return count
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'images': len(self._images),
+                'bytes': self.bytes, 'budget': self.budget}
+
+    @staticmethod
+    def _entry_bytes(entry):
+        img, mask = entry
+        return img.width * img.height * (4 if mask is not None else 3)
+
+    @staticmethod
+    def _load(path, box, upscale):
+        with Image.open(path) as src:
+            src.load()
+            has_alpha = src.mode in ('RGBA', 'LA', 'PA') or 'transparency' in src.info
+            img = src.convert('RGBA' if has_alpha else 'RGB')
+        size = _fit_size(img.size, box, upscale)
+        if size != img.size:
+            img = img.resize(size, _RESAMPLING.LANCZOS)
+        mask = None
+        if has_alpha:
+            alpha = img.getchannel('A')
+            if alpha.getextrema() != (255, 255):
+                mask = alpha
+            img = img.convert('RGB')
+        return img, mask
+
+
+IMAGE_CACHE = ImageCache()
 
-KEY_PIN = 17     # Button pin
 
 class Screen:
-    def __init__(self, rotation=1, bgr=True, h_offset=0, v_offset=0, contrast=0x70):
+    def __init__(self, rotation=1, bgr=True, h_offset=0, v_offset=0, contrast=0x70, font_sizes=None, native_fb=False,
+                 async_mode=False, backend=None, metrics=False, log_level=None, warm_start=False,
+                 persist=False, port=SPI_PORT, device=SPI_DEVICE, dc_pin=DC_PIN, rst_pin=RST_PIN, bl_pin=BL_PIN,
+                 bus_speed_hz=DEFAULT_BUS_SPEED_HZ):
+        start = time.perf_counter()
+        # Seconds spent in each start-up phase, see startupReport()
+        self.startup = {}
         self.height = 128
         self.width = 160
         self.rotation = rotation
@@ -27,254 +664,1040 @@ class Screen:
         self.h_offset = h_offset
         self.v_offset = v_offset
         self.contrast = contrast
-        self.dc_pin = DC_PIN
-        self.rst_pin = RST_PIN
+        # Bus and pins of this panel; rst_pin/bl_pin may be None when not wired
+        self.port = port
+        self.spi_device = device
+        self.dc_pin = dc_pin
+        self.rst_pin = rst_pin
+        self.bl_pin = bl_pin
+        if bus_speed_hz not in BUS_SPEEDS:
+            raise ValueError(f"Unsupported SPI bus speed {bus_speed_hz} Hz, choose one of {BUS_SPEEDS}")
+        self.bus_speed_hz = bus_speed_hz
+        # Hardware scroll area set by setScrollArea(), or None
+        self._scroll = None
+        # Reuse an already initialised panel: no reset, no init sequence, no blank frame
+        self.warm_start = warm_start
+        # Leave the panel on and its image in place at exit (luma blanks it otherwise), for the next warm start
+        self.persist = persist
+        self._reset_ready = 0.0
+        # Instrumentation is off unless requested; every hot path checks for None
+        self.metrics = ScreenMetrics() if metrics else None
+        # Sets the level of the shared st7735_driver logger, so it applies to every Screen in the process
+        if log_level is not None:
+            logger.setLevel(log_level)
+
+        # 'hardware' drives the real panel, 'emulator' the in-memory one from st7735_emulator
+        self.backend = backend or os.environ.get('ST7735_BACKEND', 'hardware')
+        self.emulator = None
+        self.spidev = None
+        if self.backend == 'emulator':
+            from st7735_emulator import FakeGPIO, FakeSPI, EmulatedST7735
+            self.gpio = FakeGPIO()
+            self.emulator = EmulatedST7735(self.width, self.height)
+            self.spidev = FakeSPI(self.emulator, self.gpio, self.dc_pin)
+        elif self.backend == 'hardware':
+            self.gpio = _rpi_gpio()
+            try:
+                import spidev
+                self.spidev = CountingSpiDev(spidev.SpiDev())
+            except ImportError:
+                pass  # luma reports the missing spidev module below
+        else:
+            raise ValueError(f"Unknown display backend: {self.backend}")
+        self._pins = [p for p in (bl_pin, dc_pin, rst_pin) if p is not None]
+        fresh_pins = _claim_pins(self.gpio, self._pins)
+        # Held for each command/data sequence, so panels on one bus or DC line never interleave
+        self._bus_lock = _bus_lock(self.gpio, port, dc_pin)
         
         try:
-            print("Initializing SPI interface...")
-            # Hardware reset for ST7735 chip
-            self.reset_display()
+            from luma.core.interface.serial import spi
+            phase = time.perf_counter()
+            self.startup['imports'] = phase - start
+            logger.info("Initializing SPI interface...")
+            # Hardware reset for ST7735 chip; its recovery time overlaps the SPI setup below
+            if not warm_start and rst_pin is not None:
+                if rst_pin in fresh_pins:
+                    self.reset_display(wait=False)
+                else:
+                    # Pulsing a shared reset line would blank the other panel; luma's SWRESET still runs
+                    logger.info(f"Reset pin {rst_pin} is shared with another screen, skipping hardware reset")
             
             # Initialize SPI
-            self.serial = spi(port=SPI_PORT, device=SPI_DEVICE, gpio_DC=self.dc_pin, gpio_RST=self.rst_pin)
-            print("SPI interface initialized successfully")
-            print(f"Parameter settings: rotation={self.rotation}, BGR={self.bgr_mode}, h_offset={self.h_offset}, v_offset={self.v_offset}, contrast=0x{self.contrast:02X}")
+            # luma opens RPi.GPIO itself unless we hand it the emulated one
+            fake_gpio = self.gpio if self.emulator else None
+            # gpio_RST=None: reset_display owns the reset line and its timing
+            bufsiz = getattr(self.spidev, 'bufsiz', None) or _spidev_bufsiz()
+            self.serial = spi(spi=self.spidev, gpio=fake_gpio, port=port, device=device,
+                              bus_speed_hz=bus_speed_hz, transfer_size=bufsiz,
+                              gpio_DC=self.dc_pin, gpio_RST=None)
+            self.transport = SpiTransport(self.serial, bufsiz)
+            logger.info("SPI interface initialized successfully")
+            logger.info(f"Parameter settings: rotation={self.rotation}, BGR={self.bgr_mode}, h_offset={self.h_offset}, v_offset={self.v_offset}, contrast=0x{self.contrast:02X}")
+            device_class = _device_class()
+            self._wait_reset()
+            phase = self._startup_phase('reset_spi', phase)
             
-            # Initialize ST7735 device
-            self.device = st7735(self.serial, width=self.width, height=self.height, 
-                                 rotate=self.rotation, h_offset=self.h_offset, 
-                                 v_offset=self.v_offset, bgr=self.bgr_mode)
-            # Set contrast
-            self.device.contrast(self.contrast)
-            print("ST7735 display initialized successfully")
+            with self._bus_lock:
+                # Initialize ST7735 device
+                self.device = device_class(self.serial, width=self.width, height=self.height,
+                                           rotate=self.rotation, h_offset=self.h_offset,
+                                           v_offset=self.v_offset, bgr=self.bgr_mode, gpio=fake_gpio,
+                                           warm=warm_start)
+                self.device.persist = persist
+                if warm_start:
+                    # Only the settings this process may have changed; the frame memory is left alone
+                    self.device.command(CMD_MADCTL, 0x60 | (0x08 if self.bgr_mode else 0x00))
+                    # A previous process may have left the panel scrolled or in partial mode
+                    self.device.command(CMD_VSCRDEF, 0, 0, PANEL_LINES >> 8, PANEL_LINES & 0xFF, 0, 0)
+                    self.device.command(CMD_VSCSAD, 0, 0)
+                    self.device.command(CMD_NORON)
+                    self.device.command(CMD_DISPON)
+                # Set contrast
+                self.device.contrast(self.contrast)
+                # Optional panel-native RGB565 output: damaged regions are converted with NumPy as they are sent
+                if native_fb and _numpy() is None:
+                    logger.warning("numpy is not installed, native framebuffer disabled")
+                self.native_fb = bool(native_fb and np is not None)
+                # Pin the pixel format used by our windowed writes
+                self.device.command(CMD_COLMOD, COLMOD_16BIT if self.native_fb else COLMOD_18BIT)
+            logger.info("ST7735 display initialized successfully")
             self.buffer = Image.new(self.device.mode, self.device.size)
-            print("Image buffer created successfully")
+            # Regions of self.buffer not yet sent to the panel, as (x0, y0, x1, y1) with exclusive x1/y1
+            self._damage = []
+            # Nesting depth of begin()/commit(); while above zero, primitives only draw into self.buffer
+            self._batch_depth = 0
+            logger.info("Image buffer created successfully")
+            phase = self._startup_phase('panel_init', phase)
+            if not warm_start:
+                # The blank frame luma would have sent, through the bulk write path
+                self._mark_all_dirty()
+                self._flush()
+                phase = self._startup_phase('first_frame', phase)
         except Exception as e:
-            print(f"Error initializing display: {e}")
-            print("Please check if SPI interface is enabled, you can enable it via 'sudo raspi-config'")
-            print("Make sure you can see SPI devices using the 'ls -l /dev/spidev*' command")
-            print("Check connections and try running this program with 'sudo'")
+            logger.error(f"Error initializing display: {e}")
+            logger.error("Please check if SPI interface is enabled, you can enable it via 'sudo raspi-config'")
+            logger.error("Make sure you can see SPI devices using the 'ls -l /dev/spidev*' command")
+            logger.error("Check connections and try running this program with 'sudo'")
             sys.exit(1)
             
-        # Use default fonts available on Raspberry Pi
-        self.fontType = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'  # Common Raspberry Pi font
-        self.fontTypeEN = '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'  # Common Raspberry Pi font
-        
-        # Check if font files exist
-        if not os.path.exists(self.fontType):
-            print(f"Warning: Font file {self.fontType} not found, trying fallback fonts")
-            # Try other possibly existing fonts
-            fallback_fonts = [
-                '/usr/share/fonts/truetype/freefont/FreeSans.ttf',
-                '/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf',
-                '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
-                '/usr/share/fonts/truetype/ttf-dejavu/DejaVuSans.ttf'
-            ]
-            
-            for font in fallback_fonts:
-                if os.path.exists(font):
-                    self.fontType = font
-                    self.fontTypeEN = font
-                    print(f"Using fallback font: {font}")
-                    break
-            else:
-                # If all common fonts don't exist, use PIL's default font
-                print("Warning: All fallback fonts do not exist, using default font")
-                self.fontSize = 16  # Default font is usually smaller
-                self.font = ImageFont.load_default()
-                self.draw = ImageDraw.Draw(self.buffer)
-                return
-                
+        self.draw = ImageDraw.Draw(self.buffer)
+        self._loadFonts()
+        if font_sizes:
+            self.preloadFonts(font_sizes)
+        phase = self._startup_phase('fonts', phase)
+
+        # Background presentation (see startAsync); all of it is guarded by _render_cond
+        self._render_cond = threading.Condition()
+        self._render_thread = None
+        self._render_stop = False
+        self._render_busy = False
+        self._pending = None  # Latest submitted (image, damage) not yet taken by the render thread
+        self.frames_submitted = 0
+        self.frames_presented = 0
+        self.frames_dropped = 0
+        if async_mode:
+            self.startAsync()
+        self.startup['total'] = time.perf_counter() - start
+        logger.info("Screen ready in " + ", ".join(f"{k} {v:.1f} ms" for k, v in self.startupReport().items()))
+
+    def _startup_phase(self, name, since):
+        now = time.perf_counter()
+        self.startup[name] = now - since
+        return now
+
+    def startupReport(self):
+        """Start-up phases in milliseconds"""
+        return {name: round(seconds * 1000, 2) for name, seconds in self.startup.items()}
+    
+    def _loadFonts(self):
+        """Pick the screen font, falling back to other common fonts and finally PIL's default"""
+        # Use default fonts available on Raspberry Pi, resolved once per process
+        font = _find_font()
+        if font is None:
+            # If all common fonts don't exist, use PIL's default font
+            logger.warning("All fallback fonts do not exist, using default font")
+            self.fontType = self.fontTypeEN = FONT_CANDIDATES[0]
+            self.fontSize = 16  # Default font is usually smaller
+            self.font = ImageFont.load_default()
+            self._default_font = True
+            return
+        if font != FONT_CANDIDATES[0]:
+            logger.info(f"Using fallback font: {font}")
+        self.fontType = font
+        self.fontTypeEN = font
+
         self.fontSize = 24
+        self._default_font = False
         try:
-            self.font = ImageFont.truetype(self.fontType, self.fontSize)
-            print(f"Successfully loaded font: {self.fontType}")
+            self.font = FONT_CACHE.get(self.fontType, self.fontSize)
+            logger.info(f"Successfully loaded font: {self.fontType}")
         except Exception as e:
-            print(f"Error loading font: {e}, using default font")
+            self._error('_loadFonts', f"Error loading font: {e}, using default font")
             self.font = ImageFont.load_default()
-            
-        self.draw = ImageDraw.Draw(self.buffer)
+            self._default_font = True
     
-    def reset_display(self):
-        """Hardware reset for ST7735 chip"""
+    def reset_display(self, wait=True):
+        """Hardware reset for ST7735 chip, using the datasheet's minimum timings
+
+        With wait=False the recovery time runs on while other start-up work
+        happens; _wait_reset() then sleeps for whatever is left of it.
+        """
+        if self.rst_pin is None:
+            return
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(self.rst_pin, GPIO.OUT)
+            self.gpio.setmode(self.gpio.BCM)
+            self.gpio.setup(self.rst_pin, self.gpio.OUT)
             
             # Reset sequence
-            GPIO.output(self.rst_pin, GPIO.HIGH)
-            time.sleep(0.1)
-            GPIO.output(self.rst_pin, GPIO.LOW)
-            time.sleep(0.1)  # Reset pulse
-            GPIO.output(self.rst_pin, GPIO.HIGH)
-            time.sleep(0.1)  # Wait for chip to stabilize
+            self.gpio.output(self.rst_pin, self.gpio.HIGH)
+            self.gpio.output(self.rst_pin, self.gpio.LOW)
+            time.sleep(RESET_PULSE)  # Reset pulse
+            self.gpio.output(self.rst_pin, self.gpio.HIGH)
+            self._reset_ready = time.monotonic() + RESET_RECOVERY
             
-            print("ST7735 chip hardware reset completed")
+            logger.info("ST7735 chip hardware reset completed")
         except Exception as e:
-            print(f"Error resetting ST7735 chip: {e}")
+            self._error('reset_display', f"Error resetting ST7735 chip: {e}")
+        if wait:
+            self._wait_reset()
+
+    def _wait_reset(self):
+        """Sleep out the rest of the post-reset recovery time, if any"""
+        remaining = self._reset_ready - time.monotonic()
+        if remaining > 0:
+            time.sleep(remaining)
 
     def initGPIO(self):
         try:
-            GPIO.setmode(GPIO.BCM)
-            GPIO.setup(BL_PIN, GPIO.OUT)
-            print("GPIO initialized successfully")
+            self.gpio.setmode(self.gpio.BCM)
+            if self.bl_pin is not None:
+                self.gpio.setup(self.bl_pin, self.gpio.OUT)
+            logger.info("GPIO initialized successfully")
         except Exception as e:
-            print(f"GPIO initialization error: {e}")
-            print("Root privileges may be required, try using 'sudo' to run this program")
+            self._error('initGPIO', f"GPIO initialization error: {e}")
+            logger.error("Root privileges may be required, try using 'sudo' to run this program")
 
     def closeGPIO(self):
+        # Make sure queued frames reach the panel before the pins are released
+        self.stopAsync()
         try:
-            GPIO.cleanup()
-            print("GPIO cleanup completed")
+            # Only this screen's pins, and only those no other screen still uses
+            free, self._pins = _release_pins(self.gpio, self._pins), []
+            if free:
+                self.gpio.cleanup(free)
+            logger.info("GPIO cleanup completed")
         except Exception as e:
-            print(f"GPIO cleanup error: {e}")
+            self._error('closeGPIO', f"GPIO cleanup error: {e}")
 
     def openScreen(self):
         try:
-            GPIO.output(BL_PIN, GPIO.HIGH)
-            print("Screen backlight turned on")
+            if self.bl_pin is not None:
+                self.gpio.output(self.bl_pin, self.gpio.HIGH)
+            logger.info("Screen backlight turned on")
         except Exception as e:
-            print(f"Error turning on screen backlight: {e}")
+            self._error('openScreen', f"Error turning on screen backlight: {e}")
 
     def closeScreen(self):
         try:
-            GPIO.output(BL_PIN, GPIO.LOW)
-            print("Screen backlight turned off")
+            if self.bl_pin is not None:
+                self.gpio.output(self.bl_pin, self.gpio.LOW)
+            logger.info("Screen backlight turned off")
         except Exception as e:
-            print(f"Error turning off screen backlight: {e}")
+            self._error('closeScreen', f"Error turning off screen backlight: {e}")
             
+    def busStats(self):
+        """SPI traffic since start-up (or the last spidev.reset_stats()): bytes, transfers, wire time,
+        plus DC line writes and reused windows of the pixel path"""
+        stats = self.spidev.stats() if self.spidev is not None else {}
+        stats.update(self.transport.stats())
+        return stats
+
+    def setBusSpeed(self, bus_speed_hz):
+        """Change the SPI clock from now on; must be one of BUS_SPEEDS"""
+        if bus_speed_hz not in BUS_SPEEDS:
+            raise ValueError(f"Unsupported SPI bus speed {bus_speed_hz} Hz, choose one of {BUS_SPEEDS}")
+        with self._bus_lock:
+            self.serial._spi.max_speed_hz = bus_speed_hz
+        self.bus_speed_hz = bus_speed_hz
+        logger.info(f"SPI bus speed set to {bus_speed_hz / 1e6:g} MHz")
+
+    def calibrateBus(self, speeds=None, rounds=3, margin=0):
+        """Step the SPI clock up through speeds and keep the fastest one whose transfers verify
+
+        Transfers are checked by reading them back when MOSI is looped to MISO,
+        or by the emulated panel's checksum of the pixel data it received.
+        Without either there is nothing to verify against, so the speed is left
+        alone and only the throughput is measured. The frame is repainted
+        afterwards whenever the test pattern went to the panel. margin steps back that many
+        speeds from the fastest good one. Returns the chosen speed, achieved
+        MB/s and the result of every step.
+        """
+        spidev = self.serial._spi
+        speeds = sorted(speeds or BUS_SPEEDS)
+        frame = self.width * self.height * (2 if self.native_fb else 3)
+        pattern = os.urandom(frame)
+        original = self.bus_speed_hz
+        steps = []
+        good = []
+        self.flush(wait=True)
+        with self._bus_lock:
+            spidev.max_speed_hz = speeds[0]
+            method = self._verify_method(pattern)
+            for hz in speeds if method else [original]:
+                spidev.max_speed_hz = hz
+                ok = True
+                wire = self.busStats().get('bus_time', 0.0)
+                t0 = time.perf_counter()
+                for _ in range(rounds):
+                    ok = self._verify_transfer(method, pattern) and ok
+                # The emulator moves bytes faster than any wire could; count at least the wire time
+                elapsed = max(time.perf_counter() - t0, self.busStats().get('bus_time', 0.0) - wire)
+                steps.append({'speed_hz': hz, 'ok': ok,
+                              'mb_per_s': rounds * len(pattern) / elapsed / 1e6 if elapsed > 0 else 0.0})
+                if not ok:
+                    break  # Faster clocks only get worse
+                good.append(steps[-1])
+            chosen = good[max(0, len(good) - 1 - margin)] if good else None
+            spidev.max_speed_hz = chosen['speed_hz'] if chosen and method else original
+        if method is None:
+            logger.warning("No loopback or emulated panel to verify transfers against, bus speed unchanged")
+        if method != 'loopback':
+            # The test pattern was written into frame memory (also when unverified); put the frame back
+            self._mark_all_dirty()
+            self.flush(wait=True)
+        self.bus_speed_hz = spidev.max_speed_hz
+        mb_per_s = chosen['mb_per_s'] if chosen else 0.0
+        logger.info(f"SPI bus calibrated ({method or 'unverified'}): {self.bus_speed_hz / 1e6:g} MHz, "
+                    f"{mb_per_s:.2f} MB/s")
+        return {'method': method, 'speed_hz': self.bus_speed_hz, 'mb_per_s': mb_per_s, 'steps': steps}
+
+    def _verify_method(self, pattern):
+        """'loopback' if MISO echoes MOSI, 'panel' on the emulator, else None (called with the bus lock)"""
+        if hasattr(self.serial._spi, 'xfer3'):
+            probe = pattern[:64]
+            self.transport.command(CMD_NOP)
+            self.gpio.output(self.serial._DC, self.serial._data_mode)
+            if bytes(self.serial._spi.xfer3(probe)) == probe:
+                return 'loopback'
+        return 'panel' if self.emulator is not None else None
+
+    def _verify_transfer(self, method, pattern):
+        if method == 'loopback':
+            # After a NOP the panel ignores the data bytes; MISO hands them straight back
+            self.transport.command(CMD_NOP)
+            self.gpio.output(self.serial._DC, self.serial._data_mode)
+            return bytes(self.serial._spi.xfer3(pattern)) == pattern
+        pixels = self.emulator.pixels_written if method == 'panel' else 0
+        self.transport.window(self.h_offset, self.v_offset,
+                              self.h_offset + self.width - 1, self.v_offset + self.height - 1)
+        self.transport.data(pattern)
+        if method == 'panel':
+            # A garbled command byte loses the whole write, so check that it arrived as well
+            checksum = self.emulator.ramChecksum()
+            return (self.emulator.pixels_written - pixels == self.width * self.height and
+                    checksum == zlib.crc32(pattern))
+        return True
+
     def setContrast(self, contrast):
         try:
             self.contrast = contrast
-            self.device.contrast(contrast)
-            print(f"Contrast set to: 0x{contrast:02X}")
+            with self._bus_lock:
+                self.device.contrast(contrast)
+            logger.info(f"Contrast set to: 0x{contrast:02X}")
         except Exception as e:
-            print(f"Error setting contrast: {e}")
+            self._error('setContrast', f"Error setting contrast: {e}")
+
+    def _mark_dirty(self, x0, y0, x1, y1):
+        """Record a damaged region of the buffer, merging it with any overlapping ones"""
+        if x0 > x1:
+            x0, x1 = x1, x0
+        if y0 > y1:
+            y0, y1 = y1, y0
+        width, height = self.buffer.size
+        rect = [max(0, math.floor(x0)), max(0, math.floor(y0)),
+                min(width, math.ceil(x1)), min(height, math.ceil(y1))]
+        if rect[0] >= rect[2] or rect[1] >= rect[3]:
+            return
+
+        _merge_rect(self._damage, rect)
+
+    def _mark_all_dirty(self):
+        self._damage = [[0, 0, self.buffer.width, self.buffer.height]]
+
+    def _to_panel(self, rect):
+        """Map a buffer rectangle to panel coordinates, following luma's rotate handling"""
+        x0, y0, x1, y1 = rect
+        w, h = self.buffer.size
+        if self.rotation == 1:
+            return h - y1, x0, h - y0, x1
+        if self.rotation == 2:
+            return w - x1, h - y1, w - x0, h - y0
+        if self.rotation == 3:
+            return y0, w - x1, y1, w - x0
+        return x0, y0, x1, y1
+
+    def _panel_spans(self, left, right):
+        """Split panel columns left..right into (left, right, frame memory column) runs
+
+        Without hardware scrolling every column is stored where it is shown.
+        Inside a scrolled area, logical column c sits at p0 + (c - p0 + offset) mod
+        lines, so a run of columns wraps into at most two runs of memory.
+        """
+        scroll = self._scroll
+        if scroll is None or not scroll['hardware'] or scroll['offset'] == 0:
+            return [(left, right, left)]
+        p0, p1, offset = scroll['p0'], scroll['p1'], scroll['offset']
+        spans = []
+        if left < p0:
+            spans.append((left, min(right, p0), left))
+        a, b = max(left, p0), min(right, p1)
+        if a < b:
+            wrap = p1 - offset  # First logical column stored back at p0
+            if a < wrap:
+                spans.append((a, min(b, wrap), a + offset))
+            if b > wrap:
+                start = max(a, wrap)
+                spans.append((start, b, start + offset - (p1 - p0)))
+        if right > p1:
+            start = max(left, p1)
+            spans.append((start, right, start))
+        return spans
+
+    def _write_window(self, left, top, right, bottom, data):
+        """Send pixel data for one panel window (exclusive right/bottom) via CASET/RASET/RAMWR"""
+        left += self.h_offset
+        right += self.h_offset - 1
+        top += self.v_offset
+        bottom += self.v_offset - 1
+        with self._bus_lock:
+            self.transport.window(left, top, right, bottom)
+            self.transport.data(data)
+
+    def _flush(self):
+        """Send only the damaged regions of the buffer to the panel"""
+        damage, self._damage = self._damage, []
+        if self.metrics is None:
+            self._send_damage(self.buffer, damage)
+            return
+        self.metrics.endDrawPhase()
+        try:
+            self._send_damage(self.buffer, damage)
+        finally:
+            # Time spent sending is not draw time for the call that triggered it
+            self.metrics._mark = time.perf_counter()
+
+    def _send_damage(self, image, damage):
+        metrics = self.metrics
+        convert = transfer = 0.0
+        nbytes = 0
+        transpose = ROTATE_TRANSPOSE.get(self.rotation)
+        for rect in damage:
+            if metrics is not None:
+                t0 = time.perf_counter()
+            region = image.crop(rect)
+            if transpose is not None:
+                region = region.transpose(transpose)
+            left, top, right, bottom = self._to_panel(rect)
+            if self.native_fb:
+                # Only this region is converted; the window is sent straight from the temporary array
+                pixels = rgb888_to_rgb565(np.asarray(region))
+            for span_left, span_right, dest in self._panel_spans(left, right):
+                if self.native_fb:
+                    window = pixels[:, span_left - left:span_right - left]
+                    if not window.flags.c_contiguous:
+                        window = np.ascontiguousarray(window)
+                    data = memoryview(window).cast('B')
+                elif (span_left, span_right) == (left, right):
+                    data = region.tobytes()
+                else:
+                    data = region.crop((span_left - left, 0, span_right - left, bottom - top)).tobytes()
+                if metrics is not None:
+                    t2 = time.perf_counter()
+                    convert += t2 - t0
+                self._write_window(dest, top, dest + span_right - span_left, bottom, data)
+                if metrics is not None:
+                    t0 = time.perf_counter()
+                    transfer += t0 - t2
+                    nbytes += len(data)
+        if metrics is not None:
+            metrics.recordFlush(convert, transfer, nbytes, len(damage))
+
+    def _error(self, method, message):
+        """Log a failed call and count it against the method in the metrics"""
+        logger.error(message)
+        if self.metrics is not None:
+            self.metrics.countError(method)
+
+    def framebufferImage(self):
+        """Return the frame as the panel shows it, as a PIL image in buffer orientation
+
+        In native_fb mode the colours are reduced to RGB565 like the pixels sent.
+        """
+        if not self.native_fb:
+            return self.buffer.copy()
+        pixels = rgb888_to_rgb565(np.asarray(self.buffer.convert('RGB')))
+        return Image.fromarray(rgb565_to_rgb888(pixels), 'RGB')
+
+    def _present(self):
+        """Flush pending damage unless a batch is open"""
+        if self._batch_depth == 0 and self._damage:
+            if self._render_thread is not None:
+                self._submit()
+            else:
+                self._flush()
+
+    def startAsync(self):
+        """Present frames from a background thread; draw calls return as soon as the frame is queued
+
+        Each present snapshots the buffer (the back buffer) and hands it to the render
+        thread. If a newer frame arrives before the previous one was sent, only the newest
+        is sent, carrying the damage of the frames it replaced.
+        """
+        if self._render_thread is not None:
+            return
+        self._render_stop = False
+        self._render_thread = threading.Thread(target=self._render_loop, name='st7735-render', daemon=True)
+        self._render_thread.start()
+        logger.info("Asynchronous presentation started")
+
+    def stopAsync(self):
+        """Send any queued frame, then stop the render thread and return to immediate mode"""
+        if self._render_thread is None:
+            return
+        self.flush(wait=True)
+        with self._render_cond:
+            self._render_stop = True
+            self._render_cond.notify_all()
+        self._render_thread.join()
+        self._render_thread = None
+        logger.info("Asynchronous presentation stopped")
+
+    def _submit(self):
+        if self.metrics is not None:
+            self.metrics.endDrawPhase()
+        damage, self._damage = self._damage, []
+        front = self.buffer.copy()
+        with self._render_cond:
+            self.frames_submitted += 1
+            if self._pending is not None:
+                # Superseded before it was sent; keep its damage so no region goes missing
+                self.frames_dropped += 1
+                for rect in self._pending[1]:
+                    _merge_rect(damage, rect)
+            self._pending = (front, damage)
+            self._render_cond.notify_all()
+
+    def _render_loop(self):
+        while True:
+            with self._render_cond:
+                while self._pending is None and not self._render_stop:
+                    self._render_cond.wait()
+                if self._pending is None:
+                    return
+                image, damage = self._pending
+                self._pending = None
+                self._render_busy = True
+            try:
+                self._send_damage(image, damage)
+                self.frames_presented += 1
+            except Exception as e:
+                self._error('present', f"Error presenting frame: {e}")
+            finally:
+                with self._render_cond:
+                    self._render_busy = False
+                    self._render_cond.notify_all()
+
+    def queueDepth(self):
+        """Frames submitted but not yet fully sent (pending plus in flight)"""
+        with self._render_cond:
+            return (self._pending is not None) + self._render_busy
+
+    def flush(self, wait=True, timeout=None):
+        """Send outstanding damage now, even inside a batch; with wait=True, return once the panel has it
+
+        Returns False if the timeout expired before the render thread caught up.
+        """
+        try:
+            if self._damage:
+                if self._render_thread is not None:
+                    self._submit()
+                else:
+                    self._flush()
+            if wait and self._render_thread is not None:
+                with self._render_cond:
+                    return self._render_cond.wait_for(
+                        lambda: self._pending is None and not self._render_busy, timeout)
+            return True
+        except Exception as e:
+            self._error('flush', f"Error flushing display: {e}")
+            return False
+
+    def begin(self):
+        """Start a batch: primitives only draw into the buffer until the matching commit()"""
+        self._batch_depth += 1
+
+    def commit(self):
+        """End a batch; the outermost commit sends everything drawn since begin() in one flush"""
+        if self._batch_depth > 0:
+            self._batch_depth -= 1
+        try:
+            self._present()
+        except Exception as e:
+            self._error('commit', f"Error flushing frame: {e}")
+
+    @contextmanager
+    def frame(self):
+        """Batch the draws in a with-block into a single flush, e.g. `with screen.frame(): ...`"""
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def setScrollArea(self, top=0, height=None):
+        """Make buffer rows top..top+height-1 a scroll area for scroll(); returns True if the panel scrolls it
 
+        With rotation 1 or 3 buffer rows run along the panel's gate lines, so the
+        ST7735 scrolls the area itself (VSCRDEF/VSCSAD) and scroll() only sends
+        the rows it exposes. With rotation 0 or 2 the area is scrolled in the
+        buffer and resent in full.
+        """
+        try:
+            width, buffer_height = self.buffer.size
+            if height is None:
+                height = buffer_height - top
+            if top < 0 or height <= 0 or top + height > buffer_height:
+                raise ValueError(f"scroll area {top}+{height} outside 0..{buffer_height}")
+            if self._scroll is not None:
+                self.resetScrollArea()
+            self.flush(wait=True)
+            p0, _, p1, _ = self._to_panel((0, top, width, top + height))
+            hardware = self.rotation in (1, 3)
+            self._scroll = {'top': top, 'bottom': top + height, 'p0': p0, 'p1': p1, 'offset': 0,
+                            'hardware': hardware,
+                            # Moving content up the buffer moves it down the panel columns for rotation 1
+                            'direction': -1 if self.rotation == 1 else 1}
+            if hardware:
+                first = p0 + self.h_offset
+                bottom_fixed = PANEL_LINES - first - (p1 - p0)
+                with self._bus_lock:
+                    self.transport.command(CMD_VSCRDEF, first >> 8, first & 0xFF, (p1 - p0) >> 8,
+                                           (p1 - p0) & 0xFF, bottom_fixed >> 8, bottom_fixed & 0xFF)
+                    self.transport.command(CMD_VSCSAD, first >> 8, first & 0xFF)
+            logger.debug(f"Scroll area rows {top}-{top + height - 1} ({'hardware' if hardware else 'software'})")
+            return hardware
+        except Exception as e:
+            self._error('setScrollArea', f"Error setting scroll area: {e}")
+            return False
+
+    def scroll(self, lines, color='black'):
+        """Move the scroll area's content up by lines (down if negative) and fill the exposed rows
+
+        Returns the exposed rows as (first, last + 1), ready for drawing the new content.
+        """
+        scroll = self._scroll
+        try:
+            if scroll is None:
+                raise RuntimeError("no scroll area, call setScrollArea() first")
+            top, bottom = scroll['top'], scroll['bottom']
+            width = self.buffer.width
+            lines = max(-(bottom - top), min(bottom - top, int(lines)))
+            if lines == 0:
+                return (bottom, bottom)
+            # The panel must hold the current content before it is moved
+            self.flush(wait=True)
+            if lines > 0:
+                self.buffer.paste(self.buffer.crop((0, top + lines, width, bottom)), (0, top))
+                exposed = (bottom - lines, bottom)
+            else:
+                self.buffer.paste(self.buffer.crop((0, top, width, bottom + lines)), (0, top - lines))
+                exposed = (top, top - lines)
+            self.draw.rectangle((0, exposed[0], width - 1, exposed[1] - 1), fill=color)
+            if scroll['hardware'] and abs(lines) < bottom - top:
+                p0, p1 = scroll['p0'], scroll['p1']
+                step = scroll['direction'] * lines
+                scroll['offset'] = (scroll['offset'] + step) % (p1 - p0)
+                start = p0 + self.h_offset + scroll['offset']
+                with self._bus_lock:
+                    self.transport.command(CMD_VSCSAD, start >> 8, start & 0xFF)
+                self._mark_dirty(0, exposed[0], width, exposed[1])
+            else:
+                self._mark_dirty(0, top, width, bottom)
+            self._present()
+            return exposed
+        except Exception as e:
+            self._error('scroll', f"Error scrolling: {e}")
+            return None
+
+    def resetScrollArea(self):
+        """Leave scrolling mode; the panel memory is rewritten in display order"""
+        scroll = self._scroll
+        if scroll is None:
+            return
+        try:
+            self.flush(wait=True)
+            self._scroll = None
+            if scroll['hardware']:
+                with self._bus_lock:
+                    self.transport.command(CMD_VSCRDEF, 0, 0, PANEL_LINES >> 8, PANEL_LINES & 0xFF, 0, 0)
+                    self.transport.command(CMD_VSCSAD, 0, 0)
+                    self.transport.command(CMD_NORON)
+                if scroll['offset']:
+                    self._mark_dirty(0, scroll['top'], self.buffer.width, scroll['bottom'])
+                    self.flush(wait=True)
+        except Exception as e:
+            self._error('resetScrollArea', f"Error resetting scroll area: {e}")
+
+    def openAssets(self, path):
+        """Memory-map an asset pack built with st7735_assets.py, for use with blitAsset"""
+        from st7735_assets import AssetPack
+        pack = AssetPack(path)
+        if pack.rotation != self.rotation:
+            logger.warning(f"Asset pack {path} was built for rotation {pack.rotation}, screen uses {self.rotation}")
+        return pack
+
+    def blitAsset(self, pack, name, x=0, y=0):
+        """Show a pack entry at (x, y), sending its RGB565 bytes straight from the mapped file
+
+        The entry must lie fully on screen and the pack must match the screen
+        rotation. Inside a batch the entry is drawn into the buffer like any
+        other primitive; otherwise it goes to the panel first and the buffer
+        is brought up to date afterwards.
+        """
+        try:
+            asset = pack[name]
+            if pack.rotation != self.rotation:
+                raise ValueError(f"pack rotation {pack.rotation} does not match screen rotation {self.rotation}")
+            rect = (x, y, x + asset.width, y + asset.height)
+            if x < 0 or y < 0 or rect[2] > self.buffer.width or rect[3] > self.buffer.height:
+                raise ValueError(f"asset {name} at ({x}, {y}) does not fit on screen")
+            left, top, right, bottom = self._to_panel(rect)
+            data = pack.data(name)
+            panel_size = (right - left, bottom - top)
+
+            if self._batch_depth > 0 or self._scroll is not None:
+                # Batched, or the panel memory is scrolled: draw into the buffer and send it as damage
+                self._paste_panel_rgb565(data, rect, panel_size)
+                self._mark_dirty(*rect)
+                self._present()
+                return
+
+            # Earlier draws must reach the panel before this window overwrites them
+            self.flush(wait=True)
+            t0 = time.perf_counter()
+            with self._bus_lock:
+                if not self.native_fb:
+                    self.device.command(CMD_COLMOD, COLMOD_16BIT)
+                try:
+                    self._write_window(left, top, right, bottom, data)
+                finally:
+                    if not self.native_fb:
+                        self.device.command(CMD_COLMOD, COLMOD_18BIT)
+            if self.metrics is not None:
+                self.metrics.recordFlush(0.0, time.perf_counter() - t0, len(data), 1)
+            self._paste_panel_rgb565(data, rect, panel_size)
+        except Exception as e:
+            self._error('blitAsset', f"Error showing asset {name}: {e}")
+
+    def _paste_panel_rgb565(self, data, rect, panel_size):
+        """Bring the buffer in line with panel-order RGB565 data shown at rect"""
+        region = rgb565_bytes_to_image(data, panel_size)
+        transpose = ROTATE_TRANSPOSE.get(self.rotation)
+        if transpose is not None:
+            region = region.transpose(ROTATE_TRANSPOSE[(4 - self.rotation) % 4])
+        self.buffer.paste(region, rect[:2])
+
+    @_timed
     def drawRect(self, x, y, w, h, color='black', outline=None):
         try:
             self.draw.rectangle((x, y, x+w, y+h), outline=outline, fill=color)
-            self.device.display(self.buffer)
+            self._mark_dirty(x, y, x+w+1, y+h+1)
+            self._present()
         except Exception as e:
-            print(f"Error drawing rectangle: {e}")
+            self._error('drawRect', f"Error drawing rectangle: {e}")
 
+    @_timed
     def drawCircle(self, x, y, radius, color='white', outline=None):
         try:
             self.draw.ellipse((x-radius, y-radius, x+radius, y+radius), outline=outline, fill=color)
-            self.device.display(self.buffer)
+            self._mark_dirty(x-radius, y-radius, x+radius+1, y+radius+1)
+            self._present()
         except Exception as e:
-            print(f"Error drawing circle: {e}")
+            self._error('drawCircle', f"Error drawing circle: {e}")
 
+    @_timed
     def drawLine(self, x0, y0, x1, y1, color='white', width=1):
         try:
             self.draw.line((x0, y0, x1, y1), fill=color, width=width)
-            self.device.display(self.buffer)
+            # Thick lines spread up to half their width either side of the centre line
+            pad = width // 2 + 1
+            self._mark_dirty(min(x0, x1)-pad, min(y0, y1)-pad, max(x0, x1)+pad+1, max(y0, y1)+pad+1)
+            self._present()
         except Exception as e:
-            print(f"Error drawing line: {e}")
+            self._error('drawLine', f"Error drawing line: {e}")
 
+    @_timed
     def drawPoint(self, x, y, color='white'):
         try:
             self.draw.point((x, y), fill=color)
-            self.device.display(self.buffer)
+            self._mark_dirty(x, y, x+1, y+1)
+            self._present()
         except Exception as e:
-            print(f"Error drawing point: {e}")
+            self._error('drawPoint', f"Error drawing point: {e}")
 
+    @_timed
     def drawDemo(self):
         try:
             self.draw.rectangle((10,10,10+20,10+20), outline="white", fill="green")
             self.draw.text((30, 40), "Hello World", fill="red")
             self.draw.text((10, 70), "http://xfxuezhang.cn", "white")
-            self.device.display(self.buffer)
-            print("Demo graphics drawn")
+            self._mark_all_dirty()
+            self._present()
+            logger.debug("Demo graphics drawn")
         except Exception as e:
-            print(f"Error drawing demo graphics: {e}")
+            self._error('drawDemo', f"Error drawing demo graphics: {e}")
     
+    @_timed
     def drawColorTest(self):
         try:
-            # Draw RGB color test bars
-            self.clearScreen()
-            # Red bar
-            self.draw.rectangle((0, 0, self.width, 40), fill="red")
-            # Green bar
-            self.draw.rectangle((0, 40, self.width, 80), fill="green")
-            # Blue bar
-            self.draw.rectangle((0, 80, self.width, 120), fill="blue")
-            # White labels
-            self.draw.text((5, 15), "RED", fill="white")
-            self.draw.text((5, 55), "GREEN", fill="white")
-            self.draw.text((5, 95), "BLUE", fill="white")
-            self.device.display(self.buffer)
-            print("Color test graphics drawn")
+            # Clear and draw the bars as one frame
+            with self.frame():
+                self.clearScreen()
+                # Red bar
+                self.draw.rectangle((0, 0, self.width, 40), fill="red")
+                # Green bar
+                self.draw.rectangle((0, 40, self.width, 80), fill="green")
+                # Blue bar
+                self.draw.rectangle((0, 80, self.width, 120), fill="blue")
+                # White labels
+                self.draw.text((5, 15), "RED", fill="white")
+                self.draw.text((5, 55), "GREEN", fill="white")
+                self.draw.text((5, 95), "BLUE", fill="white")
+                self._mark_all_dirty()
+            logger.debug("Color test graphics drawn")
         except Exception as e:
-            print(f"Error drawing color test: {e}")
+            self._error('drawColorTest', f"Error drawing color test: {e}")
     
+    @_timed
     def drawChessboard(self):
         try:
-            self.clearScreen()
-            block_size = 16  # Chessboard square size
-            for x in range(0, self.width, block_size):
-                for y in range(0, self.height, block_size):
-                    # Alternately draw black and white squares
-                    color = "white" if ((x // block_size) + (y // block_size)) % 2 == 0 else "black"
-                    self.draw.rectangle((x, y, x + block_size, y + block_size), fill=color)
-            self.device.display(self.buffer)
-            print("Chessboard test pattern drawn")
+            with self.frame():
+                self.clearScreen()
+                block_size = 16  # Chessboard square size
+                for x in range(0, self.width, block_size):
+                    for y in range(0, self.height, block_size):
+                        # Alternately draw black and white squares
+                        color = "white" if ((x // block_size) + (y // block_size)) % 2 == 0 else "black"
+                        self.draw.rectangle((x, y, x + block_size, y + block_size), fill=color)
+                self._mark_all_dirty()
+            logger.debug("Chessboard test pattern drawn")
         except Exception as e:
-            print(f"Error drawing chessboard test: {e}")
-
-    def drawImage(self, image_path, x=0, y=0):
-        try:
-            if os.path.exists(image_path):
-                img = Image.open(image_path)
-                # Resize image if it's too large
-                if img.width > self.width or img.height > self.height:
-                    img = img.resize((min(img.width, self.width), min(img.height, self.height)))
-                # Paste the image onto our buffer
-                self.buffer.paste(img, (x, y))
-                self.device.display(self.buffer)
-                print(f"Image {image_path} displayed")
-            else:
-                print(f"Image file {image_path} not found")
+            self._error('drawChessboard', f"Error drawing chessboard test: {e}")
+
+    @_timed
+    def drawImage(self, image_path, x=0, y=0, width=None, height=None):
+        """Draw an image file at (x, y), scaled down to fit width x height keeping its aspect ratio
+
+        width/height default to the screen size; when given, the image is also
+        scaled up to fill them. Decoded images come from the shared IMAGE_CACHE.
+        """
+        try:
+            box = (width or self.buffer.width, height or self.buffer.height)
+            try:
+                img, mask = IMAGE_CACHE.get(image_path, box, upscale=width is not None or height is not None)
+            except FileNotFoundError:
+                logger.warning(f"Image file {image_path} not found")
+                return
+            self.buffer.paste(img, (x, y), mask)
+            self._mark_dirty(x, y, x+img.width, y+img.height)
+            self._present()
+            logger.debug(f"Image {image_path} displayed")
+        except Exception as e:
+            self._error('drawImage', f"Error displaying image: {e}")
+
+    def preloadImages(self, directory, width=None, height=None):
+        """Decode and scale every image in directory into the cache, as drawImage with the same width/height would"""
+        try:
+            box = (width or self.buffer.width, height or self.buffer.height)
+            count = IMAGE_CACHE.prewarm(directory, box, upscale=width is not None or height is not None)
+            logger.info(f"Preloaded {count} images from {directory}")
+            return count
         except Exception as e:
-            print(f"Error displaying image: {e}")
+            self._error('preloadImages', f"Error preloading images: {e}")
+            return 0
+
+    def preloadFonts(self, sizes, fontType=None):
+        """Load the given font sizes into the shared cache ahead of the first drawText"""
+        try:
+            if fontType or not self._default_font:
+                FONT_CACHE.preload(fontType or self.fontTypeEN, sizes)
+        except Exception as e:
+            self._error('preloadFonts', f"Error preloading fonts: {e}")
+
+    def _getFont(self, fontSize=None, fontType=None):
+        """Resolve the font for a drawText call, returning (font, size)"""
+        size = fontSize if fontSize else self.fontSize
+        if fontType and fontType != self.fontTypeEN:
+            try:
+                return FONT_CACHE.get(fontType, size), size
+            except OSError:
+                pass  # Missing or unreadable font file, fall back to the screen font
+        if self._default_font:
+            return self.font, size
+        return FONT_CACHE.get(self.fontTypeEN, size), size
+
+    def _drawTextRun(self, x, y, msg, font, color):
+        """Paste a cached rendering of msg at (x, y), as ImageDraw.text would draw it"""
+        mask, dx, dy = TEXT_CACHE.get(font, msg)
+        left, top = int(x) + dx, int(y) + dy
+        box = (left, top, left + mask.width, top + mask.height)
+        self.buffer.paste(color, box, mask)
+        self._mark_dirty(*box)
 
+    @_timed
     def drawText(self, x, y, msg, color='white', fontSize=None, fontType=None):
         try:
-            if fontType and os.path.exists(fontType):
-                newType = fontType
-            else:
-                newType = self.fontTypeEN
-                
-            newSize = fontSize if fontSize else self.fontSize
-            
-            # Check if using default font
-            if hasattr(self, 'font') and self.font == ImageFont.load_default():
-                font = self.font
-            else:
-                font = ImageFont.truetype(newType, newSize)
-                
+            font, newSize = self._getFont(fontSize, fontType)
+
             # Calculate text width to prevent overflow
             text_width = min(len(msg)*newSize/2, self.width-x)
-            self.drawRect(x, y, text_width, newSize, 'black')
-            self.draw.text((x, y), msg, font=font, fill=color)
-            self.device.display(self.buffer)
+            # Background and text go out together in one flush
+            with self.frame():
+                self.drawRect(x, y, text_width, newSize, 'black')
+                self._drawTextRun(x, y, msg, font, color)
         except Exception as e:
-            print(f"Error in drawText: {e}")
+            self._error('drawText', f"Error in drawText: {e}")
 
+    @_timed
     def clearScreen(self, color='black'):
         try:
             self.draw.rectangle(self.device.bounding_box, outline=None, fill=color)
-            self.device.display(self.buffer)
-            print("Screen cleared")
+            self._mark_all_dirty()
+            self._present()
+            logger.debug("Screen cleared")
         except Exception as e:
-            print(f"Error clearing screen: {e}")
+            self._error('clearScreen', f"Error clearing screen: {e}")
 
+    @_timed
     def showInfo(self):
         try:
-            self.clearScreen()
-            self.drawText(18, 20, 'Xiaofeng Senior')
-            self.drawText(5, 45, 'The Big Bang Theory')
-            self.drawText(20, 80, "xfxuezhang.cn", "red", fontSize=12)
-            print("Info displayed")
+            with self.frame():
+                self.clearScreen()
+                self.drawText(18, 20, 'Xiaofeng Senior')
+                self.drawText(5, 45, 'The Big Bang Theory')
+                self.drawText(20, 80, "xfxuezhang.cn", "red", fontSize=12)
+            logger.debug("Info displayed")
         except Exception as e:
-            print(f"Error displaying info: {e}")
\ No newline at end of file
+            self._error('showInfo', f"Error displaying info: {e}")
+
+
+class Counter:
+    """Numeric field that redraws only the character cells whose value changed
+
+    Every character sits in a fixed-width cell sized for the widest digit, so
+    going from 1999 to 2000 repaints four cells and 2000 to 2001 repaints one.
+    """
+    def __init__(self, screen, x, y, digits=6, color='white', background='black',
+                 fontSize=None, fontType=None, align='left'):
+        self.screen = screen
+        self.x = x
+        self.y = y
+        self.digits = digits
+        self.color = color
+        self.background = background
+        self.align = align
+        self.font, _ = screen._getFont(fontSize, fontType)
+        self.cell_width = max(math.ceil(self.font.getlength(c)) for c in '0123456789-.')
+        self.cell_height = self.font.getbbox('0123456789-.')[3]
+        self._shown = None
+        self.value = None
+
+    def set(self, value):
+        try:
+            text = str(value)
+            if len(text) > self.digits:
+                self.digits = len(text)
+                self._shown = None  # Layout changed, repaint every cell
+            text = text.rjust(self.digits) if self.align == 'right' else text.ljust(self.digits)
+            shown = self._shown or [None] * self.digits
+            with self.screen.frame():
+                for i, ch in enumerate(text):
+                    if ch != shown[i]:
+                        self._drawCell(i, ch)
+            self._shown = list(text)
+            self.value = value
+        except Exception as e:
+            self.screen._error('Counter.set', f"Error updating counter: {e}")
+
+    def _drawCell(self, index, ch):
+        left = self.x + index * self.cell_width
+        self.screen.draw.rectangle((left, self.y, left + self.cell_width - 1, self.y + self.cell_height - 1),
+                                   fill=self.background)
+        self.screen._mark_dirty(left, self.y, left + self.cell_width, self.y + self.cell_height)
+        if ch != ' ':
+            self.screen._drawTextRun(left, self.y, ch, self.font, self.color)
+
+
+class LogConsole:
+    """Scrolling text log in a band of rows, newest line at the bottom
+
+    Each line scrolls the band by one text line. With rotation 1 or 3 the
+    panel scrolls in hardware, so a new line costs one line of text on the
+    bus instead of the whole band.
+    """
+    def __init__(self, screen, top=0, height=None, color='white', background='black',
+                 fontSize=None, fontType=None, spacing=1, margin=2):
+        self.screen = screen
+        self.color = color
+        self.background = background
+        self.margin = margin
+        self.font, _ = screen._getFont(fontSize, fontType)
+        self.line_height = self.font.getbbox('Ag|')[3] + spacing
+        self.hardware = screen.setScrollArea(top, height)
+        self.lines_written = 0
+        self.clear()
+
+    def clear(self):
+        scroll = self.screen._scroll
+        if scroll is not None:
+            self.screen.scroll(scroll['bottom'] - scroll['top'], self.background)
+
+    def write(self, text, color=None):
+        """Append text, wrapping long lines and starting a new line at each newline"""
+        try:
+            with self.screen.frame():
+                for line in str(text).split('\n'):
+                    for part in self._wrap(line):
+                        first, _ = self.screen.scroll(self.line_height, self.background)
+                        if part:
+                            self.screen._drawTextRun(self.margin, first, part, self.font, color or self.color)
+                        self.lines_written += 1
+        except Exception as e:
+            self.screen._error('LogConsole.write', f"Error writing log line: {e}")
+
+    def close(self):
+        """Return the band to normal drawing; its content stays on screen"""
+        self.screen.resetScrollArea()
+
+    def _wrap(self, line):
+        width = self.screen.buffer.width - 2 * self.margin
+        if self.font.getlength(line) <= width:
+            return [line]
+        parts, current = [], ''
+        for word in line.split(' '):
+            candidate = f"{current} {word}" if current else word
+            if self.font.getlength(candidate) <= width:
+                current = candidate
+                continue
+            if current:
+                parts.append(current)
+            # A word wider than the band is broken between characters
+            while self.font.getlength(word) > width and len(word) > 1:
+                cut = len(word) - 1
+                while cut > 1 and self.font.getlength(word[:cut]) > width:
+                    cut -= 1
+                parts.append(word[:cut])
+                word = word[cut:]
+            current = word
+        parts.append(current)
+        return parts
@@ -0,0 +1,374 @@
+"""Hardware-free stand-ins for the ST7735 LCD: fake GPIO, fake spidev and an in-memory panel
+
+Select it with Screen(backend='emulator') or by setting ST7735_BACKEND=emulator.
+The fake spidev splits transfers the way py-spidev does, so the byte and
+transaction counts match what the real bus would carry.
+"""
+from PIL import Image
+from collections import deque
+import threading
+import time
+import zlib
+
+# ST7735 commands understood by the emulated panel
+CMD_SWRESET = 0x01
+CMD_SLPIN = 0x10
+CMD_SLPOUT = 0x11
+CMD_NORON = 0x13
+CMD_INVOFF = 0x20
+CMD_INVON = 0x21
+CMD_DISPOFF = 0x28
+CMD_DISPON = 0x29
+CMD_CASET = 0x2A
+CMD_RASET = 0x2B
+CMD_RAMWR = 0x2C
+CMD_VSCRDEF = 0x33
+CMD_MADCTL = 0x36
+CMD_VSCSAD = 0x37
+CMD_COLMOD = 0x3A
+
+# Bytes per pixel for the COLMOD interface formats we support
+COLMOD_BYTES = {0x05: 2, 0x06: 3}
+
+# Frame memory of the ST7735 (132 x 162), in the column/row order luma's MADCTL selects
+MEMORY_WIDTH = 162
+MEMORY_HEIGHT = 132
+
+# Default spidev transfer limit (/sys/module/spidev/parameters/bufsiz)
+SPIDEV_BUFSIZ = 4096
+
+
+class FakeGPIO:
+    """Drop-in for the RPi.GPIO module that keeps pin levels in memory and records a timeline"""
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_OFF = 20
+    PUD_DOWN = 21
+    PUD_UP = 22
+    RISING = 31
+    FALLING = 32
+    BOTH = 33
+
+    def __init__(self, timeline_size=100000):
+        self.mode = None
+        self.levels = {}
+        self.directions = {}
+        # (perf_counter time, pin, level) for every output change and simulated input
+        self.timeline = deque(maxlen=timeline_size)
+        self._events = {}  # pin -> [edge, callbacks, detected]
+        self._lock = threading.Lock()
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def getmode(self):
+        return self.mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction, pull_up_down=PUD_OFF, initial=None):
+        for p in (pin if isinstance(pin, (list, tuple)) else [pin]):
+            self.directions[p] = direction
+            if direction == self.IN:
+                self.levels[p] = self.HIGH if pull_up_down == self.PUD_UP else self.LOW
+            elif initial is not None:
+                self._set(p, initial)
+            else:
+                self.levels.setdefault(p, self.LOW)
+
+    def output(self, pin, value):
+        pins = pin if isinstance(pin, (list, tuple)) else [pin]
+        values = value if isinstance(value, (list, tuple)) else [value] * len(pins)
+        for p, v in zip(pins, values):
+            self._set(p, v)
+
+    def input(self, pin):
+        return self.levels.get(pin, self.LOW)
+
+    def cleanup(self, pins=None):
+        if pins is None:
+            pins = list(self.directions)
+        for p in (pins if isinstance(pins, (list, tuple)) else [pins]):
+            self.directions.pop(p, None)
+            self._events.pop(p, None)
+
+    def add_event_detect(self, pin, edge, callback=None, bouncetime=None):
+        if pin in self._events:
+            raise RuntimeError("Conflicting edge detection already enabled for this GPIO channel")
+        self._events[pin] = [edge, [callback] if callback else [], False]
+
+    def add_event_callback(self, pin, callback):
+        self._events[pin][1].append(callback)
+
+    def remove_event_detect(self, pin):
+        self._events.pop(pin, None)
+
+    def event_detected(self, pin):
+        event = self._events.get(pin)
+        if event is None or not event[2]:
+            return False
+        event[2] = False
+        return True
+
+    def set_input(self, pin, value):
+        """Drive an input pin from a test, firing edge callbacks as the real library would"""
+        value = self.HIGH if value else self.LOW
+        old = self.levels.get(pin, self.LOW)
+        self.levels[pin] = value
+        self.timeline.append((time.perf_counter(), pin, value))
+        event = self._events.get(pin)
+        if event is None or old == value:
+            return
+        edge, callbacks, _ = event
+        if edge == self.BOTH or (edge == self.RISING) == (value == self.HIGH):
+            event[2] = True
+            for callback in list(callbacks):
+                callback(pin)
+
+    def pin_timeline(self, pin):
+        return [(t, v) for t, p, v in self.timeline if p == pin]
+
+    def _set(self, pin, value):
+        value = self.HIGH if value else self.LOW
+        with self._lock:
+            self.levels[pin] = value
+            self.timeline.append((time.perf_counter(), pin, value))
+
+
+class EmulatedST7735:
+    """In-memory ST7735 that decodes the command stream into a frame memory image"""
+    def __init__(self, width=160, height=128, memory_width=MEMORY_WIDTH, memory_height=MEMORY_HEIGHT):
+        self.width = width
+        self.height = height
+        self.memory = Image.new('RGB', (memory_width, memory_height))
+        self.colmod = 0x06
+        self.madctl = 0x00
+        self.display_on = False
+        self.sleeping = True
+        self.inverted = False
+        self.column = (0, memory_width - 1)
+        self.row = (0, memory_height - 1)
+        # Vertical scrolling along the gate lines, which are frame memory columns here
+        self.scroll_area = (0, memory_width, 0)  # Top fixed, scroll and bottom fixed lines
+        self.scroll_start = 0
+        self.command_counts = {}
+        self.pixels_written = 0
+        self._ram_crc = 0
+        self._cursor = (0, 0)
+        self._command = None
+        self._params = bytearray()
+        self._ram = bytearray()
+        self._lock = threading.Lock()
+
+    def write(self, data, is_data):
+        """Feed bytes clocked into the panel; is_data is the level of the DC pin"""
+        with self._lock:
+            if is_data:
+                if self._command == CMD_RAMWR:
+                    self._ram += data
+                else:
+                    self._params += data
+                    self._apply_params()
+            else:
+                for cmd in data:
+                    self._end_command()
+                    self._command = cmd
+                    self.command_counts[cmd] = self.command_counts.get(cmd, 0) + 1
+                    self._apply_command(cmd)
+
+    def image(self):
+        """The visible part of the frame memory, as the panel would show it"""
+        with self._lock:
+            self._end_ram_write()
+            memory = self.memory
+            top, lines, _ = self.scroll_area
+            start = self.scroll_start
+            if lines > 0 and top < start < top + lines:
+                # Display line top + i shows memory line top + (start - top + i) mod lines
+                memory = memory.copy()
+                first = self.memory.crop((start, 0, top + lines, memory.height))
+                memory.paste(first, (top, 0))
+                memory.paste(self.memory.crop((top, 0, start, memory.height)), (top + first.width, 0))
+            return memory.crop((0, 0, self.width, self.height))
+
+    def ramChecksum(self):
+        """CRC-32 of the bytes of the last completed memory write"""
+        with self._lock:
+            self._end_ram_write()
+            return self._ram_crc
+
+    def _apply_command(self, cmd):
+        if cmd == CMD_SWRESET:
+            self.display_on = False
+            self.sleeping = True
+            self.scroll_area = (0, self.memory.width, 0)
+            self.scroll_start = 0
+        elif cmd == CMD_NORON:
+            self.scroll_start = self.scroll_area[0]
+        elif cmd == CMD_SLPOUT:
+            self.sleeping = False
+        elif cmd == CMD_SLPIN:
+            self.sleeping = True
+        elif cmd == CMD_DISPON:
+            self.display_on = True
+        elif cmd == CMD_DISPOFF:
+            self.display_on = False
+        elif cmd in (CMD_INVON, CMD_INVOFF):
+            self.inverted = cmd == CMD_INVON
+        elif cmd == CMD_RAMWR:
+            self._cursor = (self.column[0], self.row[0])
+
+    def _apply_params(self):
+        p = self._params
+        if self._command == CMD_CASET and len(p) == 4:
+            self.column = ((p[0] << 8) | p[1], (p[2] << 8) | p[3])
+        elif self._command == CMD_RASET and len(p) == 4:
+            self.row = ((p[0] << 8) | p[1], (p[2] << 8) | p[3])
+        elif self._command == CMD_MADCTL and len(p) == 1:
+            self.madctl = p[0]
+        elif self._command == CMD_COLMOD and len(p) == 1:
+            self.colmod = p[0] & 0x07
+        elif self._command == CMD_VSCRDEF and len(p) == 6:
+            self.scroll_area = ((p[0] << 8) | p[1], (p[2] << 8) | p[3], (p[4] << 8) | p[5])
+        elif self._command == CMD_VSCSAD and len(p) == 2:
+            self.scroll_start = (p[0] << 8) | p[1]
+
+    def _end_command(self):
+        self._end_ram_write()
+        self._params = bytearray()
+
+    def _end_ram_write(self):
+        if not self._ram:
+            return
+        bpp = COLMOD_BYTES.get(self.colmod, 3)
+        data, self._ram = self._ram, bytearray()
+        self._ram_crc = zlib.crc32(data)
+        x0, x1 = self.column
+        y0, y1 = self.row
+        cx, cy = self._cursor
+        width = x1 - x0 + 1
+        count = len(data) // bpp
+        self.pixels_written += count
+        pos = 0
+        while count > 0:
+            # Fill the rest of the current row, or as many whole rows as remain in one paste
+            if cx == x0 and count >= width:
+                rows = min(count // width, y1 - cy + 1)
+                seg_w, seg_h = width, rows
+            else:
+                seg_w, seg_h = min(count, x1 - cx + 1), 1
+            n = seg_w * seg_h
+            self.memory.paste(self._decode(data[pos:pos + n * bpp], seg_w, seg_h, bpp), (cx, cy))
+            pos += n * bpp
+            count -= n
+            cx += seg_w if seg_h == 1 else 0
+            cy += seg_h if seg_h > 1 else 0
+            if cx > x1:
+                cx, cy = x0, cy + 1
+            if cy > y1:
+                cy = y0  # The address counter wraps back to the window start
+        self._cursor = (cx, cy)
+
+    def _decode(self, data, w, h, bpp):
+        if bpp == 2:
+            # Panel order is big-endian RGB565; PIL's "BGR;16" unpacks the little-endian form
+            swapped = bytearray(len(data))
+            swapped[0::2] = data[1::2]
+            swapped[1::2] = data[0::2]
+            return Image.frombytes('RGB', (w, h), bytes(swapped), 'raw', 'BGR;16')
+        # 18-bit mode: one byte per channel (the panel only uses the top 6 bits of each)
+        return Image.frombytes('RGB', (w, h), bytes(data))
+
+
+class FakeSPI:
+    """Drop-in for spidev.SpiDev that delivers writes to an EmulatedST7735 and counts the traffic"""
+    def __init__(self, panel, gpio, dc_pin, bufsiz=SPIDEV_BUFSIZ, loopback=False, max_stable_hz=None,
+                 realtime=False):
+        self.panel = panel
+        self.gpio = gpio
+        self.dc_pin = dc_pin
+        self.bufsiz = bufsiz
+        self.loopback = loopback
+        # Above this clock the wiring garbles bits, as long or noisy leads do on real hardware
+        self.max_stable_hz = max_stable_hz
+        # Block for as long as each transfer would take on the wire, like the spidev ioctl does
+        self.realtime = realtime
+        self.max_speed_hz = 500000
+        self.mode = 0
+        self.port = None
+        self.device = None
+        self.is_open = False
+        self.reset_stats()
+
+    def reset_stats(self):
+        self.bytes_written = 0
+        self.command_bytes = 0
+        self.data_bytes = 0
+        self.transactions = 0
+        self.bus_time = 0.0  # Seconds the transfers would occupy the wire at max_speed_hz
+
+    def stats(self):
+        return {'bytes': self.bytes_written, 'command_bytes': self.command_bytes,
+                'data_bytes': self.data_bytes, 'transactions': self.transactions,
+                'bus_time': self.bus_time, 'pixels_written': self.panel.pixels_written}
+
+    def open(self, port, device):
+        self.port = port
+        self.device = device
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def writebytes(self, data):
+        if len(data) > self.bufsiz:
+            raise OSError(90, "Message too long")
+        self._transfer(bytes(data))
+
+    def writebytes2(self, data):
+        # py-spidev splits large buffers into bufsiz-sized ioctl transfers
+        data = memoryview(data).cast('B')
+        for i in range(0, len(data), self.bufsiz):
+            self._transfer(data[i:i + self.bufsiz].tobytes())
+
+    def xfer(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        return self._xfer(bytes(data))
+
+    xfer2 = xfer
+
+    def xfer3(self, data, speed_hz=0, delay_usecs=0, bits_per_word=0):
+        data = bytes(data)
+        result = []
+        for i in range(0, len(data), self.bufsiz):
+            result.extend(self._xfer(data[i:i + self.bufsiz]))
+        return result
+
+    def _xfer(self, data):
+        if len(data) > self.bufsiz:
+            raise OSError(90, "Message too long")
+        data = self._transfer(data)
+        # The panel never drives MISO; with loopback the sent bytes come straight back
+        return list(data) if self.loopback else [0] * len(data)
+
+    def _transfer(self, data):
+        if self.max_stable_hz and self.max_speed_hz > self.max_stable_hz:
+            data = bytearray(data)
+            data[60::61] = bytes(b ^ 0x01 for b in data[60::61])
+            data = bytes(data)
+        is_data = self.gpio.input(self.dc_pin) == self.gpio.HIGH
+        self.transactions += 1
+        self.bytes_written += len(data)
+        if is_data:
+            self.data_bytes += len(data)
+        else:
+            self.command_bytes += len(data)
+        self.bus_time += len(data) * 8 / self.max_speed_hz
+        self.panel.write(data, is_data)
+        if self.realtime:
+            time.sleep(len(data) * 8 / self.max_speed_hz)
+        return data
@@ -0,0 +1,119 @@
+"""Several ST7735 panels driven as one group
+
+Each Screen owns its pins and SPI device, e.g. two panels on CE0 and CE1:
+
+    group = DisplayGroup.create([
+        {'device': 0, 'dc_pin': 24, 'rst_pin': 25, 'bl_pin': 4},
+        {'device': 1, 'dc_pin': 23, 'rst_pin': None, 'bl_pin': None},
+    ])
+    with group.frame():
+        for screen in group:
+            screen.drawText(0, 0, 'hello')
+    group.close()
+
+Panels whose transfers can overlap (different SPI buses and DC lines) are
+flushed in parallel from a small thread pool. Panels that share a bus or a DC
+line share one lock in the driver, so the group flushes them one after another
+on a single worker instead of having them queue on the lock.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import logging
+
+from st7735_driver import Screen
+
+logger = logging.getLogger(__name__)
+
+
+class DisplayGroup:
+    """Flushes a set of Screens together, in parallel where their buses allow"""
+    def __init__(self, screens):
+        self.screens = list(screens)
+        groups = {}
+        for screen in self.screens:
+            groups.setdefault(id(screen._bus_lock), []).append(screen)
+        # One list per independent bus, flushed in order by one worker
+        self.bus_groups = list(groups.values())
+        self._executor = None
+        if len(self.bus_groups) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=len(self.bus_groups),
+                                                thread_name_prefix='st7735-group')
+        logger.info(f"Display group of {len(self.screens)} screens on {len(self.bus_groups)} independent buses")
+
+    @classmethod
+    def create(cls, configs, **common):
+        """Open one Screen per dict of Screen arguments (common ones apply to all) and group them"""
+        screens = []
+        try:
+            for config in configs:
+                screen = Screen(**dict(common, **config))
+                screen.initGPIO()
+                screen.openScreen()
+                screens.append(screen)
+        except Exception:
+            for screen in screens:
+                screen.closeGPIO()
+            raise
+        return cls(screens)
+
+    def __iter__(self):
+        return iter(self.screens)
+
+    def __len__(self):
+        return len(self.screens)
+
+    def __getitem__(self, index):
+        return self.screens[index]
+
+    def flush(self, wait=True):
+        """Send every screen's outstanding damage; returns once all panels have it"""
+        if self._executor is None:
+            for group in self.bus_groups:
+                self._flush_group(group, wait)
+            return
+        futures = [self._executor.submit(self._flush_group, group, wait) for group in self.bus_groups]
+        for future in futures:
+            future.result()
+
+    @staticmethod
+    def _flush_group(screens, wait):
+        for screen in screens:
+            screen.flush(wait=wait)
+
+    def begin(self):
+        for screen in self.screens:
+            screen.begin()
+
+    def commit(self):
+        """End a batch on every screen, sending their frames in parallel"""
+        try:
+            self.flush(wait=True)
+        finally:
+            for screen in self.screens:
+                screen.commit()
+
+    @contextmanager
+    def frame(self):
+        """Batch the draws in a with-block on all screens into one parallel flush"""
+        self.begin()
+        try:
+            yield self
+        finally:
+            self.commit()
+
+    def close(self):
+        """Flush, release each screen's pins and stop the worker threads"""
+        try:
+            self.flush(wait=True)
+        finally:
+            for screen in self.screens:
+                screen.closeGPIO()
+            if self._executor is not None:
+                self._executor.shutdown(wait=True)
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
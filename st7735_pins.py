@@ -0,0 +1,15 @@
+"""Pin and bus assignments of the expansion board
+
+Kept free of heavy imports so tools that only need the numbers can import them
+without loading luma, PIL or RPi.GPIO. st7735_driver re-exports all of them.
+"""
+# GPIO Pin definitions for easier modification
+BL_PIN = 4       # Backlight pin
+DC_PIN = 24      # Data/Command pin
+RST_PIN = 25     # Reset pin
+
+# SPI interface definition
+SPI_PORT = 0     # SPI port
+SPI_DEVICE = 0   # SPI device (CE0)
+
+KEY_PIN = 17     # Button pin
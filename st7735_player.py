@@ -0,0 +1,287 @@
+"""Animation playback on the ST7735 screen
+
+Frames are decoded and scaled on a worker thread into a bounded prefetch
+queue. The player presents them against a monotonic clock, skipping frames
+whose slot has already passed, and sends only the tiles that changed since
+the previous frame shown.
+
+Sources yield (PIL RGB image, duration in seconds):
+    GifSource('spinner.gif')
+    DirectorySource('frames/', fps=15)
+    RawSource('dump.raw', (128, 160), fps=25, pixel_format='rgb565')
+"""
+import argparse
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+
+from PIL import Image, ImageChops, ImageSequence
+
+from st7735_driver import IMAGE_EXTENSIONS, _RESAMPLING, _fit_size, _numpy, rgb565_bytes_to_image
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FPS = 10
+TILE_SIZE = 8  # Delta encoding granularity in pixels
+
+
+class GifSource:
+    """Frames of an animated GIF (or any multi-frame image PIL reads), with their own delays"""
+    def __init__(self, path, fps=None):
+        self.path = path
+        self.fps = fps
+
+    def __iter__(self):
+        with Image.open(self.path) as img:
+            for frame in ImageSequence.Iterator(img):
+                delay = frame.info.get('duration') or 1000 / DEFAULT_FPS
+                duration = 1 / self.fps if self.fps else delay / 1000
+                yield frame.convert('RGB'), duration
+
+
+class DirectorySource:
+    """Image files of a directory in name order, at a fixed frame rate"""
+    def __init__(self, path, fps=DEFAULT_FPS):
+        self.path = path
+        self.fps = fps
+
+    def __iter__(self):
+        for name in sorted(os.listdir(self.path)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                with Image.open(os.path.join(self.path, name)) as img:
+                    yield img.convert('RGB'), 1 / self.fps
+
+
+class RawSource:
+    """Headerless dump of fixed-size frames: 'rgb888' (3 bytes per pixel) or big-endian 'rgb565'"""
+    def __init__(self, path, size, fps=DEFAULT_FPS, pixel_format='rgb565'):
+        if pixel_format not in ('rgb565', 'rgb888'):
+            raise ValueError(f"Unknown raw pixel format: {pixel_format}")
+        self.path = path
+        self.size = tuple(size)
+        self.fps = fps
+        self.pixel_format = pixel_format
+
+    def __iter__(self):
+        bpp = 2 if self.pixel_format == 'rgb565' else 3
+        frame_bytes = self.size[0] * self.size[1] * bpp
+        buf = bytearray(frame_bytes)
+        with open(self.path, 'rb') as f:
+            while f.readinto(buf) == frame_bytes:
+                if bpp == 2:
+                    yield rgb565_bytes_to_image(buf, self.size), 1 / self.fps
+                else:
+                    yield Image.frombytes('RGB', self.size, bytes(buf)), 1 / self.fps
+
+
+def openSource(path, fps=None, raw_size=None, pixel_format='rgb565'):
+    """Pick a source for path: directory, raw dump (when raw_size is given) or animated image"""
+    if os.path.isdir(path):
+        return DirectorySource(path, fps or DEFAULT_FPS)
+    if raw_size is not None:
+        return RawSource(path, raw_size, fps or DEFAULT_FPS, pixel_format)
+    return GifSource(path, fps)
+
+
+def _changed_rects(prev, cur, tile=TILE_SIZE):
+    """Rectangles covering the tiles that differ between two same-size images, one per tile row run"""
+    np = _numpy()
+    if np is None:
+        bbox = ImageChops.difference(prev, cur).getbbox()
+        return [bbox] if bbox else []
+    a = np.asarray(prev)
+    b = np.asarray(cur)
+    h, w = a.shape[:2]
+    changed = (a != b).any(axis=2)
+    rows, cols = -(-h // tile), -(-w // tile)
+    padded = np.zeros((rows * tile, cols * tile), dtype=bool)
+    padded[:h, :w] = changed
+    tiles = padded.reshape(rows, tile, cols, tile).any(axis=(1, 3))
+    rects = []
+    for ty in np.flatnonzero(tiles.any(axis=1)):
+        tx = np.flatnonzero(tiles[ty])
+        rects.append((int(tx[0]) * tile, int(ty) * tile,
+                      min(w, (int(tx[-1]) + 1) * tile), min(h, (int(ty) + 1) * tile)))
+    return rects
+
+
+class Player:
+    """Plays a frame source on a Screen with prefetching, pacing and delta updates
+
+    Frames are scaled to fit the screen keeping their aspect ratio and centred,
+    unless x/y are given. stop() may be called from any thread.
+    """
+    def __init__(self, screen, source, x=None, y=None, loop=False, prefetch=8, tile=TILE_SIZE):
+        self.screen = screen
+        self.source = source
+        self.x = x
+        self.y = y
+        self.loop = loop
+        self.tile = tile
+        self._queue = queue.Queue(maxsize=prefetch)
+        self._stop = threading.Event()
+        self._worker = None
+        self._reset_stats()
+
+    def _reset_stats(self):
+        self.frames_shown = 0
+        self.frames_skipped = 0
+        self.frames_decoded = 0
+        self.decode_time = 0.0
+        self.bytes_sent = 0
+        self.elapsed = 0.0
+
+    def stats(self):
+        return {'frames_shown': self.frames_shown, 'frames_skipped': self.frames_skipped,
+                'frames_decoded': self.frames_decoded,
+                'fps': self.frames_shown / self.elapsed if self.elapsed > 0 else 0.0,
+                'decode_ms_per_frame': self.decode_time / self.frames_decoded * 1000 if self.frames_decoded else 0.0,
+                'bytes_sent': self.bytes_sent, 'elapsed': self.elapsed}
+
+    def stop(self):
+        self._stop.set()
+
+    def play(self, max_duration=None):
+        """Play until the source ends (or forever with loop=True), stop() or max_duration seconds; returns stats()"""
+        self._reset_stats()
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._decode_loop, name='st7735-decode', daemon=True)
+        self._worker.start()
+        bus_before = self.screen.busStats().get('bytes', 0)
+        prev = None
+        start = due = time.monotonic()
+        try:
+            while not self._stop.is_set():
+                try:
+                    # Wake up regularly: after stop() the decoder may never queue its end marker
+                    item = self._queue.get(timeout=0.1)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    break
+                now = time.monotonic()
+                if max_duration is not None and now - start >= max_duration:
+                    break
+                if item is False:
+                    continue
+                frame, (x, y), duration = item
+                if now >= due + duration and prev is not None:
+                    # This frame's whole slot has passed; drop it and catch up with the next one
+                    self.frames_skipped += 1
+                    due += duration
+                    continue
+                if now < due:
+                    self._stop.wait(due - now)
+                self._show(frame, x, y, prev)
+                prev = (frame, x, y)
+                self.frames_shown += 1
+                due += duration
+        finally:
+            self._stop.set()
+            self._drain()
+            self._worker.join()
+            self._worker = None
+            self.screen.flush(wait=True)
+            self.elapsed = time.monotonic() - start
+            self.bytes_sent = self.screen.busStats().get('bytes', 0) - bus_before
+        stats = self.stats()
+        logger.info(f"Played {stats['frames_shown']} frames at {stats['fps']:.1f} fps, "
+                    f"{stats['frames_skipped']} skipped")
+        return stats
+
+    def _show(self, frame, x, y, prev):
+        screen = self.screen
+        if prev is None or prev[0].size != frame.size or prev[1:] != (x, y):
+            rects = [(0, 0, frame.width, frame.height)]
+        else:
+            rects = _changed_rects(prev[0], frame, self.tile)
+        with screen.frame():
+            for rect in rects:
+                screen.buffer.paste(frame.crop(rect), (x + rect[0], y + rect[1]))
+                screen._mark_dirty(x + rect[0], y + rect[1], x + rect[2], y + rect[3])
+
+    def _decode_loop(self):
+        box = self.screen.buffer.size
+        try:
+            while not self._stop.is_set():
+                it = iter(self.source)
+                while not self._stop.is_set():
+                    t0 = time.perf_counter()
+                    try:
+                        frame, duration = next(it)
+                    except StopIteration:
+                        break
+                    size = _fit_size(frame.size, box)
+                    if size != frame.size:
+                        frame = frame.resize(size, _RESAMPLING.BILINEAR)
+                    x = self.x if self.x is not None else (box[0] - frame.width) // 2
+                    y = self.y if self.y is not None else (box[1] - frame.height) // 2
+                    self.decode_time += time.perf_counter() - t0
+                    self.frames_decoded += 1
+                    self._put((frame, (x, y), duration))
+                if not self.loop or self.frames_decoded == 0:
+                    break
+        except Exception as e:
+            logger.error(f"Error decoding animation: {e}")
+        finally:
+            self._put(None)
+
+    def _put(self, item):
+        # Block while the prefetch queue is full, but give up once playback stops
+        while not self._stop.is_set():
+            try:
+                self._queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def _drain(self):
+        try:
+            while True:
+                self._queue.get_nowait()
+        except queue.Empty:
+            pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Play an animation on the ST7735 LCD')
+    parser.add_argument('path', help='GIF/animated image, directory of frames, or raw frame dump')
+    parser.add_argument('--fps', type=float, default=None, help='Override the frame rate')
+    parser.add_argument('--raw-size', default=None, metavar='WxH', help='Frame size of a raw dump')
+    parser.add_argument('--raw-format', default='rgb565', choices=('rgb565', 'rgb888'))
+    parser.add_argument('--loop', action='store_true', help='Repeat until interrupted')
+    parser.add_argument('--duration', type=float, default=None, help='Stop after this many seconds')
+    parser.add_argument('--rotation', type=int, default=1, choices=(0, 1, 2, 3))
+    parser.add_argument('--emulator', action='store_true', help='Play on the emulated panel')
+    parser.add_argument('--native-fb', action='store_true', help='Use the RGB565 framebuffer')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from st7735_driver import Screen
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    raw_size = tuple(int(v) for v in args.raw_size.lower().split('x')) if args.raw_size else None
+    source = openSource(args.path, args.fps, raw_size, args.raw_format)
+    screen = Screen(rotation=args.rotation, native_fb=args.native_fb,
+                    backend='emulator' if args.emulator else None)
+    screen.initGPIO()
+    screen.openScreen()
+    player = Player(screen, source, loop=args.loop)
+    try:
+        stats = player.play(max_duration=args.duration)
+    except KeyboardInterrupt:
+        player.stop()
+        stats = player.stats()
+    finally:
+        screen.closeGPIO()
+    print(f"{stats['frames_shown']} frames shown, {stats['frames_skipped']} skipped, "
+          f"{stats['fps']:.1f} fps, {stats['bytes_sent']} SPI bytes")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
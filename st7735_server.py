@@ -0,0 +1,558 @@
+"""Display server: lets several processes draw to one ST7735 panel
+
+The server owns the Screen. Each client opens one or more layers: a
+rectangle of the screen backed by a shared memory block of 4-byte pixels
+(RGBX, or RGBA for layers with alpha). Clients write pixels straight into the
+block and then send a damage notification over a Unix socket. The server
+composites the layers in z order (higher z on top) and sends only the
+damaged regions, at most fps times per second.
+
+Control messages are JSON objects, one per line; every request gets a reply:
+    {"op": "open", "x": 0, "y": 0, "width": 160, "height": 16, "z": 1, "alpha": false}
+        -> {"ok": true, "id": 1, "shm": "psm_...", "width": 160, "height": 16, "mode": "RGBX"}
+    {"op": "damage", "id": 1, "rects": [[x0, y0, x1, y1], ...]}   (layer coordinates, omit rects for all)
+    {"op": "move", "id": 1, "x": 0, "y": 100, "z": 2}
+    {"op": "close", "id": 1}
+    {"op": "stats"}
+Errors come back as {"ok": false, "error": "..."}.
+
+    python3 st7735_server.py serve --emulator
+    python3 st7735_server.py selftest
+"""
+import argparse
+import json
+import logging
+import os
+import selectors
+import socket
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+from PIL import Image, ImageChops, ImageDraw
+
+from st7735_driver import _merge_rect, _numpy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SOCKET = os.environ.get('ST7735_SOCKET', os.path.join(tempfile.gettempdir(), 'st7735.sock'))
+DEFAULT_FPS = 30
+BYTES_PER_PIXEL = 4
+MAX_MESSAGE = 64 * 1024  # A client sending a longer line without a newline is dropped
+
+_ATTACH_LOCK = threading.Lock()
+
+
+def _intersect(a, b):
+    rect = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return rect if rect[0] < rect[2] and rect[1] < rect[3] else None
+
+
+def _attach(name):
+    """Open an existing shared memory block without handing it to this process's resource tracker"""
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    # Older versions always register the block, and the tracker would unlink it when this
+    # process exits, pulling it from under the server
+    with _ATTACH_LOCK:
+        register = resource_tracker.register
+        resource_tracker.register = lambda name, rtype: None
+        try:
+            return shared_memory.SharedMemory(name=name)
+        finally:
+            resource_tracker.register = register
+
+
+class _Layer:
+    """Server side of a client layer: its place on screen and a read-only image over the shared block"""
+    def __init__(self, layer_id, conn, x, y, width, height, z, alpha, order):
+        self.id = layer_id
+        self.conn = conn
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.z = z
+        self.alpha = alpha
+        self.order = order  # Ties in z are stacked in opening order
+        self.mode = 'RGBA' if alpha else 'RGBX'
+        self.shm = shared_memory.SharedMemory(create=True, size=width * height * BYTES_PER_PIXEL)
+        # Maps the block rather than copying it, so reads always see the client's latest pixels
+        self.image = Image.frombuffer(self.mode, (width, height), self.shm.buf, 'raw', self.mode, 0, 1)
+
+    @property
+    def rect(self):
+        return (self.x, self.y, self.x + self.width, self.y + self.height)
+
+    def close(self):
+        self.image = None  # Drops the buffer export so the block can be closed
+        self.shm.close()
+        self.shm.unlink()
+
+
+class _Connection:
+    def __init__(self, sock):
+        self.sock = sock
+        self.inbox = b''
+        self.outbox = bytearray()  # Replies the client has not accepted yet
+        self.events = selectors.EVENT_READ
+        self.closed = False
+        self.layers = {}
+
+
+class DisplayServer:
+    """Composites client layers onto a Screen and presents damaged regions at up to fps frames per second"""
+    def __init__(self, screen, socket_path=DEFAULT_SOCKET, fps=DEFAULT_FPS, background='black'):
+        self.screen = screen
+        self.socket_path = socket_path
+        self.interval = 1.0 / fps
+        self.background = background
+        self.frames = 0
+        self.rects_sent = 0
+        self._layers = {}
+        self._next_id = 1
+        self._damage = []
+        self._next_frame = 0.0
+        self._stop = threading.Event()
+        self._selector = selectors.DefaultSelector()
+        self._listener = None
+
+    def start(self):
+        """Create the control socket; clients can connect once this returns"""
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # Left behind by a server that did not shut down cleanly
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen()
+        self._listener.setblocking(False)
+        self._selector.register(self._listener, selectors.EVENT_READ, None)
+        logger.info(f"Display server listening on {self.socket_path}")
+
+    def serve_forever(self):
+        if self._listener is None:
+            self.start()
+        try:
+            while not self._stop.is_set():
+                self.poll(0.1)
+        finally:
+            self.close()
+
+    def stop(self):
+        """Ask serve_forever() to return; safe from any thread"""
+        self._stop.set()
+
+    def poll(self, timeout=None):
+        """Handle pending control messages, then present a frame if damage is due"""
+        if self._damage:
+            wait = max(0.0, self._next_frame - time.monotonic())
+            timeout = wait if timeout is None else min(timeout, wait)
+        for key, events in self._selector.select(timeout):
+            conn = key.data
+            if conn is None:
+                self._accept()
+            elif events & selectors.EVENT_WRITE:
+                self._send(conn)
+                if not conn.outbox:
+                    self._process(conn)
+            elif events & selectors.EVENT_READ:
+                self._read(conn)
+        if self._damage and time.monotonic() >= self._next_frame:
+            self.present()
+
+    def present(self):
+        """Composite and send every damaged region now"""
+        damage, self._damage = self._damage, []
+        screen = self.screen
+        try:
+            with screen.frame():
+                for rect in damage:
+                    screen.buffer.paste(self._composite(rect), rect[:2])
+                    screen._mark_dirty(*rect)
+        except Exception as e:
+            screen._error('DisplayServer.present', f"Error presenting layers: {e}")
+        self.frames += 1
+        self.rects_sent += len(damage)
+        self._next_frame = time.monotonic() + self.interval
+
+    def stats(self):
+        width, height = self.screen.buffer.size
+        return {'width': width, 'height': height, 'frames': self.frames, 'rects': self.rects_sent,
+                'layers': len(self._layers),
+                'clients': sum(1 for key in self._selector.get_map().values() if key.data is not None),
+                'bytes': self.screen.busStats().get('bytes', 0)}
+
+    def close(self):
+        for key in list(self._selector.get_map().values()):
+            if key.data is not None:
+                self._disconnect(key.data)
+        if self._listener is not None:
+            self._selector.unregister(self._listener)
+            self._listener.close()
+            self._listener = None
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+        self._selector.close()
+
+    def _composite(self, rect):
+        """The layers' pixels over the background for one screen rectangle"""
+        stack = sorted(self._layers.values(), key=lambda layer: (layer.z, layer.order))
+        # Nothing below the topmost opaque layer covering the whole rectangle can show
+        for i in range(len(stack) - 1, -1, -1):
+            if not stack[i].alpha and _intersect(rect, stack[i].rect) == tuple(rect):
+                stack = stack[i:]
+                break
+        out = Image.new('RGB', (rect[2] - rect[0], rect[3] - rect[1]), self.background)
+        for layer in stack:
+            part = _intersect(rect, layer.rect)
+            if part is None:
+                continue
+            region = layer.image.crop((part[0] - layer.x, part[1] - layer.y,
+                                       part[2] - layer.x, part[3] - layer.y))
+            pos = (part[0] - rect[0], part[1] - rect[1])
+            out.paste(region.convert('RGB'), pos, region if layer.alpha else None)
+        return out
+
+    def _add_damage(self, rect):
+        width, height = self.screen.buffer.size
+        rect = _intersect(rect, (0, 0, width, height))
+        if rect is not None:
+            if not self._damage:
+                # Idle until now: the first change goes out at once, later ones wait for the frame slot
+                self._next_frame = max(self._next_frame, time.monotonic())
+            _merge_rect(self._damage, list(rect))
+
+    def _accept(self):
+        sock, _ = self._listener.accept()
+        sock.setblocking(False)
+        self._selector.register(sock, selectors.EVENT_READ, _Connection(sock))
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b''
+        if not data:
+            self._disconnect(conn)
+            return
+        conn.inbox += data
+        self._process(conn)
+
+    def _process(self, conn):
+        """Handle complete request lines until one of the replies cannot be sent straight away"""
+        while b'\n' in conn.inbox and not conn.outbox and not conn.closed:
+            line, conn.inbox = conn.inbox.split(b'\n', 1)
+            if line.strip():
+                self._reply(conn, self._handle(conn, line))
+        if not conn.closed and b'\n' not in conn.inbox and len(conn.inbox) > MAX_MESSAGE:
+            logger.warning("Dropping client sending an oversized message")
+            self._disconnect(conn)
+
+    def _reply(self, conn, reply):
+        conn.outbox += json.dumps(reply).encode() + b'\n'
+        self._send(conn)
+
+    def _send(self, conn):
+        """Send what the socket takes without blocking; a client that is not reading its replies
+        is only watched for writability until it does, so it cannot stall the server"""
+        try:
+            del conn.outbox[:conn.sock.send(conn.outbox)]
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            self._disconnect(conn)
+            return
+        events = selectors.EVENT_WRITE if conn.outbox else selectors.EVENT_READ
+        if events != conn.events:
+            self._selector.modify(conn.sock, events, conn)
+            conn.events = events
+
+    def _handle(self, conn, line):
+        try:
+            msg = json.loads(line)
+            op = msg.get('op')
+            if op == 'open':
+                return self._open(conn, msg)
+            if op == 'stats':
+                return dict(self.stats(), ok=True)
+            layer = conn.layers.get(msg.get('id'))
+            if layer is None:
+                raise ValueError(f"unknown layer {msg.get('id')}")
+            if op == 'damage':
+                rects = msg.get('rects') or [(0, 0, layer.width, layer.height)]
+                for x0, y0, x1, y1 in rects:
+                    part = _intersect((x0, y0, x1, y1), (0, 0, layer.width, layer.height))
+                    if part is not None:
+                        self._add_damage((part[0] + layer.x, part[1] + layer.y,
+                                          part[2] + layer.x, part[3] + layer.y))
+            elif op == 'move':
+                self._add_damage(layer.rect)
+                layer.x = int(msg.get('x', layer.x))
+                layer.y = int(msg.get('y', layer.y))
+                layer.z = int(msg.get('z', layer.z))
+                self._add_damage(layer.rect)
+            elif op == 'close':
+                self._close_layer(conn, layer)
+            else:
+                raise ValueError(f"unknown op {op!r}")
+            return {'ok': True}
+        except Exception as e:
+            return {'ok': False, 'error': str(e)}
+
+    def _open(self, conn, msg):
+        width, height = int(msg['width']), int(msg['height'])
+        if width <= 0 or height <= 0:
+            raise ValueError(f"invalid layer size {width}x{height}")
+        layer = _Layer(self._next_id, conn, int(msg.get('x', 0)), int(msg.get('y', 0)), width, height,
+                       int(msg.get('z', 0)), bool(msg.get('alpha', False)), self._next_id)
+        self._next_id += 1
+        self._layers[layer.id] = layer
+        conn.layers[layer.id] = layer
+        logger.info(f"Layer {layer.id} opened at {layer.rect}, z={layer.z}")
+        return {'ok': True, 'id': layer.id, 'shm': layer.shm.name, 'width': width, 'height': height,
+                'mode': layer.mode}
+
+    def _close_layer(self, conn, layer):
+        del self._layers[layer.id]
+        del conn.layers[layer.id]
+        self._add_damage(layer.rect)  # Uncovers whatever was below
+        layer.close()
+
+    def _disconnect(self, conn):
+        if conn.closed:
+            return
+        conn.closed = True
+        for layer in list(conn.layers.values()):
+            self._close_layer(conn, layer)
+        try:
+            self._selector.unregister(conn.sock)
+        except (KeyError, ValueError):
+            pass
+        conn.sock.close()
+
+
+class ClientLayer:
+    """A layer as seen by a client: write pixels, then damage() the parts that changed
+
+    pixels is a (height, width, 4) NumPy view of the shared block (None without
+    NumPy); buf is the raw memoryview. Neither copies anything.
+    """
+    def __init__(self, client, reply):
+        self.client = client
+        self.id = reply['id']
+        self.width = reply['width']
+        self.height = reply['height']
+        self.mode = reply['mode']
+        self._shm = _attach(reply['shm'])
+        self.buf = self._shm.buf
+        np = _numpy()
+        self.pixels = None
+        if np is not None:
+            self.pixels = np.ndarray((self.height, self.width, BYTES_PER_PIXEL), dtype=np.uint8, buffer=self.buf)
+
+    def paste(self, image, x=0, y=0, damage=True):
+        """Copy a PIL image into the layer at (x, y), clipped to the layer"""
+        box = _intersect((x, y, x + image.width, y + image.height), (0, 0, self.width, self.height))
+        if box is None:
+            return
+        region = image.crop((box[0] - x, box[1] - y, box[2] - x, box[3] - y)).convert(self.mode)
+        if self.pixels is not None:
+            self.pixels[box[1]:box[3], box[0]:box[2]] = _numpy().asarray(region)
+        else:
+            data = region.tobytes()
+            row = region.width * BYTES_PER_PIXEL
+            for i in range(region.height):
+                start = ((box[1] + i) * self.width + box[0]) * BYTES_PER_PIXEL
+                self.buf[start:start + row] = data[i * row:(i + 1) * row]
+        if damage:
+            self.damage([box])
+
+    def damage(self, rects=None):
+        """Tell the server which parts changed, as (x0, y0, x1, y1) in layer coordinates (default: all)"""
+        self.client.request('damage', id=self.id, rects=[list(r) for r in rects] if rects else None)
+
+    def move(self, x=None, y=None, z=None):
+        args = {k: v for k, v in (('x', x), ('y', y), ('z', z)) if v is not None}
+        self.client.request('move', id=self.id, **args)
+
+    def close(self):
+        if self._shm is None:
+            return
+        self.pixels = None
+        self.buf = None
+        self._shm.close()
+        self._shm = None
+        try:
+            self.client.request('close', id=self.id)
+        except (OSError, RuntimeError):
+            pass  # The server has gone; it unlinks the block itself
+
+
+class DisplayClient:
+    """Connection to a DisplayServer"""
+    def __init__(self, socket_path=DEFAULT_SOCKET, timeout=5.0):
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.settimeout(timeout)
+        self._sock.connect(socket_path)
+        self._file = self._sock.makefile('rb')
+        self._lock = threading.Lock()
+        self.layers = []
+
+    def request(self, op, **args):
+        with self._lock:
+            self._sock.sendall(json.dumps(dict(args, op=op)).encode() + b'\n')
+            line = self._file.readline()
+        if not line:
+            raise RuntimeError("Display server closed the connection")
+        reply = json.loads(line)
+        if not reply.get('ok'):
+            raise RuntimeError(f"Display server error: {reply.get('error')}")
+        return reply
+
+    def openLayer(self, x, y, width, height, z=0, alpha=False):
+        layer = ClientLayer(self, self.request('open', x=x, y=y, width=width, height=height, z=z, alpha=alpha))
+        self.layers.append(layer)
+        return layer
+
+    def stats(self):
+        return self.request('stats')
+
+    def close(self):
+        for layer in self.layers:
+            layer.close()
+        self.layers = []
+        self._file.close()
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _selftest_client(socket_path, role, done):
+    """Client process of the self-test: a status bar, or a translucent alert box"""
+    with DisplayClient(socket_path) as client:
+        if role == 'status':
+            layer = client.openLayer(0, 0, 128, 20, z=1)
+            img = Image.new('RGB', (128, 20), 'navy')
+            ImageDraw.Draw(img).rectangle((4, 4, 40, 15), fill='yellow')
+            layer.paste(img)
+            for i in range(10):
+                # Small updates in one corner, as a clock or sensor value would make
+                layer.paste(Image.new('RGB', (20, 12), (i * 25, 200, 0)), 100, 4)
+        else:
+            layer = client.openLayer(20, 10, 100, 60, z=2, alpha=True)
+            img = Image.new('RGBA', (100, 60), (255, 0, 0, 128))
+            ImageDraw.Draw(img).rectangle((10, 10, 89, 49), fill=(255, 255, 255, 255))
+            layer.paste(img)
+        done.wait(10)
+
+
+def _expected_selftest_image(size, background):
+    expected = Image.new('RGB', size, background)
+    status = Image.new('RGB', (128, 20), 'navy')
+    ImageDraw.Draw(status).rectangle((4, 4, 40, 15), fill='yellow')
+    status.paste(Image.new('RGB', (20, 12), (225, 200, 0)), (100, 4))
+    expected.paste(status, (0, 0))
+    alert = Image.new('RGBA', (100, 60), (255, 0, 0, 128))
+    ImageDraw.Draw(alert).rectangle((10, 10, 89, 49), fill=(255, 255, 255, 255))
+    expected.paste(alert.convert('RGB'), (20, 10), alert)
+    return expected
+
+
+def selftest(fps=DEFAULT_FPS):
+    """Run the server on the emulated panel with two client processes and check the composite"""
+    import multiprocessing
+    from st7735_driver import ROTATE_TRANSPOSE, Screen
+    screen = Screen(backend='emulator')
+    screen.initGPIO()
+    screen.openScreen()
+    socket_path = os.path.join(tempfile.mkdtemp(), 'st7735.sock')
+    server = DisplayServer(screen, socket_path, fps=fps)
+    server.start()
+    thread = threading.Thread(target=server.serve_forever, name='st7735-server', daemon=True)
+    thread.start()
+    ctx = multiprocessing.get_context('spawn')
+    done = ctx.Event()
+    clients = [ctx.Process(target=_selftest_client, args=(socket_path, role, done))
+               for role in ('status', 'alert')]
+    bytes_before = screen.busStats().get('bytes', 0)
+    try:
+        for proc in clients:
+            proc.start()
+        # Both clients have drawn once they are idle; give the server time for one more frame
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            with DisplayClient(socket_path) as probe:
+                if probe.stats()['layers'] == 2:
+                    break
+            time.sleep(0.05)
+        time.sleep(0.5)
+        stats = dict(server.stats())
+        expected = _expected_selftest_image(screen.buffer.size, server.background)
+        buffer_diff = ImageChops.difference(screen.buffer.convert('RGB'), expected).getbbox()
+        # The emulated panel holds the frame in panel orientation and 6 bits per channel
+        transpose = ROTATE_TRANSPOSE.get(screen.rotation)
+        panel_expected = expected.transpose(transpose) if transpose is not None else expected
+        panel_diff = max(hi for _, hi in ImageChops.difference(screen.emulator.image(), panel_expected).getextrema())
+    finally:
+        done.set()
+        for proc in clients:
+            proc.join(10)
+        server.stop()
+        thread.join(5)
+        screen.closeGPIO()
+    full_frame = screen.buffer.width * screen.buffer.height * 3
+    result = {'frames': stats['frames'], 'rects': stats['rects'],
+              'bytes_sent': stats['bytes'] - bytes_before, 'full_frame_bytes': full_frame,
+              'buffer_matches': buffer_diff is None, 'panel_max_error': panel_diff,
+              'passed': buffer_diff is None and panel_diff <= 7}
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Share the ST7735 LCD between processes')
+    sub = parser.add_subparsers(dest='command', required=True)
+    serve = sub.add_parser('serve', help='Own the panel and composite client layers')
+    serve.add_argument('--socket', default=DEFAULT_SOCKET)
+    serve.add_argument('--fps', type=float, default=DEFAULT_FPS, help='Most frames sent per second')
+    serve.add_argument('--rotation', type=int, default=1, choices=(0, 1, 2, 3))
+    serve.add_argument('--background', default='black')
+    serve.add_argument('--emulator', action='store_true', help='Drive the emulated panel')
+    test = sub.add_parser('selftest', help='Run server and clients on the emulated panel and check the result')
+    test.add_argument('--fps', type=float, default=DEFAULT_FPS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    if args.command == 'selftest':
+        result = selftest(args.fps)
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0 if result['passed'] else 1
+    from st7735_driver import Screen
+    logging.getLogger().setLevel(logging.INFO)
+    screen = Screen(rotation=args.rotation, backend='emulator' if args.emulator else None)
+    screen.initGPIO()
+    screen.openScreen()
+    screen.clearScreen(args.background)
+    server = DisplayServer(screen, args.socket, fps=args.fps, background=args.background)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        screen.closeGPIO()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,390 @@
+"""Retained-mode widgets for the ST7735 screen
+
+Widgets keep their own state and sit at fixed positions inside containers.
+Setting a property only marks the part of the widget it affects; render()
+then repaints just those parts, clipped to each widget's bounds, and sends
+them to the panel in one flush. A steady-state update costs what changed,
+however many widgets are on screen.
+
+    ui = WidgetTree(screen)
+    title = ui.add(Label(0, 0, 128, 18, 'Recorder', fontSize=14))
+    level = ui.add(ProgressBar(4, 24, 120, 10, maximum=100))
+    count = ui.add(NumericField(4, 40, 60, 18, 0, digits=5))
+    ui.render()
+    level.value = 42      # repaints the strip between the old and new fill
+    count.value = 17      # repaints the two digit cells that changed
+    ui.render()
+"""
+import logging
+import math
+
+from PIL import Image, ImageDraw
+
+from st7735_driver import IMAGE_CACHE, TEXT_CACHE, _merge_rect
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _intersect(a, b):
+    rect = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return rect if rect[0] < rect[2] and rect[1] < rect[3] else None
+
+
+def _paste_text(image, x, y, text, font, color):
+    """Draw text from the shared TEXT_CACHE, as Screen.drawText does"""
+    mask, dx, dy = TEXT_CACHE.get(font, text)
+    left, top = int(x) + dx, int(y) + dy
+    image.paste(color, (left, top, left + mask.width, top + mask.height), mask)
+
+
+class _Prop:
+    """Widget attribute that invalidates the widget when set to a different value"""
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.attr = '_' + name
+
+    def __get__(self, obj, owner=None):
+        return self if obj is None else getattr(obj, self.attr)
+
+    def __set__(self, obj, value):
+        old = getattr(obj, self.attr, _MISSING)
+        if old != value:
+            setattr(obj, self.attr, value)
+            if old is not _MISSING:
+                obj._changed(self.name, old)
+
+
+class Widget:
+    """Rectangle at (x, y) inside its parent, painted over its own background"""
+    background = _Prop()
+    visible = _Prop()
+
+    def __init__(self, x, y, width, height, background='black', visible=True):
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.parent = None
+        self.tree = None
+        self._depth = 0
+        self._seq = 0
+        self._damage = []  # Rectangles to repaint, in widget coordinates
+        self.background = background
+        self.visible = visible
+
+    @property
+    def rect(self):
+        """Bounds in the parent's coordinates"""
+        return (self.x, self.y, self.x + self.width, self.y + self.height)
+
+    def origin(self):
+        """Top-left corner in screen coordinates"""
+        x, y = self.x, self.y
+        parent = self.parent
+        while parent is not None:
+            x += parent.x
+            y += parent.y
+            parent = parent.parent
+        return x, y
+
+    def invalidate(self, rect=None):
+        """Repaint rect (widget coordinates, default all of it) on the next render()"""
+        rect = _intersect(rect or (0, 0, self.width, self.height), (0, 0, self.width, self.height))
+        if rect is None:
+            return
+        _merge_rect(self._damage, list(rect))
+        if self.tree is not None:
+            self.tree._dirty.add(self)
+
+    def render(self):
+        """The widget's pixels as an RGB image of its size"""
+        image = Image.new('RGB', (self.width, self.height), self.background)
+        self.paint(image, ImageDraw.Draw(image))
+        return image
+
+    def paint(self, image, draw):
+        """Draw the content over the background; subclasses override this"""
+
+    def _changed(self, name, old):
+        if name == 'visible' and self.parent is not None:
+            # Whatever the widget covered (or will cover) comes from its parent
+            self.parent.invalidate(self.rect)
+        else:
+            self.invalidate()
+
+    def _attach(self, tree, depth):
+        self.tree = tree
+        self._depth = depth
+        self._seq = tree._next_seq()
+        self.invalidate()
+
+    def _detach(self):
+        if self.tree is not None:
+            self.tree._dirty.discard(self)
+        self.tree = None
+
+    def _font(self, size, font_type=None):
+        return self.tree.screen._getFont(size, font_type)[0]
+
+
+class Container(Widget):
+    """Fixed-layout group: children are placed at their own (x, y) relative to the container"""
+    def __init__(self, x, y, width, height, children=(), background='black', visible=True):
+        self.children = []
+        super().__init__(x, y, width, height, background, visible)
+        for child in children:
+            self.add(child)
+
+    def add(self, child):
+        """Add a widget (or container) and return it"""
+        if child.parent is not None:
+            raise ValueError("widget already has a parent")
+        child.parent = self
+        self.children.append(child)
+        if self.tree is not None:
+            child._attach(self.tree, self._depth + 1)
+        return child
+
+    def remove(self, child):
+        self.children.remove(child)
+        child.parent = None
+        child._detach()
+        self.invalidate(child.rect)
+
+    def invalidate(self, rect=None):
+        rect = _intersect(rect or (0, 0, self.width, self.height), (0, 0, self.width, self.height))
+        if rect is None:
+            return
+        super().invalidate(rect)
+        # Children are painted after the container, so they must repaint what it covers
+        for child in self.children:
+            part = _intersect(rect, child.rect)
+            if part is not None:
+                child.invalidate((part[0] - child.x, part[1] - child.y, part[2] - child.x, part[3] - child.y))
+
+    def _attach(self, tree, depth):
+        super()._attach(tree, depth)
+        for child in self.children:
+            child._attach(tree, depth + 1)
+
+    def _detach(self):
+        super()._detach()
+        for child in self.children:
+            child._detach()
+
+
+class Label(Widget):
+    """One line of text, aligned 'left', 'center' or 'right' and centred vertically"""
+    text = _Prop()
+    color = _Prop()
+
+    def __init__(self, x, y, width, height, text='', color='white', background='black',
+                 fontSize=None, fontType=None, align='left', padding=2):
+        self.fontSize = fontSize
+        self.fontType = fontType
+        self.align = align
+        self.padding = padding
+        super().__init__(x, y, width, height, background)
+        self.text = str(text)
+        self.color = color
+
+    def _changed(self, name, old):
+        if name == 'text' and not isinstance(self._text, str):
+            self._text = str(self._text)
+        super()._changed(name, old)
+
+    def paint(self, image, draw):
+        if not self.text:
+            return
+        font = self._font(self.fontSize, self.fontType)
+        width = font.getlength(self.text)
+        if self.align == 'center':
+            x = (self.width - width) / 2
+        elif self.align == 'right':
+            x = self.width - self.padding - width
+        else:
+            x = self.padding
+        top, bottom = font.getbbox(self.text)[1::2]
+        _paste_text(image, x, (self.height - top - bottom) // 2, self.text, font, self.color)
+
+
+class NumericField(Widget):
+    """Number in fixed-width character cells; a change repaints only the cells whose character changed"""
+    value = _Prop()
+    color = _Prop()
+
+    def __init__(self, x, y, width, height, value=0, digits=6, fmt='{}', color='white',
+                 background='black', fontSize=None, fontType=None, align='right'):
+        self.digits = digits
+        self.fmt = fmt
+        self.fontSize = fontSize
+        self.fontType = fontType
+        self.align = align
+        self._cells = None  # (cell width, left of first cell) once a font is available
+        super().__init__(x, y, width, height, background)
+        self.value = value
+        self.color = color
+
+    @property
+    def text(self):
+        return self._format(self.value)
+
+    def _format(self, value):
+        text = self.fmt.format(value)[-self.digits:]
+        return text.rjust(self.digits) if self.align == 'right' else text.ljust(self.digits)
+
+    def _changed(self, name, old):
+        if name != 'value' or self._cells is None:
+            super()._changed(name, old)
+            return
+        cell, left = self._cells
+        for i, (a, b) in enumerate(zip(self._format(old), self.text)):
+            if a != b:
+                self.invalidate((left + i * cell, 0, left + (i + 1) * cell, self.height))
+
+    def _layout(self, font):
+        cell = max(math.ceil(font.getlength(c)) for c in '0123456789-.,+ ')
+        left = max(0, self.width - cell * self.digits) if self.align == 'right' else 0
+        self._cells = (cell, left)
+        return self._cells
+
+    def paint(self, image, draw):
+        font = self._font(self.fontSize, self.fontType)
+        cell, left = self._cells or self._layout(font)
+        top, bottom = font.getbbox('0123456789')[1::2]
+        y = (self.height - top - bottom) // 2
+        for i, ch in enumerate(self.text):
+            if ch != ' ':
+                _paste_text(image, left + i * cell, y, ch, font, self.color)
+
+
+class ProgressBar(Widget):
+    """Horizontal bar filled in proportion to value / maximum; a change repaints only the strip that moved"""
+    value = _Prop()
+    color = _Prop()
+
+    def __init__(self, x, y, width, height, value=0, maximum=100, color='lime', background='black',
+                 border='white'):
+        self.maximum = maximum
+        self.border = border
+        super().__init__(x, y, width, height, background)
+        self.value = value
+        self.color = color
+
+    def _fill_width(self, value):
+        inner = self.width - 2
+        return max(0, min(inner, round(inner * value / self.maximum))) if self.maximum else 0
+
+    def _changed(self, name, old):
+        if name != 'value':
+            super()._changed(name, old)
+            return
+        a, b = sorted((self._fill_width(old), self._fill_width(self.value)))
+        if a != b:
+            self.invalidate((1 + a, 1, 1 + b, self.height - 1))
+
+    def paint(self, image, draw):
+        if self.border is not None:
+            draw.rectangle((0, 0, self.width - 1, self.height - 1), outline=self.border)
+        fill = self._fill_width(self.value)
+        if fill:
+            draw.rectangle((1, 1, fill, self.height - 2), fill=self.color)
+
+
+class Icon(Widget):
+    """Image file (through the shared IMAGE_CACHE) or PIL image, fitted and centred in the widget"""
+    source = _Prop()
+
+    def __init__(self, x, y, width, height, source=None, background='black'):
+        super().__init__(x, y, width, height, background)
+        self.source = source
+
+    def paint(self, image, draw):
+        if self.source is None:
+            return
+        if isinstance(self.source, Image.Image):
+            img = self.source.copy()
+            img.thumbnail((self.width, self.height))
+            mask = img.getchannel('A') if img.mode == 'RGBA' else None
+            img = img.convert('RGB')
+        else:
+            try:
+                img, mask = IMAGE_CACHE.get(self.source, (self.width, self.height))
+            except FileNotFoundError:
+                logger.warning(f"Icon image {self.source} not found")
+                return
+        image.paste(img, ((self.width - img.width) // 2, (self.height - img.height) // 2), mask)
+
+
+class WidgetTree:
+    """Root of a widget tree covering the whole screen; render() sends what was invalidated"""
+    def __init__(self, screen, background='black'):
+        self.screen = screen
+        self._dirty = set()
+        self._seq = 0
+        self.widgets_painted = 0
+        self.root = Container(0, 0, screen.buffer.width, screen.buffer.height, background=background)
+        self.root._attach(self, 0)
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    def add(self, widget):
+        return self.root.add(widget)
+
+    def invalidateAll(self):
+        self.root.invalidate()
+
+    def render(self):
+        """Repaint every invalidated widget region in one flush; returns how many widgets were painted"""
+        if not self._dirty:
+            return 0
+        screen = self.screen
+        # Parents before children, siblings in the order they were added
+        dirty = sorted(self._dirty, key=lambda w: (w._depth, w._seq))
+        self._dirty = set()
+        painted = 0
+        try:
+            with screen.frame():
+                for widget in dirty:
+                    damage, widget._damage = widget._damage, []
+                    if not damage or not self._shown(widget):
+                        continue
+                    ox, oy = widget.origin()
+                    clip = self._clip(widget)
+                    image = widget.render()
+                    for x0, y0, x1, y1 in damage:
+                        box = _intersect((ox + x0, oy + y0, ox + x1, oy + y1), clip)
+                        if box is None:
+                            continue
+                        screen.buffer.paste(image.crop((box[0] - ox, box[1] - oy, box[2] - ox, box[3] - oy)),
+                                            box[:2])
+                        screen._mark_dirty(*box)
+                    painted += 1
+        except Exception as e:
+            screen._error('WidgetTree.render', f"Error rendering widgets: {e}")
+        self.widgets_painted += painted
+        return painted
+
+    @staticmethod
+    def _shown(widget):
+        while widget is not None:
+            if not widget.visible:
+                return False
+            widget = widget.parent
+        return True
+
+    @staticmethod
+    def _clip(widget):
+        """Screen rectangle of the widget, cut down to each ancestor's bounds"""
+        ox, oy = widget.origin()
+        clip = (ox, oy, ox + widget.width, oy + widget.height)
+        parent = widget.parent
+        while parent is not None and clip is not None:
+            px, py = parent.origin()
+            clip = _intersect(clip, (px, py, px + parent.width, py + parent.height))
+            parent = parent.parent
+        return clip or (0, 0, 0, 0)
@@ -0,0 +1,404 @@
+"""Real-time audio capture from the WM8960 into a preallocated ring buffer
+
+A capture thread reads fixed-size periods from a source straight into the
+slots of a NumPy ring buffer, and the consumer gets each period as a view of
+its slot. The buffer has one writer and one reader: each side only advances
+its own counter, so the data path takes no locks and allocates nothing per
+period. When the reader of a live source (the card) falls behind and the ring
+is full, incoming periods are read into a scratch slot and dropped, and the
+drop is counted as an overrun. A file source instead waits for the reader, so
+no samples are lost however slow the consumer is.
+
+Sources:
+    ArecordSource('hw:0,0', rate=16000, channels=2)   # the card, via arecord
+    WavSource('test.wav', realtime=True)              # a file, no card needed
+
+Typical use:
+    with Capture(ArecordSource()) as capture:
+        for chunk in capture.periods():
+            analyse(chunk)   # (period_frames, channels) view, valid until the next iteration
+"""
+import logging
+import struct
+import subprocess
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Matches the recording command in the README
+DEFAULT_DEVICE = 'hw:0,0'
+DEFAULT_RATE = 16000
+DEFAULT_CHANNELS = 2
+DEFAULT_FORMAT = 'S32_LE'
+PERIOD_FRAMES = 512   # 32 ms at 16 kHz
+RING_PERIODS = 64     # About 2 s of slack at the defaults
+
+# ALSA sample formats we can hand to NumPy without conversion
+ALSA_DTYPES = {'S16_LE': np.dtype('<i2'), 'S32_LE': np.dtype('<i4'), 'FLOAT_LE': np.dtype('<f4')}
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+class RingBuffer:
+    """Single-producer, single-consumer ring of fixed-size periods backed by one NumPy array
+
+    The writer fills writable() and calls commit(); the reader takes peek() and
+    calls consume() when done with it. Each counter is written by one thread
+    only, and the slot views are created up front, so neither side locks or
+    allocates per period.
+    """
+    def __init__(self, periods, period_frames, channels, dtype):
+        self.periods = periods
+        self.period_frames = period_frames
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        # One extra slot is the scratch area that overrun periods are read into
+        self.data = np.zeros((periods + 1, period_frames, channels), dtype=self.dtype)
+        self._slots = [self.data[i] for i in range(periods + 1)]
+        self._bytes = [memoryview(slot).cast('B') for slot in self._slots]
+        self._written = 0  # Periods committed; only the writer changes it
+        self._scratch = False  # writable() handed out the scratch slot; only the writer changes it
+        self._read = 0     # Periods consumed; only the reader changes it
+        self._ready = threading.Event()
+        self._space = threading.Event()
+        self.closed = False  # Set by the writer at end of stream; peek() then stops waiting
+        self.overruns = 0  # Periods dropped because the reader was behind
+
+    def __len__(self):
+        """Periods waiting to be read"""
+        return self._written - self._read
+
+    def writable(self):
+        """Byte view of the slot to fill next: the scratch slot when the ring is full"""
+        # Remembered for commit(): the reader may free a slot while this one is being filled
+        self._scratch = self._written - self._read >= self.periods
+        if self._scratch:
+            return self._bytes[self.periods]
+        return self._bytes[self._written % self.periods]
+
+    def commit(self):
+        """Publish the slot returned by writable(); returns False if it was the scratch slot (overrun)"""
+        if self._scratch:
+            self.overruns += 1
+            return False
+        self._written += 1
+        self._ready.set()
+        return True
+
+    def wait_space(self, timeout=None):
+        """Block the writer until a slot is free; returns False if the timeout expires first"""
+        if self._written - self._read < self.periods:
+            return True
+        self._space.clear()
+        # Re-check after clearing so a consume between the two is not missed
+        if self._written - self._read < self.periods:
+            return True
+        return self._space.wait(timeout)
+
+    def peek(self, timeout=None):
+        """View of the oldest unread period, or None if none arrives within timeout"""
+        if self._written == self._read:
+            if self.closed:
+                return None
+            self._ready.clear()
+            # Re-check after clearing so a commit or close between the two is not missed
+            if self._written == self._read and not self.closed and not self._ready.wait(timeout):
+                return None
+            if self._written == self._read:
+                return None
+        return self._slots[self._read % self.periods]
+
+    def consume(self):
+        """Release the period returned by peek() back to the writer"""
+        if self._read < self._written:
+            self._read += 1
+            self._space.set()
+
+    def close(self):
+        """Mark the end of the stream and wake a reader blocked in peek()"""
+        self.closed = True
+        self._ready.set()
+
+
+def _read_full(f, buf):
+    """Fill buf from a raw stream, returning the byte count (short only at end of stream)"""
+    total = 0
+    size = len(buf)
+    while total < size:
+        n = f.readinto(buf[total:])
+        if not n:
+            break
+        total += n
+    return total
+
+
+class ArecordSource:
+    """Capture PCM through an arecord process writing raw samples to a pipe
+
+    arecord's own xrun reports ("overrun!!!") are counted in xruns; those are
+    samples lost before they reached this process.
+    """
+    live = True  # The card keeps producing samples; Capture drops them rather than stall it
+
+    def __init__(self, device=DEFAULT_DEVICE, rate=DEFAULT_RATE, channels=DEFAULT_CHANNELS,
+                 sample_format=DEFAULT_FORMAT, period_frames=PERIOD_FRAMES):
+        if sample_format not in ALSA_DTYPES:
+            raise ValueError(f"Unsupported sample format: {sample_format}")
+        self.device = device
+        self.rate = rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.dtype = ALSA_DTYPES[sample_format]
+        self.period_frames = period_frames
+        self.xruns = 0
+        self._proc = None
+        self._stderr_thread = None
+
+    def open(self):
+        cmd = ['arecord', '-q', '-D', self.device, '-f', self.sample_format, '-r', str(self.rate),
+               '-c', str(self.channels), '-t', 'raw', f'--period-size={self.period_frames}',
+               f'--buffer-size={self.period_frames * 4}']
+        self._proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+        self._stderr_thread = threading.Thread(target=self._watch_stderr, name='arecord-stderr', daemon=True)
+        self._stderr_thread.start()
+        logger.info(f"Capturing from {self.device}: {self.sample_format} {self.rate} Hz x{self.channels}")
+
+    def readinto(self, buf):
+        return _read_full(self._proc.stdout, buf)
+
+    def close(self):
+        if self._proc is None:
+            return
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=2)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+        self._proc.stdout.close()
+        self._proc = None
+
+    def _watch_stderr(self):
+        for line in iter(self._proc.stderr.readline, b''):
+            text = line.decode(errors='replace').strip()
+            if 'overrun' in text:
+                self.xruns += 1
+            elif text:
+                logger.warning(f"arecord: {text}")
+
+
+def parse_wav_header(f):
+    """Read RIFF/WAVE chunks up to the data chunk; returns (format_tag, channels, rate, bits, data_bytes)
+
+    Leaves f positioned at the first sample. Handles PCM, IEEE float and
+    WAVE_FORMAT_EXTENSIBLE headers.
+    """
+    riff, _, wave = struct.unpack('<4sI4s', f.read(12))
+    if riff != b'RIFF' or wave != b'WAVE':
+        raise ValueError("not a RIFF/WAVE file")
+    fmt = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            raise ValueError("no data chunk")
+        chunk_id, size = struct.unpack('<4sI', header)
+        if chunk_id == b'fmt ':
+            body = f.read(size + (size & 1))
+            tag, channels, rate, _, _, bits = struct.unpack_from('<HHIIHH', body)
+            if tag == WAVE_FORMAT_EXTENSIBLE and size >= 40:
+                tag = struct.unpack_from('<H', body, 24)[0]  # First two bytes of the subformat GUID
+            fmt = (tag, channels, rate, bits)
+        elif chunk_id == b'data':
+            if fmt is None:
+                raise ValueError("data chunk before fmt chunk")
+            # Streaming writers may leave the size as 0 or 0xFFFFFFFF; read to the end then
+            return fmt + (None if size in (0, 0xFFFFFFFF) else size,)
+        else:
+            f.seek(size + (size & 1), 1)
+
+
+class WavSource:
+    """Read periods from a WAV file, optionally paced at the file's sample rate like a live card
+
+    A file can always wait, so Capture gives it backpressure instead of
+    dropping periods, even when paced.
+    """
+    live = False
+
+    def __init__(self, path, period_frames=PERIOD_FRAMES, realtime=False, loop=False):
+        self.path = path
+        self.period_frames = period_frames
+        self.realtime = realtime
+        self.loop = loop
+        self.xruns = 0
+        self._file = None
+        with open(path, 'rb') as f:
+            tag, self.channels, self.rate, bits, self._data_bytes = parse_wav_header(f)
+            self._data_start = f.tell()
+        if tag == WAVE_FORMAT_PCM and bits in (16, 32):
+            self.dtype = np.dtype(f'<i{bits // 8}')
+            self.sample_format = f'S{bits}_LE'
+        elif tag == WAVE_FORMAT_IEEE_FLOAT and bits == 32:
+            self.dtype = np.dtype('<f4')
+            self.sample_format = 'FLOAT_LE'
+        else:
+            raise ValueError(f"{path}: unsupported WAV format (tag {tag:#x}, {bits} bits)")
+        self._frame_bytes = self.channels * self.dtype.itemsize
+
+    def open(self):
+        self._file = open(self.path, 'rb', buffering=0)
+        self._file.seek(self._data_start)
+        self._remaining = self._data_bytes
+        self._next_due = time.monotonic()
+
+    def readinto(self, buf):
+        n = self._read(buf)
+        while self.loop and n < len(buf):
+            # Wrap around to the first sample, filling the rest of this period from there
+            self._file.seek(self._data_start)
+            self._remaining = self._data_bytes
+            more = self._read(buf[n:])
+            if not more:
+                break
+            n += more
+        if n < len(buf):
+            n -= n % self._frame_bytes  # Drop a trailing partial frame
+        if self.realtime and n:
+            self._next_due += n // self._frame_bytes / self.rate
+            delay = self._next_due - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return n
+
+    def _read(self, buf):
+        if self._remaining is not None:
+            if self._remaining <= 0:
+                return 0
+            if self._remaining < len(buf):
+                buf = buf[:self._remaining]
+        n = _read_full(self._file, buf)
+        if self._remaining is not None:
+            self._remaining -= n
+        return n
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class Capture:
+    """Runs a source on a capture thread, feeding a RingBuffer the consumer reads periods from
+
+    With drop (the default for live sources such as ArecordSource) a full ring
+    drops incoming periods as overruns; otherwise the capture thread waits for
+    the consumer to free a slot.
+    """
+    def __init__(self, source, periods=RING_PERIODS, drop=None):
+        self.source = source
+        self.drop = getattr(source, 'live', True) if drop is None else drop
+        self.ring = RingBuffer(periods, source.period_frames, source.channels, source.dtype)
+        self.rate = source.rate
+        self.channels = source.channels
+        self.frames_captured = 0
+        self.eof = False
+        self._thread = None
+        self._stop = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = False
+        self.eof = False
+        self.ring.closed = False
+        self.source.open()
+        self._thread = threading.Thread(target=self._run, name='wm8960-capture', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop = True
+        self.source.close()  # Unblocks a read waiting on the pipe
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def periods(self, timeout=1.0):
+        """Yield each captured period as a (period_frames, channels) view of the ring
+
+        A view stays valid until the loop asks for the next one; copy it to keep
+        it longer. Ends when the source is exhausted or stop() is called.
+        """
+        ring = self.ring
+        while True:
+            chunk = ring.peek(timeout)
+            if chunk is None:
+                if self.eof or self._thread is None:
+                    return
+                continue
+            if self.eof and len(ring) == 1:
+                # The final period may be partly padding; only yield the captured frames
+                tail = self.frames_captured % ring.period_frames
+                if tail:
+                    chunk = chunk[:tail]
+            try:
+                yield chunk
+            finally:
+                ring.consume()
+
+    def read(self, timeout=None):
+        """Copy of the next period, or None on timeout or end of stream (allocates; periods() does not)"""
+        chunk = self.ring.peek(timeout)
+        if chunk is None:
+            return None
+        data = chunk.copy()
+        self.ring.consume()
+        return data
+
+    def stats(self):
+        return {'frames_captured': self.frames_captured, 'overruns': self.ring.overruns,
+                'overrun_frames': self.ring.overruns * self.ring.period_frames,
+                'source_xruns': self.source.xruns, 'queued_periods': len(self.ring),
+                'capacity_periods': self.ring.periods}
+
+    def _run(self):
+        ring = self.ring
+        period_bytes = ring.period_frames * ring.channels * ring.dtype.itemsize
+        try:
+            while not self._stop:
+                if not self.drop:
+                    while not ring.wait_space(0.1) and not self._stop:
+                        pass
+                    if self._stop:
+                        break
+                buf = ring.writable()
+                n = self.source.readinto(buf)
+                if n < period_bytes:
+                    if n:
+                        # Final short period: pad with silence so every slot is a whole period
+                        buf[n:] = bytes(period_bytes - n)
+                        if ring.commit():
+                            self.frames_captured += n // (period_bytes // ring.period_frames)
+                    break
+                if ring.commit():
+                    self.frames_captured += ring.period_frames
+                elif ring.overruns == 1 or ring.overruns % 100 == 0:
+                    logger.warning(f"Capture overrun: {ring.overruns} periods dropped")
+        except (OSError, ValueError) as e:
+            if not self._stop:
+                logger.error(f"Capture error: {e}")
+        finally:
+            self.eof = True
+            ring.close()
@@ -0,0 +1,697 @@
+"""Low-latency playback through the WM8960 with in-process mixing
+
+One mixer thread keeps the output PCM open and writes a fixed-size period at a
+time, silence included, so a sound starts within the sink's buffer time
+instead of after a process spawn and a device open. Short clips are decoded and
+converted to the output format once and cached. Several voices are summed into
+an int32 period with NumPy and clipped to 16 bits. Long files are streamed from
+disk in chunks by a reader thread per stream.
+
+    with Player(AplaySink()) as player:       # or NullSink() / FileSink('mix.wav') without the card
+        player.preload(['beep.wav'])
+        player.play('beep.wav')                # starts within a few periods
+        player.stream('music.wav', gain=0.5)
+        ...
+    print(player.stats())                      # underruns, start latency, mix time
+
+Command line:
+    python3 wm8960_playback.py play beep.wav music.wav
+    python3 wm8960_playback.py play beep.wav --null       # no sound card needed
+    python3 wm8960_playback.py bench
+    python3 wm8960_playback.py selftest                   # streamed output compared with the file
+"""
+from collections import OrderedDict
+import argparse
+import json
+import logging
+import os
+import queue
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from wm8960_capture import DEFAULT_DEVICE, WavSource
+from wm8960_recorder import WavWriter, convert, downmix
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 48000
+DEFAULT_CHANNELS = 2
+PERIOD_FRAMES = 256        # 5.3 ms at 48 kHz
+BUFFER_PERIODS = 4         # Output buffer; sets the start latency (about 21 ms at the defaults)
+CLIP_CACHE_BUDGET = 32 * 1024 * 1024
+CLIP_MAX_SECONDS = 10.0    # play() refuses longer files; stream() them instead
+STREAM_CHUNK_SECONDS = 0.25
+STREAM_QUEUE_CHUNKS = 4    # Converted chunks a stream reads ahead of the mixer
+
+SAMPLE_DTYPE = np.dtype('<i2')  # The mixer's output format, S16_LE
+MAX_GAIN = 2.0                  # Keeps a Q15 gain times a 16-bit sample inside int32
+
+
+class _Resampler:
+    """Linear-interpolation rate converter for float32 (frames, channels) blocks, continuous across blocks"""
+    def __init__(self, src_rate, rate, channels):
+        self.step = src_rate / rate
+        self.channels = channels
+        self._prev = np.zeros((1, channels), dtype=np.float32)  # Last input frame of the previous block
+        self._pos = 1.0  # Next output position; index 0 is self._prev
+
+    def process(self, block):
+        data = np.concatenate((self._prev, block))
+        end = len(data) - 1
+        count = int((end - self._pos) // self.step) + 1 if end >= self._pos else 0
+        positions = self._pos + np.arange(count) * self.step
+        out = np.empty((count, self.channels), dtype=np.float32)
+        index = np.arange(len(data))
+        for ch in range(self.channels):
+            out[:, ch] = np.interp(positions, index, data[:, ch])
+        self._pos += count * self.step - end
+        self._prev = data[-1:]
+        return out
+
+
+def _map_channels(samples, channels):
+    """Fit a (frames, n) block to channels: duplicate mono, downmix to mono, or drop extra channels"""
+    have = samples.shape[1]
+    if have == channels:
+        return samples
+    if channels == 1:
+        return downmix(samples)
+    if have == 1:
+        return np.repeat(samples, channels, axis=1)
+    if have > channels:
+        return samples[:, :channels]
+    return np.concatenate([samples] + [samples[:, -1:]] * (channels - have), axis=1)
+
+
+def to_output(samples, src_rate, rate=DEFAULT_RATE, channels=DEFAULT_CHANNELS, resampler=None):
+    """Convert a block of S16, S32 or float samples to the mixer's S16 format, channel count and rate
+
+    Pass the same resampler for consecutive blocks of one stream so the rate
+    conversion is continuous across them.
+    """
+    samples = _map_channels(samples, channels)
+    if src_rate != rate:
+        resampler = resampler or _Resampler(src_rate, rate, channels)
+        samples = resampler.process(convert(samples, 'FLOAT_LE'))
+    return np.ascontiguousarray(convert(samples, 'S16_LE'))
+
+
+class ClipCache:
+    """LRU cache of clips already converted to the output format, evicted by total size in bytes
+
+    Entries are keyed by (path, mtime, rate, channels), as ImageCache keys
+    images, so an edited file is reloaded.
+    """
+    def __init__(self, budget=CLIP_CACHE_BUDGET, max_seconds=CLIP_MAX_SECONDS):
+        self.budget = budget
+        self.max_seconds = max_seconds
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._clips = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path, rate=DEFAULT_RATE, channels=DEFAULT_CHANNELS):
+        """(frames, channels) S16 samples of the WAV file at path; raises OSError/ValueError if unusable"""
+        key = (path, os.stat(path).st_mtime_ns, rate, channels)
+        with self._lock:
+            clip = self._clips.get(key)
+            if clip is not None:
+                self._clips.move_to_end(key)
+                self.hits += 1
+                return clip
+            self.misses += 1
+        clip = self._load(path, rate, channels)
+        with self._lock:
+            if key not in self._clips:
+                self._clips[key] = clip
+                self.bytes += clip.nbytes
+            while self.bytes > self.budget and len(self._clips) > 1:
+                _, old = self._clips.popitem(last=False)
+                self.bytes -= old.nbytes
+        return clip
+
+    def clear(self):
+        with self._lock:
+            self._clips.clear()
+            self.bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'clips': len(self._clips),
+                'bytes': self.bytes, 'budget': self.budget}
+
+    def _load(self, path, rate, channels):
+        source = WavSource(path)
+        frame_bytes = source.channels * source.dtype.itemsize
+        # The file size bounds the sample count whatever the header says
+        capacity = os.path.getsize(path) // frame_bytes
+        if capacity > self.max_seconds * source.rate * 1.01 + 1024:
+            raise ValueError(f"{path}: too long for a clip ({capacity / source.rate:.1f} s), stream it instead")
+        samples = np.empty((capacity, source.channels), dtype=source.dtype)
+        source.open()
+        try:
+            n = source.readinto(memoryview(samples).cast('B'))
+        finally:
+            source.close()
+        return to_output(samples[:n // frame_bytes], source.rate, rate, channels)
+
+
+CLIP_CACHE = ClipCache()
+
+
+class NullSink:
+    """Discards periods, paced like a card with buffer_frames of buffer when realtime is set
+
+    With realtime pacing, write() blocks while the modelled buffer is full and
+    counts an underrun whenever a period arrives after the buffer would have
+    run dry, so the mixer can be tested for glitches without the card.
+    """
+    def __init__(self, rate=DEFAULT_RATE, channels=DEFAULT_CHANNELS, buffer_frames=PERIOD_FRAMES * BUFFER_PERIODS,
+                 realtime=True):
+        self.rate = rate
+        self.channels = channels
+        self.buffer_frames = buffer_frames
+        self.realtime = realtime
+        self.frames_written = 0
+        self.underruns = 0
+        self._start = None
+        self._queued_frames = 0  # Frames written since the modelled device (re)started
+
+    def open(self):
+        self._start = None
+        self._queued_frames = 0
+
+    def write(self, samples):
+        n = len(samples)
+        if self.realtime:
+            now = time.monotonic()
+            if self._start is None:
+                self._start = now
+            queued = self._queued_frames - (now - self._start) * self.rate
+            if queued < 0:
+                # The device played out everything it had; it restarts from this period
+                self.underruns += 1
+                self._start = now
+                self._queued_frames = 0
+                queued = 0
+            wait = (queued + n - self.buffer_frames) / self.rate
+            if wait > 0:
+                time.sleep(wait)
+            self._queued_frames += n
+        self.frames_written += n
+        self._consume(samples)
+
+    def delay(self):
+        """Seconds of audio queued ahead of the next period written"""
+        if not self.realtime or self._start is None:
+            return 0.0
+        return max(0.0, self._queued_frames / self.rate - (time.monotonic() - self._start))
+
+    def close(self):
+        pass
+
+    def _consume(self, samples):
+        pass
+
+
+class FileSink(NullSink):
+    """Writes the mixed output to a WAV file; runs as fast as the mixer unless realtime is set"""
+    def __init__(self, path, rate=DEFAULT_RATE, channels=DEFAULT_CHANNELS, buffer_frames=PERIOD_FRAMES * BUFFER_PERIODS,
+                 realtime=False):
+        super().__init__(rate, channels, buffer_frames, realtime)
+        self.path = path
+        self._writer = None
+
+    def open(self):
+        super().open()
+        self._writer = WavWriter(self.path, self.rate, self.channels, 'S16_LE')
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _consume(self, samples):
+        self._writer.write(samples)
+
+
+class AplaySink:
+    """Raw S16 periods piped into one long-running aplay process, which keeps the PCM open
+
+    aplay's xrun reports ("underrun!!!") are counted in underruns. The pipe is
+    shrunk to a page where the kernel allows it, so little audio waits in it.
+    """
+    realtime = True
+
+    def __init__(self, device=DEFAULT_DEVICE, rate=DEFAULT_RATE, channels=DEFAULT_CHANNELS,
+                 period_frames=PERIOD_FRAMES, buffer_periods=BUFFER_PERIODS):
+        self.device = device
+        self.rate = rate
+        self.channels = channels
+        self.period_frames = period_frames
+        self.buffer_frames = period_frames * buffer_periods
+        self.frames_written = 0
+        self.underruns = 0
+        self._pipe_frames = 0
+        self._proc = None
+        self._stderr_thread = None
+
+    def open(self):
+        cmd = ['aplay', '-q', '-D', self.device, '-t', 'raw', '-f', 'S16_LE', '-r', str(self.rate),
+               '-c', str(self.channels), f'--period-size={self.period_frames}',
+               f'--buffer-size={self.buffer_frames}', '-']
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=subprocess.PIPE, bufsize=0)
+        self._pipe_frames = self._shrink_pipe() // (self.channels * SAMPLE_DTYPE.itemsize)
+        self._stderr_thread = threading.Thread(target=self._watch_stderr, name='aplay-stderr', daemon=True)
+        self._stderr_thread.start()
+        logger.info(f"Playing to {self.device}: S16_LE {self.rate} Hz x{self.channels}")
+
+    def write(self, samples):
+        self._proc.stdin.write(memoryview(samples).cast('B'))
+        self.frames_written += len(samples)
+
+    def delay(self):
+        """Estimated seconds queued ahead of the next period: a full device buffer plus the pipe"""
+        return (self.buffer_frames + self._pipe_frames) / self.rate
+
+    def close(self):
+        if self._proc is None:
+            return
+        try:
+            self._proc.stdin.close()
+            self._proc.wait(timeout=2)
+        except (OSError, subprocess.TimeoutExpired):
+            self._proc.kill()
+            self._proc.wait()
+        self._proc = None
+
+    def _shrink_pipe(self):
+        fd = self._proc.stdin.fileno()
+        try:
+            import fcntl
+            return fcntl.fcntl(fd, getattr(fcntl, 'F_SETPIPE_SZ', 1031), 4096)
+        except (ImportError, OSError) as e:
+            logger.debug(f"Cannot shrink the aplay pipe: {e}")
+            return 65536
+
+    def _watch_stderr(self):
+        for line in iter(self._proc.stderr.readline, b''):
+            text = line.decode(errors='replace').strip()
+            if 'underrun' in text:
+                self.underruns += 1
+            elif text:
+                logger.warning(f"aplay: {text}")
+
+
+class Voice:
+    """A cached clip being played; stop() ends it early and wait() blocks until it has finished"""
+    def __init__(self, samples, gain=1.0, loop=False, name=None):
+        if not -MAX_GAIN < gain < MAX_GAIN:
+            raise ValueError(f"gain must be between -{MAX_GAIN} and {MAX_GAIN}")
+        self.samples = samples
+        self.gain = gain
+        self.loop = loop
+        self.name = name
+        self.position = 0
+        self.requested_at = time.monotonic()
+        self.start_latency = None  # Seconds from play() until its first sample reaches the DAC
+        self.done = threading.Event()
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def wait(self, timeout=None):
+        return self.done.wait(timeout)
+
+    def render(self, mix, scratch):
+        """Add the next len(mix) frames into mix; returns False once the voice has finished"""
+        n = len(mix)
+        filled = 0
+        while filled < n and not self._stopped:
+            block = self._next(n - filled)
+            if block is None:
+                return False
+            _add(mix[filled:filled + len(block)], block, self.gain, scratch)
+            filled += len(block)
+        return not self._stopped
+
+    def _next(self, frames):
+        if self.position >= len(self.samples):
+            if not self.loop or not len(self.samples):
+                return None
+            self.position = 0
+        block = self.samples[self.position:self.position + frames]
+        self.position += len(block)
+        return block
+
+
+class StreamVoice(Voice):
+    """A WAV file read and converted in chunks by its own thread, a few chunks ahead of the mixer
+
+    starved counts periods where the reader had not kept up and the voice was
+    silent for part of the period. With wait_for_reader (for sinks that are not
+    realtime, such as a FileSink) the mixer waits for the reader instead.
+    """
+    def __init__(self, path, rate, channels, gain=1.0, loop=False, chunk_seconds=STREAM_CHUNK_SECONDS,
+                 queue_chunks=STREAM_QUEUE_CHUNKS, wait_for_reader=False):
+        super().__init__(np.empty((0, channels), dtype=SAMPLE_DTYPE), gain, loop, path)
+        self.starved = 0
+        self.wait_for_reader = wait_for_reader
+        self._source = WavSource(path, period_frames=max(1, int(chunk_seconds * rate)), loop=loop)
+        self._rate = rate
+        self._channels = channels
+        self._chunks = queue.Queue(maxsize=queue_chunks)
+        self._eof = False
+        self._source.open()
+        self._reader = threading.Thread(target=self._read, name='wm8960-stream', daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        source = self._source
+        resampler = _Resampler(source.rate, self._rate, self._channels) if source.rate != self._rate else None
+        frame_bytes = source.channels * source.dtype.itemsize
+        buf = np.empty((source.period_frames, source.channels), dtype=source.dtype)
+        raw = memoryview(buf).cast('B')
+        try:
+            while not self._stopped:
+                n = source.readinto(raw) // frame_bytes
+                if not n:
+                    break
+                chunk = to_output(buf[:n], source.rate, self._rate, self._channels, resampler)
+                if np.shares_memory(chunk, buf):
+                    # Already in the output format: the chunk is a view of buf, which the next read reuses
+                    chunk = chunk.copy()
+                while not self._stopped:
+                    try:
+                        self._chunks.put(chunk, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+        except (OSError, ValueError) as e:
+            logger.error(f"Error streaming {self.name}: {e}")
+        finally:
+            source.close()
+            self._eof = True
+
+    def _next(self, frames):
+        if self.position >= len(self.samples):
+            try:
+                self.samples = self._chunks.get_nowait()
+            except queue.Empty:
+                while self.wait_for_reader and not self._eof and self._chunks.empty():
+                    time.sleep(0.001)
+                if not self._chunks.empty():
+                    return self._next(frames)
+                if self._eof:
+                    return None
+                self.starved += 1
+                return np.zeros((frames, self._channels), dtype=SAMPLE_DTYPE)
+            self.position = 0
+        block = self.samples[self.position:self.position + frames]
+        self.position += len(block)
+        return block
+
+
+def _add(mix, block, gain, scratch):
+    """mix += block * gain, in int32 with the gain in Q15 fixed point"""
+    if gain == 1.0:
+        mix += block
+        return
+    tmp = scratch[:len(block)]
+    np.multiply(block, np.int32(round(gain * 32768)), out=tmp)
+    tmp >>= 15
+    mix += tmp
+
+
+class Player:
+    """Mixes voices into fixed-size periods on one thread and writes them to an always-open sink"""
+    def __init__(self, sink=None, rate=None, channels=None, period_frames=PERIOD_FRAMES, cache=CLIP_CACHE):
+        self.sink = sink if sink is not None else AplaySink()
+        self.rate = rate or self.sink.rate
+        self.channels = channels or self.sink.channels
+        self.period_frames = period_frames
+        self.cache = cache
+        self.periods = 0
+        self.voices_started = 0
+        self.starved = 0
+        self._voices = []
+        self._pending = []
+        self._lock = threading.Lock()
+        self._mix = np.zeros((period_frames, self.channels), dtype=np.int32)
+        self._scratch = np.zeros((period_frames, self.channels), dtype=np.int32)
+        self._out = np.zeros((period_frames, self.channels), dtype=SAMPLE_DTYPE)
+        self._latencies = []
+        self._mix_time = 0.0
+        self._mix_max = 0.0
+        self._wake = threading.Event()
+        self._thread = None
+        self._stop = False
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = False
+        self.sink.open()
+        self._thread = threading.Thread(target=self._run, name='wm8960-mixer', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop mixing and close the sink; voices still playing are cut off"""
+        if self._thread is None:
+            return
+        self._stop = True
+        self._wake.set()
+        self._thread.join()
+        self._thread = None
+        self.sink.close()
+        self._end_voices()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def preload(self, paths):
+        """Decode and convert clips into the cache ahead of time, so play() only looks them up"""
+        for path in paths:
+            self.cache.get(path, self.rate, self.channels)
+
+    def clip(self, samples, rate):
+        """Convert a (frames, channels) array of S16, S32 or float samples into a clip for play()"""
+        return to_output(np.asarray(samples).reshape(len(samples), -1), rate, self.rate, self.channels)
+
+    def play(self, clip, gain=1.0, loop=False):
+        """Start a clip (a WAV path, via the cache, or an array from clip()); returns its Voice"""
+        if isinstance(clip, (str, os.PathLike)):
+            voice = Voice(self.cache.get(clip, self.rate, self.channels), gain, loop, os.fspath(clip))
+        else:
+            voice = Voice(clip, gain, loop)
+        return self._add_voice(voice)
+
+    def stream(self, path, gain=1.0, loop=False):
+        """Start playing a long WAV file, read from disk in chunks; returns its Voice"""
+        return self._add_voice(StreamVoice(path, self.rate, self.channels, gain, loop,
+                                           wait_for_reader=not self.sink.realtime))
+
+    def stopAll(self):
+        with self._lock:
+            for voice in self._voices + self._pending:
+                voice.stop()
+
+    def active(self):
+        with self._lock:
+            return len(self._voices) + len(self._pending)
+
+    def stats(self):
+        latencies = self._latencies
+        return {'periods': self.periods, 'underruns': self.sink.underruns, 'voices_active': self.active(),
+                'voices_started': self.voices_started, 'stream_starved_periods': self.starved,
+                'start_latency_ms': {'mean': 1000 * sum(latencies) / len(latencies) if latencies else None,
+                                     'max': 1000 * max(latencies) if latencies else None},
+                'mix_ms': {'mean': 1000 * self._mix_time / self.periods if self.periods else 0.0,
+                           'max': 1000 * self._mix_max},
+                'period_ms': 1000 * self.period_frames / self.rate, 'clip_cache': self.cache.stats()}
+
+    def _add_voice(self, voice):
+        with self._lock:
+            if self._thread is None or self._stop:
+                voice.stop()
+                raise RuntimeError("Player is not running")
+            self._pending.append(voice)
+        self.voices_started += 1
+        self._wake.set()
+        return voice
+
+    def _run(self):
+        mix, out = self._mix, self._out
+        try:
+            while not self._stop:
+                t0 = time.perf_counter()
+                with self._lock:
+                    started, self._pending = self._pending, []
+                    self._voices.extend(started)
+                    voices = list(self._voices)
+                if not voices and not self.sink.realtime:
+                    # Nothing is listening to a file; write only while something plays
+                    self._wake.wait()
+                    self._wake.clear()
+                    continue
+                mix.fill(0)
+                finished = []
+                for voice in voices:
+                    if not voice.render(mix, self._scratch):
+                        finished.append(voice)
+                np.clip(mix, -32768, 32767, out=mix)
+                out[...] = mix
+                elapsed = time.perf_counter() - t0
+                self._mix_time += elapsed
+                self._mix_max = max(self._mix_max, elapsed)
+                self.sink.write(out)
+                self.periods += 1
+                if started:
+                    # This period is behind whatever the sink still holds
+                    played_at = time.monotonic() + self.sink.delay()
+                    for voice in started:
+                        voice.start_latency = played_at - voice.requested_at
+                        self._latencies.append(voice.start_latency)
+                if finished:
+                    with self._lock:
+                        self._voices = [v for v in self._voices if v not in finished]
+                    for voice in finished:
+                        self.starved += getattr(voice, 'starved', 0)
+                        voice.done.set()
+        except (OSError, ValueError) as e:
+            if not self._stop:
+                logger.error(f"Playback error: {e}")
+        finally:
+            # Also on a sink error (aplay gone): nothing more will play, so release every waiter
+            self._end_voices()
+
+    def _end_voices(self):
+        """Mark the player stopped and finish every active and pending voice"""
+        with self._lock:
+            self._stop = True
+            voices, self._voices, self._pending = self._voices + self._pending, [], []
+        for voice in voices:
+            voice.stop()
+            voice.done.set()
+
+
+def benchmark(seconds=5.0, voices=8, interval=0.1):
+    """Start latency, underruns and mix cost with a realtime NullSink while clips start every interval seconds"""
+    rate = DEFAULT_RATE
+    t = np.arange(int(0.2 * rate)) / rate
+    tone = (0.25 * np.sin(2 * np.pi * 880 * t)).astype(np.float32)[:, None]
+    with Player(NullSink(rate)) as player:
+        clip = player.clip(tone, rate)
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            # Keep up to `voices` clips overlapping
+            if player.active() < voices:
+                player.play(clip, gain=0.5)
+            time.sleep(interval / voices)
+    stats = player.stats()
+    stats['meta'] = {'seconds': seconds, 'voices': voices, 'rate': rate, 'period_frames': player.period_frames}
+    return stats
+
+
+def _read_wav(path):
+    source = WavSource(path)
+    frame_bytes = source.channels * source.dtype.itemsize
+    samples = np.empty((os.path.getsize(path) // frame_bytes, source.channels), dtype=source.dtype)
+    source.open()
+    try:
+        n = source.readinto(memoryview(samples).cast('B'))
+    finally:
+        source.close()
+    return samples[:n // frame_bytes]
+
+
+def selftest(seconds=3.0):
+    """Stream and play WAV files already in the output format through a FileSink and compare with the input"""
+    rate, channels = DEFAULT_RATE, DEFAULT_CHANNELS
+    rng = np.random.default_rng(0)
+    directory = tempfile.mkdtemp()
+    try:
+        # Longer than several stream chunks, and not a whole number of periods
+        samples = rng.integers(-20000, 20000, size=(int(seconds * rate) + 123, channels)).astype(SAMPLE_DTYPE)
+        src = os.path.join(directory, 'native.wav')
+        with WavWriter(src, rate, channels, 'S16_LE') as writer:
+            writer.write(samples)
+        results = {}
+        for mode in ('stream', 'play'):
+            out = os.path.join(directory, f'{mode}.wav')
+            with Player(FileSink(out, rate, channels), cache=ClipCache(max_seconds=seconds + 1)) as player:
+                getattr(player, mode)(src).wait()
+            mixed = _read_wav(out)
+            # The output ends with silence up to a whole period
+            results[mode] = (len(mixed) >= len(samples) and np.array_equal(mixed[:len(samples)], samples)
+                             and not mixed[len(samples):].any())
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return {'frames': len(samples), 'stream_matches': results['stream'], 'play_matches': results['play'],
+            'passed': all(results.values())}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Play and mix WAV files through the WM8960 from one open PCM')
+    sub = parser.add_subparsers(dest='command', required=True)
+    play = sub.add_parser('play', help='Play files together: short ones as cached clips, long ones streamed')
+    play.add_argument('files', nargs='+')
+    play.add_argument('--device', default=DEFAULT_DEVICE)
+    play.add_argument('--rate', type=int, default=DEFAULT_RATE)
+    play.add_argument('--gain', type=float, default=1.0)
+    play.add_argument('--null', action='store_true', help='Discard the output, paced like the card')
+    play.add_argument('--out', help='Write the mix to this WAV file instead of the card')
+    bench = sub.add_parser('bench', help='Measure start latency, underruns and mix time without the card')
+    bench.add_argument('--seconds', type=float, default=5.0)
+    bench.add_argument('--voices', type=int, default=8, help='Clips playing at once')
+    sub.add_parser('selftest', help='Check that streamed and cached playback reproduce the file exactly')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.WARNING, format='%(message)s')
+    if args.command == 'bench':
+        print(json.dumps(benchmark(args.seconds, args.voices), indent=2, sort_keys=True))
+        return 0
+    if args.command == 'selftest':
+        result = selftest()
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0 if result['passed'] else 1
+    if args.out:
+        sink = FileSink(args.out, args.rate)
+    elif args.null:
+        sink = NullSink(args.rate)
+    else:
+        sink = AplaySink(args.device, args.rate)
+    with Player(sink) as player:
+        voices = []
+        for path in args.files:
+            try:
+                voices.append(player.play(path, args.gain))
+            except ValueError:
+                voices.append(player.stream(path, args.gain))
+        try:
+            for voice in voices:
+                voice.wait()
+        except KeyboardInterrupt:
+            pass
+    print(json.dumps(player.stats(), indent=2, sort_keys=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""Streaming recorder stage: vectorised sample conversion and chunked WAV output
+
+Converts whole periods at a time with NumPy: S32 -> S16 with TPDF dither,
+S32 -> float32, and stereo -> mono downmix. The WAV writer appends each period
+as it arrives and patches the RIFF sizes at close, so memory use stays the same
+however long the recording runs.
+
+    with Recorder('take.wav', rate=16000, channels=2, sample_format='S16_LE', mono=True) as rec:
+        rec.record(capture)          # a wm8960_capture.Capture
+
+Command line:
+    python3 wm8960_recorder.py convert test.wav small.wav --format S16_LE --mono
+    python3 wm8960_recorder.py bench
+    python3 wm8960_recorder.py selftest
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from wm8960_capture import (WAVE_FORMAT_IEEE_FLOAT, WAVE_FORMAT_PCM, Capture, RingBuffer, WavSource,
+                            PERIOD_FRAMES)
+
+# Output formats: (numpy dtype, WAV format tag)
+FORMATS = {
+    'S16_LE': (np.dtype('<i2'), WAVE_FORMAT_PCM),
+    'S32_LE': (np.dtype('<i4'), WAVE_FORMAT_PCM),
+    'FLOAT_LE': (np.dtype('<f4'), WAVE_FORMAT_IEEE_FLOAT),
+}
+
+# RIFF sizes are 32-bit; stay clear of the limit so the header can always be patched
+MAX_DATA_BYTES = 0xFFFFFFFF - 64
+
+
+def s32_to_s16(samples, dither=True, rng=None, out=None):
+    """Reduce S32 samples to S16, adding TPDF dither of +/-1 LSB (16-bit) before rounding"""
+    wide = samples.astype(np.int64)
+    if dither:
+        rng = rng or np.random.default_rng()
+        # Sum of two uniform variables: triangular noise spanning +/-1 output LSB
+        wide += rng.integers(0, 1 << 16, size=samples.shape, dtype=np.int64)
+        wide += rng.integers(0, 1 << 16, size=samples.shape, dtype=np.int64)
+        wide -= 1 << 16
+    wide += 1 << 15  # Round to nearest instead of truncating
+    wide >>= 16
+    np.clip(wide, -32768, 32767, out=wide)
+    if out is None:
+        return wide.astype('<i2')
+    out[...] = wide
+    return out
+
+
+def s32_to_float32(samples, out=None):
+    """Scale S32 samples to float32 in [-1.0, 1.0)"""
+    if out is None:
+        out = np.empty(samples.shape, dtype='<f4')
+    np.multiply(samples, np.float32(1.0 / 2**31), out=out, casting='unsafe')
+    return out
+
+
+def downmix(samples):
+    """Average the channels of a (frames, channels) block into a (frames, 1) block of the same dtype"""
+    if samples.shape[1] == 1:
+        return samples
+    if samples.dtype.kind == 'f':
+        return samples.mean(axis=1, keepdims=True, dtype=np.float32).astype(samples.dtype)
+    total = samples.sum(axis=1, keepdims=True, dtype=np.int64)
+    return (total // samples.shape[1]).astype(samples.dtype)
+
+
+def convert(samples, sample_format, dither=True, rng=None):
+    """Convert a block of S16, S32 or float samples to one of FORMATS"""
+    kind, size = samples.dtype.kind, samples.dtype.itemsize
+    if sample_format == 'S16_LE':
+        if kind == 'i' and size == 4:
+            return s32_to_s16(samples, dither, rng)
+        if kind == 'i' and size == 2:
+            return samples.astype('<i2', copy=False)
+        return (np.clip(samples, -1.0, 1.0 - 1 / 32768) * 32768).astype('<i2')
+    if sample_format == 'S32_LE':
+        if kind == 'i':
+            return samples.astype('<i4') << (32 - 8 * size) if size < 4 else samples.astype('<i4', copy=False)
+        return (np.clip(samples.astype(np.float64), -1.0, 1.0 - 2**-31) * 2**31).astype('<i4')
+    if sample_format == 'FLOAT_LE':
+        if kind == 'i' and size == 4:
+            return s32_to_float32(samples)
+        if kind == 'i':
+            return (samples * np.float32(1.0 / 2**(8 * size - 1))).astype('<f4')
+        return samples.astype('<f4', copy=False)
+    raise ValueError(f"Unsupported output format: {sample_format}")
+
+
+class WavWriter:
+    """Append-only WAV file whose RIFF and data sizes are filled in by sync() and close()"""
+    def __init__(self, path, rate, channels, sample_format='S16_LE'):
+        if sample_format not in FORMATS:
+            raise ValueError(f"Unsupported output format: {sample_format}")
+        self.path = path
+        self.rate = rate
+        self.channels = channels
+        self.sample_format = sample_format
+        self.dtype, self._tag = FORMATS[sample_format]
+        self.data_bytes = 0
+        self._file = open(path, 'wb')
+        self._write_header()
+
+    @property
+    def frames(self):
+        return self.data_bytes // (self.channels * self.dtype.itemsize)
+
+    def write(self, samples):
+        """Append a (frames, channels) block already in the writer's format"""
+        if samples.dtype != self.dtype:
+            raise ValueError(f"expected {self.dtype} samples, got {samples.dtype}")
+        data = np.ascontiguousarray(samples)
+        if self.data_bytes + data.nbytes > MAX_DATA_BYTES:
+            raise OverflowError(f"{self.path}: WAV data would exceed 4 GiB")
+        self._file.write(memoryview(data).cast('B'))
+        self.data_bytes += data.nbytes
+
+    def sync(self):
+        """Patch the header to the current length and flush, so the file is valid if we crash later"""
+        end = self._file.tell()
+        self._write_header()
+        self._file.seek(end)
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        if self.data_bytes & 1:
+            self._file.write(b'\0')  # RIFF chunks are word aligned
+        self._write_header()
+        self._file.close()
+        self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write_header(self):
+        width = self.dtype.itemsize
+        fmt = struct.pack('<HHIIHH', self._tag, self.channels, self.rate,
+                          self.rate * self.channels * width, self.channels * width, width * 8)
+        riff_size = 4 + (8 + len(fmt)) + 8 + self.data_bytes + (self.data_bytes & 1)
+        self._file.seek(0)
+        self._file.write(struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE'))
+        self._file.write(struct.pack('<4sI', b'fmt ', len(fmt)) + fmt)
+        self._file.write(struct.pack('<4sI', b'data', self.data_bytes))
+
+
+class Recorder:
+    """Converts incoming periods and streams them into WAV files
+
+    With split_seconds, a new file is started every split_seconds of audio;
+    the path may then contain {index} (otherwise _0001 etc. is appended).
+    """
+    def __init__(self, path, rate, channels, sample_format='S16_LE', mono=False, dither=True,
+                 split_seconds=None, sync_seconds=10.0):
+        self.path = path
+        self.rate = rate
+        self.sample_format = sample_format
+        self.mono = mono
+        self.dither = dither
+        self.out_channels = 1 if mono else channels
+        self.split_frames = int(split_seconds * rate) if split_seconds else None
+        self.sync_frames = int(sync_seconds * rate) if sync_seconds else None
+        self.frames_written = 0
+        self.files = []
+        self.convert_time = 0.0
+        self._rng = np.random.default_rng()
+        self._writer = None
+        self._since_sync = 0
+
+    def write(self, samples):
+        """Convert and append one (frames, channels) block"""
+        t0 = time.perf_counter()
+        if self.mono:
+            samples = downmix(samples)
+        block = convert(samples, self.sample_format, self.dither, self._rng)
+        self.convert_time += time.perf_counter() - t0
+        while len(block):
+            writer = self._current_writer()
+            take = len(block)
+            if self.split_frames:
+                take = min(take, self.split_frames - writer.frames)
+            writer.write(block[:take])
+            block = block[take:]
+            self.frames_written += take
+            self._since_sync += take
+            if self.sync_frames and self._since_sync >= self.sync_frames:
+                writer.sync()
+                self._since_sync = 0
+
+    def record(self, capture, max_seconds=None):
+        """Write periods from a wm8960_capture.Capture until it ends or max_seconds of audio are stored"""
+        limit = int(max_seconds * self.rate) if max_seconds else None
+        for chunk in capture.periods():
+            if limit is not None and self.frames_written + len(chunk) >= limit:
+                self.write(chunk[:limit - self.frames_written])
+                break
+            self.write(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _current_writer(self):
+        if self._writer is not None and self.split_frames and self._writer.frames >= self.split_frames:
+            self.close()
+        if self._writer is None:
+            path = self._next_path()
+            self._writer = WavWriter(path, self.rate, self.out_channels, self.sample_format)
+            self.files.append(path)
+        return self._writer
+
+    def _next_path(self):
+        if not self.split_frames:
+            return self.path
+        index = len(self.files) + 1
+        if '{index' in self.path:
+            return self.path.format(index=index)
+        root, ext = os.path.splitext(self.path)
+        return f"{root}_{index:04d}{ext or '.wav'}"
+
+
+def benchmark(seconds=60, rate=16000, channels=2, period_frames=PERIOD_FRAMES):
+    """Samples/sec of each conversion, and of convert+write to a temp file, on synthetic S32 stereo"""
+    rng = np.random.default_rng(0)
+    periods = max(1, int(seconds * rate) // period_frames)
+    block = rng.integers(-2**31, 2**31, size=(period_frames, channels), dtype=np.int64).astype('<i4')
+    samples = periods * period_frames * channels
+    results = {}
+
+    def timed(name, fn):
+        t0 = time.perf_counter()
+        for _ in range(periods):
+            fn()
+        elapsed = time.perf_counter() - t0
+        results[name] = {'samples_per_sec': samples / elapsed, 'realtime_factor': seconds / elapsed}
+
+    f32 = np.empty(block.shape, dtype='<f4')
+    timed('s32_to_s16_dither', lambda: s32_to_s16(block, True, rng))
+    timed('s32_to_s16', lambda: s32_to_s16(block, False))
+    timed('s32_to_float32', lambda: s32_to_float32(block, out=f32))
+    timed('downmix', lambda: downmix(block))
+    fd, path = tempfile.mkstemp(suffix='.wav')
+    os.close(fd)
+    try:
+        with Recorder(path, rate, channels, 'S16_LE', mono=True) as rec:
+            timed('record_s16_mono', lambda: rec.write(block))
+    finally:
+        os.remove(path)
+    return {'meta': {'seconds': seconds, 'rate': rate, 'channels': channels,
+                     'period_frames': period_frames}, 'results': results}
+
+
+def selftest(periods=2):
+    """Overrun a ring while the reader frees a slot mid-period; the period must be dropped and counted"""
+    ring = RingBuffer(periods, 4, 1, '<i2')
+
+    def write(value):
+        np.frombuffer(ring.writable(), dtype='<i2')[:] = value
+        return ring.commit()
+
+    published = [write(value) for value in range(1, periods + 1)]
+    # The ring is full, so this period is read into the scratch slot...
+    np.frombuffer(ring.writable(), dtype='<i2')[:] = periods + 1
+    # ...and the reader takes one period before it is committed
+    delivered = [int(ring.peek(0)[0, 0])]
+    ring.consume()
+    dropped = not ring.commit()
+    published.append(write(periods + 2))
+    while len(ring):
+        delivered.append(int(ring.peek(0)[0, 0]))
+        ring.consume()
+    expected = list(range(1, periods + 1)) + [periods + 2]
+    return {'delivered': delivered, 'overruns': ring.overruns,
+            'passed': all(published) and dropped and ring.overruns == 1 and delivered == expected}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Convert WM8960 recordings and benchmark the recorder')
+    sub = parser.add_subparsers(dest='command', required=True)
+    conv = sub.add_parser('convert', help='Convert a WAV file, streaming it period by period')
+    conv.add_argument('input')
+    conv.add_argument('output')
+    conv.add_argument('--format', default='S16_LE', choices=sorted(FORMATS))
+    conv.add_argument('--mono', action='store_true', help='Downmix to one channel')
+    conv.add_argument('--no-dither', action='store_true', help='Round instead of dithering to 16 bit')
+    bench = sub.add_parser('bench', help='Measure conversion throughput in samples/sec')
+    bench.add_argument('--seconds', type=float, default=60, help='Seconds of 16 kHz stereo audio to process')
+    sub.add_parser('selftest', help='Check that a ring overrun drops and counts the period')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command == 'bench':
+        print(json.dumps(benchmark(args.seconds), indent=2, sort_keys=True))
+        return 0
+    if args.command == 'selftest':
+        result = selftest()
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return 0 if result['passed'] else 1
+    # A conversion must not lose samples: the reader waits for the converter instead of dropping periods
+    capture = Capture(WavSource(args.input), drop=False)
+    with capture, Recorder(args.output, capture.rate, capture.channels, args.format,
+                           mono=args.mono, dither=not args.no_dither) as rec:
+        rec.record(capture)
+    if rec.frames_written != capture.frames_captured:
+        print(f"Error: read {capture.frames_captured} frames but wrote {rec.frames_written}", file=sys.stderr)
+        return 1
+    print(f"Wrote {rec.frames_written} frames to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())